@@ -0,0 +1,174 @@
+"""
+Adaptive reporting simulator: how much ingest traffic server-driven
+reporting intervals save on a replayed night, and what it costs in alert
+delay.
+
+Replays the GPS pings and watch batches of a festival trace (traces.py)
+through process-friend-data and process-wearable-data twice, in-process
+against the in-memory stand-ins (server/localaws.py), each run in a fresh process:
+
+    fixed      every device reports at the trace's fixed cadence
+    adaptive   every device waits the nextReportSeconds of its last response;
+               a ping or batch due earlier is not sent, and a watch keeps the
+               samples of a skipped batch for its next upload. SOS presses and
+               falls are sent at once, as the apps do
+
+Reports requests and write units per handler, and the alerts raised in
+both runs. The k-th alert for a (friend, cause) in one run is matched with
+the k-th in the other, and the difference in trace time is its delay.
+
+Usage:
+    python benchmarks/adaptive_reporting.py [--groups 10] [--group-size 6] [--minutes 60] [--seed 0]
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from registry import LAYER, LOCAL_ENVIRONMENT, load_handler  # noqa: E402
+sys.path.insert(0, LAYER)
+
+import localaws  # noqa: E402
+import traces  # noqa: E402
+from replay import percentile  # noqa: E402
+
+INGEST = ('process-friend-data', 'process-wearable-data')
+
+
+class Devices:
+    """The reporting decisions of every phone and watch in adaptive mode."""
+
+    def __init__(self):
+        self.due = {}      # (handler, friendId) -> trace time the next report is due
+        self.held = defaultdict(list)  # friendId -> watch samples not uploaded yet
+        self.sent = {}     # (handler, friendId, seq) -> body sent, so a resend repeats it
+
+    def outgoing(self, at, name, body):
+        """The body to send now, or None if the device holds off."""
+        fid = body['friendId']
+        resend = self.sent.get((name, fid, body.get('seq')), False)
+        if resend is not False:
+            return resend
+        urgent = body.get('sos') or any(sample.get('fallDetected') for sample in body.get('samples', []))
+        if not urgent and at < self.due.get((name, fid), 0):
+            if name == 'process-wearable-data':
+                self.held[fid] += body['samples']
+            self.sent[(name, fid, body.get('seq'))] = None
+            return None
+        if name == 'process-wearable-data':
+            body = dict(body, samples=self.held.pop(fid, []) + body['samples'])
+        self.sent[(name, fid, body.get('seq'))] = body
+        return body
+
+    def answered(self, at, name, body, response):
+        interval = json.loads(response.get('body') or '{}').get('nextReportSeconds')
+        if interval:
+            self.due[(name, body['friendId'])] = at + interval
+
+
+def simulate(mode, fixtures, invocations, results):
+    for key, value in LOCAL_ENVIRONMENT.items():
+        os.environ.setdefault(key, value)
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-2')
+    os.environ['PULSE_TELEMETRY'] = 'off'
+    from pulse_common import runtime
+
+    clock = [0.0]
+    alerts = defaultdict(list)  # (friendId, cause) -> trace times
+
+    def on_message(message):
+        attributes = message.get('MessageAttributes') or {}
+        fid = attributes.get('friendId', {}).get('StringValue')
+        cause = attributes.get('cause', {}).get('StringValue')
+        alerts[(fid, cause)].append(clock[0])
+
+    aws = localaws.LocalAWS(on_message=on_message)
+    for table_name, items in fixtures.items():
+        aws.seed_items(table_name, items)
+    runtime.use_backend(aws)
+    handlers = {name: load_handler(name) for name in INGEST}
+
+    devices = Devices() if mode == 'adaptive' else None
+    requests, writes, samples = Counter(), Counter(), Counter()
+    for at, name, event in invocations:
+        body = json.loads(event['body']) if 'body' in event else event
+        if devices is not None:
+            body = devices.outgoing(at, name, body)
+            if body is None:
+                continue
+        clock[0] = at
+        before = aws.metrics.snapshot()['writeUnits']
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = handlers[name]({'body': json.dumps(body)}, None)
+        requests[name] += 1
+        writes[name] += aws.metrics.snapshot()['writeUnits'] - before
+        samples[name] += len(body.get('samples', []))
+        if devices is not None:
+            devices.answered(at, name, body, response)
+    if devices is not None:
+        samples['held at the end'] = sum(len(held) for held in devices.held.values())
+    results.put((requests, writes, samples, dict(alerts)))
+
+
+def run(mode, fixtures, invocations):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=simulate, args=(mode, fixtures, invocations, results))
+    process.start()
+    outcome = results.get()
+    process.join()
+    return outcome
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=10)
+    parser.add_argument('--group-size', type=int, default=6)
+    parser.add_argument('--minutes', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fixtures, invocations = traces.festival(args.groups, args.group_size, args.minutes, args.seed, logins=False)
+    invocations = [inv for inv in invocations if inv[1] in INGEST]
+    print(f"Replaying {len(invocations)} pings and watch batches ({args.groups} groups x {args.group_size}, "
+          f"{args.minutes} simulated minutes, seed {args.seed})\n")
+
+    fixed = run('fixed', fixtures, invocations)
+    adaptive = run('adaptive', fixtures, invocations)
+
+    print(f"{'handler':<24} {'fixed':>8} {'adaptive':>9} {'saved':>6}   {'WCU fixed':>9} {'adaptive':>9} {'saved':>6}")
+    for name in INGEST:
+        calls = (fixed[0][name], adaptive[0][name])
+        units = (fixed[1][name], adaptive[1][name])
+        print(f"{name:<24} {calls[0]:>8} {calls[1]:>9} {100 * (1 - calls[1] / max(1, calls[0])):>5.0f}%   "
+              f"{units[0]:>9.0f} {units[1]:>9.0f} {100 * (1 - units[1] / max(1, units[0])):>5.0f}%")
+    total = (sum(fixed[0].values()), sum(adaptive[0].values()))
+    print(f"{'total':<24} {total[0]:>8} {total[1]:>9} {100 * (1 - total[1] / max(1, total[0])):>5.0f}%")
+    print(f"\nwatch samples uploaded: {fixed[2]['process-wearable-data']} fixed, "
+          f"{adaptive[2]['process-wearable-data']} adaptive (+{adaptive[2]['held at the end']} still on the watches at the end)")
+
+    print(f"\n{'alerts by cause':<24} {'fixed':>8} {'adaptive':>9} {'missed':>7} {'extra':>6} {'delay p50':>10} {'max':>7}")
+    causes = sorted({cause.split('#')[0] for _, cause in list(fixed[3]) + list(adaptive[3])})
+    for cause in causes:
+        counts, delays, missed, extra = [0, 0], [], 0, 0
+        for key in set(fixed[3]) | set(adaptive[3]):
+            if key[1].split('#')[0] != cause:
+                continue
+            before, after = fixed[3].get(key, []), adaptive[3].get(key, [])
+            counts[0] += len(before)
+            counts[1] += len(after)
+            delays += [b - a for a, b in zip(before, after)]
+            missed += max(0, len(before) - len(after))
+            extra += max(0, len(after) - len(before))
+        delays.sort()
+        print(f"{cause:<24} {counts[0]:>8} {counts[1]:>9} {missed:>7} {extra:>6} "
+              f"{percentile(delays, 50) if delays else 0:>8.0f} s {max(delays) if delays else 0:>5.0f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Cold-start benchmark: import-to-first-response time for every Lambda handler.
+
+Each run starts a fresh interpreter (like a new Lambda container), imports
+the handler's index.py with the pulse-common layer on sys.path, then invokes
+it once with an event that takes a fast path (OPTIONS or a 400) so no AWS
+call is needed. It also reports which heavy modules (boto3, botocore,
+bcrypt) the cold path pulled in; with the lazy runtime none should be.
+
+Usage:
+    python benchmarks/cold_start.py [--runs 5] [--handler login-user] [--budget-ms 150]
+
+--budget-ms makes the script exit non-zero if any handler's median
+import-to-first-response time exceeds the budget, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from registry import FUNCTIONS, HANDLERS, LAYER  # noqa: E402
+
+HEAVY_MODULES = ('boto3', 'botocore', 'bcrypt')
+
+# handler -> fast-path event, or None for import only
+EVENTS = {
+    'get-distance-between-friends': {'queryStringParameters': {}},
+    'get-user-status': {'queryStringParameters': {}},
+    'get-group-snapshot': {'queryStringParameters': {}},
+    'get-vitals-history': {'queryStringParameters': {}},
+    'get-location-trail': {'queryStringParameters': {}},
+    'process-friend-data': {'body': '{}'},
+    'process-wearable-data': {'samples': [{}]},
+    'set-user-preferences': {'body': '{}'},
+    'sweep-escalations': None,  # scheduled, every path reads DynamoDB
+    'create-user': {'requestContext': {'http': {'method': 'OPTIONS'}}},
+    'login-user': {'body': '{}'},
+    'add-friend-request': {'body': '{}'},
+    'accept-friend-request': {'body': '{}'},
+    'get-accepted-friends': {'queryStringParameters': {}},
+    'get-pending-requests': {'queryStringParameters': {}},
+}
+
+# Runs inside the fresh interpreter; the result is the last line of stdout
+CHILD = """
+import json, sys, time
+event = json.loads(sys.argv[1])
+start = time.perf_counter()
+import index
+imported = time.perf_counter()
+status = None
+if event is not None:
+    status = index.lambda_handler(event, None).get('statusCode')
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'total_ms': (done - start) * 1000,
+    'status': status,
+    'heavy': [m for m in %r if m in sys.modules]
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_once(directory, event):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [LAYER, env.get('PYTHONPATH')]))
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-2')
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, json.dumps(event)],
+        cwd=os.path.join(FUNCTIONS, directory),
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'handler failed')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--handler', action='append', choices=sorted(HANDLERS))
+    parser.add_argument('--budget-ms', type=float)
+    args = parser.parse_args()
+
+    over_budget = []
+    print(f"{'handler':<30} {'import ms':>10} {'first resp ms':>14} {'status':>7}  heavy modules loaded")
+    for name in args.handler or HANDLERS:
+        event = EVENTS[name]
+        try:
+            runs = [run_once(HANDLERS[name], event) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name:<30} {'error':>10}  {e}")
+            over_budget.append(name)
+            continue
+        import_ms = statistics.median(r['import_ms'] for r in runs)
+        total_ms = statistics.median(r['total_ms'] for r in runs)
+        status = runs[-1]['status'] if event is not None else '-'
+        heavy = ', '.join(runs[-1]['heavy']) or '-'
+        shown = f"{total_ms:.1f}" if event is not None else '-'
+        print(f"{name:<30} {import_ms:>10.1f} {shown:>14} {status!s:>7}  {heavy}")
+        if args.budget_ms is not None and total_ms > args.budget_ms:
+            over_budget.append(name)
+
+    if over_budget:
+        print(f"\nOver budget or failing: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Priority benchmark: SOS latency through the self-hosted server
+(backend/server/pulse_server.py) while routine telemetry saturates it.
+
+Seeds a festival (traces.py) and starts the server on it twice, with
+--lanes off (one first-come first-served queue) and --lanes on. At each
+load level, a separate process replays the trace's GPS pings and watch
+batches over that many keep-alive connections, as fast as the server
+answers, while this process sends --sos-per-second SOS pings on a
+connection of its own. Reports, per level, the routine throughput, how much
+of it was shed, and the SOS p50 / p99 latency.
+
+Usage:
+    python benchmarks/priority_load.py [--groups 20] [--levels 0,16,64,192] [--seconds 10]
+                                       [--sos-per-second 5] [--workers 8] [--port 8089]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from registry import LAYER  # noqa: E402
+sys.path.insert(0, LAYER)
+
+import localaws  # noqa: E402
+import traces  # noqa: E402
+from replay import percentile  # noqa: E402
+from server_load import SERVER, request, wait_ready  # noqa: E402
+
+ROUTES = {'process-friend-data': '/default/processFriendData', 'process-wearable-data': '/default/processWearableData'}
+
+
+def routine_requests(invocations):
+    """(path, body) for the trace's telemetry, without seq (sent round and round) or SOS presses."""
+    requests = []
+    for _, name, event in invocations:
+        if name not in ROUTES:
+            continue
+        payload = json.loads(event['body']) if 'body' in event else dict(event)
+        payload.pop('seq', None)
+        if payload.pop('sos', False) or any(s.get('fallDetected') for s in payload.get('samples', [])):
+            continue
+        requests.append((ROUTES[name], json.dumps(payload).encode('utf-8')))
+    return requests
+
+
+async def routine_connection(port, requests, offset, stride, deadline, latencies, statuses):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    i = offset
+    try:
+        while time.perf_counter() < deadline:
+            path, body = requests[i % len(requests)]
+            started = time.perf_counter()
+            status = await request(reader, writer, path, body)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] += 1
+            i += stride
+    finally:
+        writer.close()
+
+
+def drive_routine(port, requests, connections, seconds, results):
+    """Runs in its own process, so the SOS prober's timings don't include the load generator's event loop."""
+    async def run():
+        latencies, statuses = [], Counter()
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(routine_connection(port, requests, k, connections, deadline, latencies, statuses)
+                               for k in range(connections)))
+        return latencies, statuses
+    results.put(asyncio.run(run()))
+
+
+async def probe_sos(port, bodies, rate, seconds):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    latencies, statuses = [], Counter()
+    deadline = time.perf_counter() + seconds
+    next_at = time.perf_counter()
+    i = 0
+    try:
+        while next_at < deadline:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            started = time.perf_counter()
+            status = await request(reader, writer, '/default/processFriendData', bodies[i % len(bodies)])
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] += 1
+            i += 1
+            next_at += 1 / rate
+    finally:
+        writer.close()
+    return latencies, statuses
+
+
+def run_level(port, routine, sos_bodies, connections, args):
+    results = multiprocessing.Queue()
+    driver = None
+    if connections:
+        driver = multiprocessing.Process(target=drive_routine, args=(port, routine, connections, args.seconds, results))
+        driver.start()
+    sos_latencies, sos_statuses = asyncio.run(probe_sos(port, sos_bodies, args.sos_per_second, args.seconds))
+    latencies, statuses = results.get() if driver else ([], Counter())
+    if driver:
+        driver.join()
+    return latencies, statuses, sos_latencies, sos_statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--group-size', type=int, default=6)
+    parser.add_argument('--levels', default='0,16,64,192', help='routine connections per level')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--sos-per-second', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(',')]
+
+    fixtures, invocations = traces.festival(args.groups, args.group_size, 10, args.seed, logins=False)
+    routine = routine_requests(invocations)
+    pings = [json.loads(event['body']) for _, name, event in invocations if name == 'process-friend-data']
+    sos_bodies = [json.dumps({'friendId': ping['friendId'], 'latitude': ping['latitude'],
+                              'longitude': ping['longitude'], 'sos': True}).encode('utf-8') for ping in pings[::7]]
+
+    print(f"{len(routine)} distinct routine requests from {args.groups * args.group_size} friends, "
+          f"{args.sos_per_second:g} SOS/s, {args.seconds:.0f} s per level, {args.workers} server workers\n")
+    print(f"{'lanes':<6} {'conns':>5} {'routine/s':>10} {'routine p99':>12} {'shed':>6} "
+          f"{'SOS':>5} {'SOS p50':>9} {'SOS p99':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = os.path.join(directory, 'pulse.json')
+        aws = localaws.LocalAWS()
+        for table_name, items in fixtures.items():
+            aws.seed_items(table_name, items)
+        aws.save(snapshot)
+
+        # Every SOS claims and publishes its incident, rather than coalescing into an open one
+        env = dict(os.environ, PULSE_TELEMETRY='off', ALERT_SUPPRESSION_SECONDS='0')
+        for lanes in ('off', 'on'):
+            process = subprocess.Popen(
+                [sys.executable, SERVER, '--host', '127.0.0.1', '--port', str(args.port), '--workers', str(args.workers),
+                 '--storage', 'memory', '--snapshot', snapshot, '--snapshot-seconds', '3600', '--sweep-seconds', '0',
+                 '--lanes', lanes, '--quiet-handlers'],
+                env=env, stderr=subprocess.DEVNULL
+            )
+            try:
+                asyncio.run(wait_ready(args.port, process))
+                for connections in levels:
+                    latencies, statuses, sos_latencies, sos_statuses = run_level(args.port, routine, sos_bodies, connections, args)
+                    latencies.sort()
+                    sos_latencies.sort()
+                    shed = sum(n for status, n in statuses.items() if status in (202, 503))
+                    sos_failed = sum(n for status, n in sos_statuses.items() if status != 200)
+                    print(f"{lanes:<6} {connections:>5} {len(latencies) / args.seconds:>10.0f} "
+                          f"{percentile(latencies, 99) if latencies else 0:>9.1f} ms "
+                          f"{100 * shed / max(1, len(latencies)):>5.0f}% "
+                          f"{len(sos_latencies):>5} {percentile(sos_latencies, 50):>6.1f} ms {percentile(sos_latencies, 99):>6.1f} ms"
+                          + (f"  ({sos_failed} SOS failed)" if sos_failed else ''))
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
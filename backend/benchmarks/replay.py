@@ -0,0 +1,183 @@
+"""
+Load-replay benchmark: runs a synthetic festival trace (traces.py) through
+every Lambda handler in-process, against the in-memory DynamoDB and SNS
+stand-ins (server/localaws.py), and reports per handler:
+
+    calls, errors, p50 / p95 / p99 latency, DynamoDB requests per call,
+    read / write capacity units per call, SNS API calls and messages.
+
+Invocations run back to back in trace order, one at a time, so every
+request and capacity unit is attributed to the invocation that made it.
+Like the app, the replay remembers the last ETag per request and sends it
+back as If-None-Match; 304 responses are counted per handler.
+--dynamodb-latency-ms / --sns-latency-ms add a fixed delay to each API call
+(plus up to --jitter-ms), which is what makes the number of round trips
+per invocation show up in the latency columns.
+
+Usage:
+    python benchmarks/replay.py [--groups 20] [--group-size 6] [--minutes 10]
+                                [--dynamodb-latency-ms 5] [--sns-latency-ms 20] [--jitter-ms 2]
+                                [--seed 0] [--handler process-friend-data] [--telemetry on|off]
+                                [--json results.json] [--verbose]
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from registry import HANDLERS, LAYER, LOCAL_ENVIRONMENT, load_handler  # noqa: E402
+sys.path.insert(0, LAYER)
+
+import localaws  # noqa: E402
+import traces  # noqa: E402
+from pulse_common import runtime, telemetry  # noqa: E402
+
+COLUMNS = ('dynamodbRequests', 'readUnits', 'writeUnits', 'snsRequests', 'snsMessages', 'snsRecipients')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def replay(aws, invocations, verbose=False):
+    """Run every invocation; returns {handler: {'latencies': [...], 'errors': n, 'notModified': n, <COLUMNS>: total}}."""
+    handlers = {}
+    etags = {}  # (handler, query string) -> last ETag seen
+    results = defaultdict(lambda: {'latencies': [], 'errors': 0, 'notModified': 0, **{c: 0 for c in COLUMNS}})
+    for _, name, event in invocations:
+        if name not in handlers:
+            handlers[name] = load_handler(name)
+        event = json.loads(json.dumps(event))
+        request_key = (name, json.dumps(event.get('queryStringParameters'), sort_keys=True))
+        if request_key in etags:
+            event.setdefault('headers', {})['If-None-Match'] = etags[request_key]
+        before = aws.metrics.snapshot()
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        started = time.perf_counter()
+        try:
+            with output:
+                response = handlers[name](event, None)
+        except Exception as e:
+            print(f"❌ {name} raised {type(e).__name__}: {e}", file=sys.stderr)
+            response = {'statusCode': 500}
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        after = aws.metrics.snapshot()
+
+        status = response.get('statusCode', 200)
+        if (response.get('headers') or {}).get('ETag'):
+            etags[request_key] = response['headers']['ETag']
+
+        result = results[name]
+        result['latencies'].append(elapsed_ms)
+        if status >= 500:
+            result['errors'] += 1
+        elif status == 304:
+            result['notModified'] += 1
+        for column in COLUMNS:
+            result[column] += after[column] - before[column]
+    return results
+
+
+def summarize(results):
+    rows = {}
+    for name, result in sorted(results.items()):
+        latencies = sorted(result['latencies'])
+        calls = len(latencies)
+        rows[name] = {
+            'calls': calls,
+            'errors': result['errors'],
+            'notModified': result['notModified'],
+            'p50Ms': percentile(latencies, 50),
+            'p95Ms': percentile(latencies, 95),
+            'p99Ms': percentile(latencies, 99),
+            'dynamodbRequestsPerCall': result['dynamodbRequests'] / calls,
+            'rcuPerCall': result['readUnits'] / calls,
+            'wcuPerCall': result['writeUnits'] / calls,
+            'snsRequests': result['snsRequests'],
+            'snsMessages': result['snsMessages'],
+            'snsRecipients': result['snsRecipients'],
+        }
+    return rows
+
+
+def print_table(rows, totals, wall_seconds):
+    print(f"{'handler':<30} {'calls':>6} {'err':>4} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} "
+          f"{'ddb/call':>8} {'RCU/call':>8} {'WCU/call':>8} {'sns calls':>9} {'msgs':>5}")
+    for name, row in rows.items():
+        print(f"{name:<30} {row['calls']:>6} {row['errors']:>4} {row['p50Ms']:>7.2f} {row['p95Ms']:>7.2f} "
+              f"{row['p99Ms']:>7.2f} {row['dynamodbRequestsPerCall']:>8.2f} {row['rcuPerCall']:>8.2f} "
+              f"{row['wcuPerCall']:>8.2f} {row['snsRequests']:>9} {row['snsMessages']:>5}")
+    calls = sum(row['calls'] for row in rows.values())
+    print(f"\n{calls} invocations in {wall_seconds:.1f} s; DynamoDB: {totals['dynamodbRequests']} requests, "
+          f"{totals['readUnits']:.1f} RCU, {totals['writeUnits']:.1f} WCU; SNS: {totals['snsRequests']} calls, "
+          f"{totals['snsMessages']} messages to {totals['snsRecipients']} recipients")
+    for name, row in rows.items():
+        if row['notModified']:
+            print(f"{name}: {row['notModified']} of {row['calls']} calls answered 304 Not Modified")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--group-size', type=int, default=6)
+    parser.add_argument('--minutes', type=int, default=10)
+    parser.add_argument('--dynamodb-latency-ms', type=float, default=0.0)
+    parser.add_argument('--sns-latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--handler', action='append', choices=sorted(HANDLERS), help='only replay these handlers')
+    parser.add_argument('--telemetry', choices=('on', 'off'), default='on',
+                        help='per-invocation spans and EMF metric lines (compare both to measure the overhead)')
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    parser.add_argument('--verbose', action='store_true', help="show the handlers' own log output")
+    args = parser.parse_args()
+
+    for key, value in LOCAL_ENVIRONMENT.items():
+        os.environ.setdefault(key, value)
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-2')
+
+    logins = importlib.util.find_spec('bcrypt') is not None
+    if not logins:
+        print("bcrypt is not installed: skipping create-user / login-user traffic")
+    fixtures, invocations = traces.festival(args.groups, args.group_size, args.minutes, args.seed, logins=logins)
+    if args.handler:
+        invocations = [inv for inv in invocations if inv[1] in args.handler]
+
+    aws = localaws.LocalAWS(
+        dynamodb_latency_ms=args.dynamodb_latency_ms,
+        sns_latency_ms=args.sns_latency_ms,
+        jitter_ms=args.jitter_ms,
+        seed=args.seed
+    )
+    for table_name, items in fixtures.items():
+        aws.seed_items(table_name, items)
+    telemetry.configure(enabled=args.telemetry == 'on')
+    runtime.use_backend(aws)
+
+    print(f"Replaying {len(invocations)} invocations ({args.groups} groups x {args.group_size}, "
+          f"{args.minutes} simulated minutes, seed {args.seed})\n")
+    started = time.perf_counter()
+    results = replay(aws, invocations, verbose=args.verbose)
+    wall_seconds = time.perf_counter() - started
+
+    rows = summarize(results)
+    totals = aws.metrics.snapshot()
+    print_table(rows, totals, wall_seconds)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': vars(args), 'handlers': rows, 'totals': totals}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
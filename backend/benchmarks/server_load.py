@@ -0,0 +1,138 @@
+"""
+Server load benchmark: GPS ping throughput of the self-hosted server
+(backend/server/pulse_server.py) on one machine.
+
+Seeds a festival (traces.py) into a snapshot, starts the server on it with
+in-memory storage, then replays the trace's process-friend-data pings over
+--connections keep-alive connections for --seconds, as fast as the server
+answers. Reports pings per second, p50 / p99 latency and status codes.
+
+Usage:
+    python benchmarks/server_load.py [--groups 50] [--connections 64] [--seconds 20]
+                                     [--workers 32] [--telemetry on|off] [--port 8089]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from registry import BACKEND, LAYER  # noqa: E402
+sys.path.insert(0, LAYER)
+
+import localaws  # noqa: E402
+import traces  # noqa: E402
+from replay import percentile  # noqa: E402
+
+SERVER = os.path.join(BACKEND, 'server', 'pulse_server.py')
+
+
+async def request(reader, writer, path, body):
+    writer.write((f"POST {path} HTTP/1.1\r\nHost: pulse\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode('latin-1') + body)
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return int(lines[0].split(' ')[1])
+
+
+async def connection(port, bodies, offset, stride, deadline, latencies, statuses):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    i = offset
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status = await request(reader, writer, '/default/processFriendData', bodies[i % len(bodies)])
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] += 1
+            i += stride
+    finally:
+        writer.close()
+
+
+async def drive(port, bodies, connections, seconds):
+    latencies, statuses = [], Counter()
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(connection(port, bodies, k, connections, deadline, latencies, statuses)
+                           for k in range(connections)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+async def wait_ready(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b"GET /health HTTP/1.1\r\nHost: pulse\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            await reader.read()
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--group-size', type=int, default=6)
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--telemetry', choices=('on', 'off'), default='off')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fixtures, invocations = traces.festival(args.groups, args.group_size, 10, args.seed, logins=False)
+    # The pings are sent round and round, so without their seq (a resend would be dropped) and capture time
+    pings = [json.loads(event['body']) for _, name, event in invocations if name == 'process-friend-data']
+    bodies = [json.dumps({k: v for k, v in ping.items() if k not in ('seq', 'timestamp')}).encode('utf-8') for ping in pings]
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = os.path.join(directory, 'pulse.json')
+        aws = localaws.LocalAWS()
+        for table_name, items in fixtures.items():
+            aws.seed_items(table_name, items)
+        aws.save(snapshot)
+
+        env = dict(os.environ, PULSE_TELEMETRY=args.telemetry)
+        process = subprocess.Popen(
+            [sys.executable, SERVER, '--host', '127.0.0.1', '--port', str(args.port), '--workers', str(args.workers),
+             '--storage', 'memory', '--snapshot', snapshot, '--sweep-seconds', '0', '--quiet-handlers'],
+            env=env, stderr=subprocess.DEVNULL
+        )
+        try:
+            asyncio.run(wait_ready(args.port, process))
+            print(f"Driving {len(bodies)} distinct pings from {args.groups * args.group_size} friends over "
+                  f"{args.connections} connections for {args.seconds:.0f} s ({args.workers} server workers)\n")
+            latencies, statuses, elapsed = asyncio.run(drive(args.port, bodies, args.connections, args.seconds))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    latencies.sort()
+    print(f"{len(latencies)} pings in {elapsed:.1f} s: {len(latencies) / elapsed:.0f} pings/s")
+    print(f"latency p50 {percentile(latencies, 50):.2f} ms, p99 {percentile(latencies, 99):.2f} ms")
+    print('status codes: ' + json.dumps(dict(sorted(statuses.items()))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+Seeded synthetic traffic for the replay benchmark: a festival where groups
+of friends walk around, their watches stream vitals and the apps poll.
+
+festival() returns (fixtures, invocations). Fixtures are items to preload
+per table; invocations are (at, handler, event) tuples sorted by simulated
+time in seconds. The same seed always produces the same trace.
+
+Rates, per member:
+    GPS ping              every 15 s (random walk; occasionally a member drifts off, rarely an SOS)
+    watch batch           every 60 s, one sample per 5 s (heart-rate spikes and falls mixed in)
+    resends               3% of pings and batches are sent again a few seconds later, same seq
+    status / distance     every 30 s / 60 s from the app
+    group snapshot        every 30 s from the app's group view
+    vitals history        every 5 min
+    location trail        every 10 min (the last 10 minutes)
+Per group: friend-request churn with outsiders every few minutes.
+Overall: a login burst at the start and every 5 min, the escalation sweep every 60 s.
+Site map: the venue boundary plus SITE_ZONES small zones, a few of them flagged.
+"""
+import json
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+FESTIVAL_LAT, FESTIVAL_LON = 43.6532, -79.3832
+METERS_PER_DEGREE = 111320.0
+
+PING_SECONDS = 15
+WATCH_BATCH_SECONDS = 60
+WATCH_SAMPLE_SECONDS = 5
+STATUS_POLL_SECONDS = 30
+GROUP_POLL_SECONDS = 30
+DISTANCE_POLL_SECONDS = 60
+HISTORY_POLL_SECONDS = 300
+TRAIL_POLL_SECONDS = 600
+CHURN_SECONDS = 180
+SWEEP_SECONDS = 60
+LOGIN_BURST_SECONDS = 300
+VENUE_RADIUS_M = 1100
+SITE_ZONES = 300
+FLAGGED_EVERY = 15  # one zone in 15 is off limits
+RESEND_RATE = 0.03  # device didn't see the response and retried
+
+
+def _user(group, member):
+    return f"g{group:03d}m{member:02d}"
+
+
+def _offset(lat, lon, north_m, east_m):
+    return (lat + north_m / METERS_PER_DEGREE,
+            lon + east_m / (METERS_PER_DEGREE * math.cos(math.radians(lat))))
+
+
+def _api(params=None, body=None):
+    if body is not None:
+        return {'body': json.dumps(body)}
+    return {'queryStringParameters': params}
+
+
+def festival(groups=20, group_size=6, minutes=10, seed=0, logins=True):
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+    duration = minutes * 60
+    fixtures = {'Users': [], 'UserEmails': [], 'UserPreferences': [], 'FriendGraph': [], 'Geofences': _site_map(random.Random(seed + 1))}
+    invocations = []
+    resends = random.Random(seed + 2)  # separate stream, so resends don't reshape the rest of the trace
+
+    for g in range(groups):
+        members = [_user(g, m) for m in range(group_size)]
+        for uid in members:
+            fixtures['Users'].append({'userId': uid, 'email': f"{uid}@example.com", 'phone': '4165550100'})
+            # A quarter of users escalate immediately, so the sweep has work inside a short trace
+            countdown = 0 if rng.random() < 0.25 else 600
+            fixtures['UserPreferences'].append({'friendId': uid, 'maxDistanceApart': 250, 'countdownBeforeNotify': countdown})
+            for other in members:
+                if other != uid:
+                    fixtures['FriendGraph'].append({
+                        'userId': uid, 'edge': f"accepted#{other}", 'friendId': other,
+                        'status': 'accepted', 'addedAt': start.isoformat()
+                    })
+
+        center = _offset(FESTIVAL_LAT, FESTIVAL_LON, rng.uniform(-800, 800), rng.uniform(-800, 800))
+        for uid in members:
+            invocations += _member_traffic(rng, uid, members, center, start, duration, resends)
+        invocations += _churn(rng, g, members, duration)
+
+    for t in range(0, duration, SWEEP_SECONDS):
+        invocations.append((t + 30, 'sweep-escalations', {}))
+    if logins:
+        invocations += _login_bursts(rng, groups * group_size, duration)
+
+    invocations.sort(key=lambda inv: inv[0])
+    return fixtures, invocations
+
+
+def _site_map(rng):
+    """Irregular venue boundary around the festival, plus stages, bars and off-limits areas inside it."""
+    boundary = []
+    for k in range(24):
+        angle = 2 * math.pi * k / 24
+        radius = VENUE_RADIUS_M * rng.uniform(0.85, 1.0)
+        boundary.append(list(_offset(FESTIVAL_LAT, FESTIVAL_LON, radius * math.cos(angle), radius * math.sin(angle))))
+    zones = [{'zoneId': 'venue', 'name': 'the festival grounds', 'kind': 'venue', 'polygon': boundary}]
+    for n in range(SITE_ZONES):
+        north, east = rng.uniform(-900, 900), rng.uniform(-900, 900)
+        half_h, half_w = rng.uniform(10, 40), rng.uniform(10, 40)
+        corners = [(-half_h, -half_w), (-half_h, half_w), (half_h, half_w), (half_h, -half_w)]
+        flagged = n % FLAGGED_EVERY == 0
+        zones.append({
+            'zoneId': f"zone{n:03d}",
+            'name': f"restricted area {n}" if flagged else f"area {n}",
+            'kind': 'flagged' if flagged else 'area',
+            'polygon': [list(_offset(FESTIVAL_LAT, FESTIVAL_LON, north + dn, east + de)) for dn, de in corners]
+        })
+    return zones
+
+
+def _resend(resends, out, at, handler, event):
+    out.append((at, handler, event))
+    if resends.random() < RESEND_RATE:
+        out.append((at + resends.uniform(2, 8), handler, event))
+
+
+def _member_traffic(rng, uid, members, center, start, duration, resends):
+    out = []
+    north, east = rng.gauss(0, 40), rng.gauss(0, 40)
+    drift = None  # (north/s, east/s) while wandering off
+    phase = rng.uniform(0, PING_SECONDS)
+    for seq, t in enumerate(range(0, duration, PING_SECONDS)):
+        if drift is None and rng.random() < 0.02:
+            angle = rng.uniform(0, 2 * math.pi)
+            drift = (math.cos(angle) * 3.0, math.sin(angle) * 3.0)
+        elif drift is not None and rng.random() < 0.03:
+            drift = None
+            north, east = rng.gauss(0, 40), rng.gauss(0, 40)  # found the group again
+        north += rng.gauss(0, 3) + (drift[0] * PING_SECONDS if drift else 0)
+        east += rng.gauss(0, 3) + (drift[1] * PING_SECONDS if drift else 0)
+        lat, lon = _offset(center[0], center[1], north, east)
+        body = {'friendId': uid, 'latitude': round(lat, 6), 'longitude': round(lon, 6),
+                'timestamp': (start + timedelta(seconds=t + phase)).isoformat(), 'seq': seq}
+        if rng.random() < 0.0005:
+            body['sos'] = True
+        _resend(resends, out, t + phase, 'process-friend-data', _api(body=body))
+
+    heart_rate = rng.uniform(65, 85)
+    stress = rng.uniform(25, 45)
+    for seq, t in enumerate(range(0, duration, WATCH_BATCH_SECONDS)):
+        samples = []
+        spike = rng.random() < 0.02
+        for s in range(0, WATCH_BATCH_SECONDS, WATCH_SAMPLE_SECONDS):
+            heart_rate += rng.gauss(0, 1.5) + (78 - heart_rate) * 0.1
+            stress += rng.gauss(0, 1.0) + (35 - stress) * 0.1
+            sample = {
+                'timestamp': (start + timedelta(seconds=t + s)).isoformat(),
+                'heartRate': round(heart_rate + (60 if spike and s >= 30 else 0), 1),
+                'stressLevel': round(min(100, max(0, stress)), 1)
+            }
+            if rng.random() < 0.0003:
+                sample['fallDetected'] = True
+            samples.append(sample)
+        _resend(resends, out, t + WATCH_BATCH_SECONDS, 'process-wearable-data',
+                {'friendId': uid, 'deviceId': f"watch-{uid}", 'seq': seq, 'samples': samples})
+
+    for t in range(0, duration, STATUS_POLL_SECONDS):
+        out.append((t + phase + 1, 'get-user-status', _api({'friendId': uid})))
+    for t in range(0, duration, GROUP_POLL_SECONDS):
+        out.append((t + phase + 3, 'get-group-snapshot', _api({'userId': uid})))
+    for t in range(0, duration, DISTANCE_POLL_SECONDS):
+        out.append((t + phase + 2, 'get-distance-between-friends', _api({'userId': uid})))
+    for t in range(HISTORY_POLL_SECONDS, duration + 1, HISTORY_POLL_SECONDS):
+        out.append((t + phase, 'get-vitals-history', _api({
+            'friendId': uid,
+            'from': (start + timedelta(seconds=t - HISTORY_POLL_SECONDS)).isoformat(),
+            'to': (start + timedelta(seconds=t)).isoformat(),
+            'resolution': 'minute'
+        })))
+    for t in range(TRAIL_POLL_SECONDS, duration + 1, TRAIL_POLL_SECONDS):
+        out.append((t + phase, 'get-location-trail', _api({
+            'friendId': uid,
+            'from': (start + timedelta(seconds=t - TRAIL_POLL_SECONDS)).isoformat(),
+            'to': (start + timedelta(seconds=t)).isoformat()
+        })))
+    return out
+
+
+def _churn(rng, group, members, duration):
+    """Members befriend people outside the group: request, poll, accept, list."""
+    out = []
+    for n, t in enumerate(range(rng.randrange(CHURN_SECONDS), duration, CHURN_SECONDS)):
+        sender = rng.choice(members)
+        outsider = f"g{group:03d}x{n:02d}"
+        out += [
+            (t, 'add-friend-request', _api(body={'userId': sender, 'friendId': outsider})),
+            (t + 5, 'get-pending-requests', _api({'userId': outsider})),
+            (t + 10, 'accept-friend-request', _api(body={'userId': outsider, 'friendId': sender})),
+            (t + 15, 'get-accepted-friends', _api({'userId': sender})),
+        ]
+    return out
+
+
+def _login_bursts(rng, population, duration):
+    """Signups once, then everyone (re)opening the app at the start and every few minutes."""
+    out = []
+    accounts = max(1, population // 10)
+    for n in range(accounts):
+        out.append((0, 'create-user', _api(body={
+            'firstName': 'Fest', 'lastName': f"Goer{n}", 'email': f"fest{n}@example.com",
+            'phone': '4165550100', 'password': f"pw-{n}-secret"
+        })))
+    for t in range(0, duration, LOGIN_BURST_SECONDS):
+        for n in range(accounts):
+            out.append((t + 1 + rng.uniform(0, 10), 'login-user', _api(body={
+                'email': f"fest{n}@example.com", 'password': f"pw-{n}-secret"
+            })))
+    return out
@@ -1,82 +1,96 @@
-import json
-import boto3
 import os
-import math
-from boto3.dynamodb.conditions import Key
-
-# Setup
-dynamodb = boto3.resource('dynamodb')
-DYNAMO_TABLE_NAME = os.environ.get('DYNAMO_TABLE_NAME', 'FriendStatus')
-table = dynamodb.Table(DYNAMO_TABLE_NAME)
-
-# Haversine distance formula
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000  # meters
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    d_phi = math.radians(lat2 - lat1)
-    d_lambda = math.radians(lon2 - lon1)
-
-    a = math.sin(d_phi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(d_lambda/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-# Helper to get latest coordinates for a user
-def get_latest_coords(friend_id):
-    print(f"🔍 Querying location for: {friend_id}")
-    response = table.query(
-        KeyConditionExpression=Key('friendId').eq(friend_id),
-        ScanIndexForward=False,  # newest first
-        Limit=1
-    )
-    items = response.get("Items", [])
-    if not items:
-        raise ValueError(f"No location data found for friendId: {friend_id}")
-    item = items[0]
-    lat = float(item.get('latitude'))
-    lon = float(item.get('longitude'))
-    return lat, lon
+from pulse_common.friends import get_accepted_friend_ids
+from pulse_common.geo import haversine, distance_matrix, centroid
+from pulse_common.runtime import json_response, resource, table
+from pulse_common.sessions import authorize
+from pulse_common.status import get_latest_locations
+from pulse_common.telemetry import instrument, log_event
+
+# Setup: clients and tables are built on first use
+dynamodb = resource('dynamodb')
+CURRENT_STATUS_TABLE_NAME = os.environ.get('CURRENT_STATUS_TABLE_NAME', 'FriendCurrentStatus')
+FRIEND_GRAPH_TABLE_NAME = os.environ.get('FRIEND_GRAPH_TABLE_NAME', 'FriendGraph')
+friends_table = table(FRIEND_GRAPH_TABLE_NAME)
+
+MAX_GROUP_SIZE = 100
+
+# Group mode: full distance matrix plus distance to the group centroid
+def group_distances(friend_ids):
+    coords = get_latest_locations(dynamodb, CURRENT_STATUS_TABLE_NAME, friend_ids)
+    located = [fid for fid in friend_ids if fid in coords]
+    missing = [fid for fid in friend_ids if fid not in coords]
+    if not located:
+        raise ValueError("No location data found for any friend in the group")
+
+    points = [coords[fid] for fid in located]
+    matrix = distance_matrix(points)
+    center_lat, center_lon = centroid(points)
+    return {
+        'friendIds': located,
+        'distances': [[round(d, 2) for d in row] for row in matrix],
+        'centroid': {'latitude': center_lat, 'longitude': center_lon},
+        'distanceToCentroid': {
+            fid: round(haversine(lat, lon, center_lat, center_lon), 2)
+            for fid, (lat, lon) in zip(located, points)
+        },
+        'missing': missing
+    }
 
 # Main Lambda handler
+@instrument('get-distance-between-friends')
 def lambda_handler(event, context):
-    print("📥 EVENT RECEIVED:", json.dumps(event))
+    log_event(event, "📥 EVENT RECEIVED:")
 
     params = event.get('queryStringParameters', {}) or {}
     id1 = params.get('friendId1')
     id2 = params.get('friendId2')
+    group_ids = params.get('friendIds')
+    user_id = params.get('userId')
 
-    if not id1 or not id2:
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Both friendId1 and friendId2 are required'})
-        }
+    # A session token, if sent, must be valid
+    denied = authorize(event)
+    if denied:
+        return denied
 
     try:
-        # Query both users' latest coordinates
-        lat1, lon1 = get_latest_coords(id1)
-        lat2, lon2 = get_latest_coords(id2)
+        # 👥 Group mode: ?friendIds=alice,bob,carol or ?userId=alice
+        if group_ids or user_id:
+            if group_ids:
+                friend_ids = [fid.strip() for fid in group_ids.split(',') if fid.strip()]
+            else:
+                friend_ids = [user_id] + get_accepted_friend_ids(friends_table, user_id)
+            friend_ids = list(dict.fromkeys(friend_ids))  # de-duplicate, keep order
+
+            if len(friend_ids) > MAX_GROUP_SIZE:
+                return json_response(400, {'error': f'Groups are limited to {MAX_GROUP_SIZE} members'})
+
+            return json_response(200, group_distances(friend_ids))
+
+        if not id1 or not id2:
+            return json_response(400, {'error': 'Both friendId1 and friendId2 (or friendIds / userId) are required'})
+
+        # Read both users' current coordinates in one batched read
+        print(f"🔍 Querying location for: {id1}, {id2}")
+        coords = get_latest_locations(dynamodb, CURRENT_STATUS_TABLE_NAME, [id1, id2])
+        missing = [fid for fid in (id1, id2) if fid not in coords]
+        if missing:
+            raise ValueError(f"No location data found for friendId: {', '.join(missing)}")
+        lat1, lon1 = coords[id1]
+        lat2, lon2 = coords[id2]
 
         print(f"📍 {id1}: ({lat1}, {lon1})")
         print(f"📍 {id2}: ({lat2}, {lon2})")
 
         # Calculate and return distance
         distance = haversine(lat1, lon1, lat2, lon2)
-        return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'friendId1': id1,
-                'friendId2': id2,
-                'distance': round(distance, 2)
-            })
-        }
+        return json_response(200, {
+            'friendId1': id1,
+            'friendId2': id2,
+            'distance': round(distance, 2)
+        })
 
     except ValueError as ve:
-        return {
-            'statusCode': 404,
-            'body': json.dumps({'error': str(ve)})
-        }
+        return json_response(404, {'error': str(ve)})
 
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Internal server error', 'details': str(e)})
-        }
+        return json_response(500, {'error': 'Internal server error', 'details': str(e)})
@@ -0,0 +1,72 @@
+import os
+from pulse_common.runtime import conditional_json_response, json_response, not_modified, resource, table, JSON_HEADERS
+from pulse_common.sessions import authorize
+from pulse_common.snapshots import group_etag, load_marks
+from pulse_common.status import get_current_statuses
+from pulse_common.telemetry import instrument, log_event, set_property
+
+# Setup: clients and tables are built on first use
+dynamodb = resource('dynamodb')
+CURRENT_STATUS_TABLE_NAME = os.environ.get('CURRENT_STATUS_TABLE_NAME', 'FriendCurrentStatus')
+friends_table = table(os.environ.get('FRIEND_GRAPH_TABLE_NAME', 'FriendGraph'))
+
+# Fields returned per member; everything else on the record (e.g. vitalsBaseline) stays server-side
+SNAPSHOT_FIELDS = (
+    'heartRate', 'stressLevel', 'fallDetected',
+    'latitude', 'longitude', 'distanceFromFriends', 'nearestFriendId',
+    'sos', 'locationAt', 'vitalsAt'
+)
+
+# Helper: compact view of one member, dropping fields the record doesn't have yet
+def member_view(friend_id, record):
+    view = {'friendId': friend_id}
+    for field in SNAPSHOT_FIELDS:
+        if record.get(field) is not None:
+            view[field] = record[field]
+    stamps = [view[f] for f in ('locationAt', 'vitalsAt') if f in view]
+    if stamps:
+        view['updatedAt'] = max(stamps)
+    return view
+
+@instrument('get-group-snapshot')
+def lambda_handler(event, context):
+    log_event(event)
+
+    # Expect "userId" in query string
+    user_id = (event.get("queryStringParameters") or {}).get("userId")
+
+    if not user_id:
+        return json_response(400, {"error": "Missing 'userId' in query parameters"})
+
+    # A session token, if sent, must be valid and belong to this user
+    denied = authorize(event, user_id)
+    if denied:
+        return denied
+
+    try:
+        # One keyed query for the group and every member's status mark: if the client's ETag still
+        # matches, that is all an unchanged group costs
+        member_ids, marks = load_marks(friends_table, user_id)
+        etag = group_etag(member_ids, marks)
+        set_property('groupSize', len(member_ids))
+        unchanged = not_modified(event, etag, headers=JSON_HEADERS)
+        if unchanged:
+            set_property('notModified', True)
+            return unchanged
+
+        # Otherwise one batched read for every member's current status
+        records = get_current_statuses(dynamodb, CURRENT_STATUS_TABLE_NAME, member_ids, SNAPSHOT_FIELDS)
+
+        members = [member_view(fid, records[fid]) for fid in member_ids if fid in records]
+        snapshot = {
+            "userId": user_id,
+            "members": members,
+            "missing": [fid for fid in member_ids if fid not in records],
+            "updatedAt": max((m['updatedAt'] for m in members if 'updatedAt' in m), default=None)
+        }
+        set_property('notModified', False)
+        return conditional_json_response(event, snapshot, headers=JSON_HEADERS, etag=etag)
+
+    except Exception as e:
+        print("Error building group snapshot:", str(e))
+        return json_response(500, {"error": "Server error", "details": str(e)})
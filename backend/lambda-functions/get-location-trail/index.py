@@ -0,0 +1,53 @@
+import os
+from datetime import datetime, timedelta, timezone
+from pulse_common.runtime import json_response, table, JSON_HEADERS
+from pulse_common.sessions import authorize
+from pulse_common.telemetry import instrument, log_event
+from pulse_common.trails import query_trail, to_epoch, TOLERANCE_M
+
+# DynamoDB tables, built on first use
+trails_table = table(os.environ.get('TRAILS_TABLE_NAME', 'LocationTrails'))
+status_table = table(os.environ.get('CURRENT_STATUS_TABLE_NAME', 'FriendCurrentStatus'))
+
+DEFAULT_SPAN = timedelta(hours=1)
+MAX_SPAN = timedelta(hours=24)
+
+@instrument('get-location-trail')
+def lambda_handler(event, context):
+    log_event(event)
+
+    params = event.get("queryStringParameters") or {}
+    friend_id = params.get("friendId")
+    if not friend_id:
+        return json_response(400, {"error": "Missing 'friendId' in query parameters"})
+
+    # A session token, if sent, must be valid
+    denied = authorize(event)
+    if denied:
+        return denied
+
+    try:
+        end = to_epoch(params["to"]) if params.get("to") else int(datetime.now(timezone.utc).timestamp())
+        start = to_epoch(params["from"]) if params.get("from") else end - int(DEFAULT_SPAN.total_seconds())
+    except ValueError:
+        return json_response(400, {"error": "'from' and 'to' must be ISO 8601 timestamps"})
+    if start > end:
+        return json_response(400, {"error": "'from' must be before 'to'"})
+    if end - start > MAX_SPAN.total_seconds():
+        return json_response(400, {"error": f"Trails can be replayed {int(MAX_SPAN.total_seconds() // 3600)} hours at a time"})
+
+    try:
+        # One query for the sealed chunks plus the open buffer on the current-status record
+        points = query_trail(trails_table, status_table, friend_id, start, end)
+
+        return json_response(200, {
+            "friendId": friend_id,
+            "from": datetime.fromtimestamp(start, timezone.utc).isoformat(),
+            "to": datetime.fromtimestamp(end, timezone.utc).isoformat(),
+            "toleranceMeters": TOLERANCE_M,
+            "points": points
+        }, headers=JSON_HEADERS)
+
+    except Exception as e:
+        print("Error during DynamoDB query:", str(e))
+        return json_response(500, {"error": "Server error", "details": str(e)})
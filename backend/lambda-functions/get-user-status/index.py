@@ -1,62 +1,49 @@
-import json
-import boto3
 import os
-from boto3.dynamodb.conditions import Key
-from decimal import Decimal
+from pulse_common.runtime import json_response, table, JSON_HEADERS
+from pulse_common.sessions import authorize
+from pulse_common.telemetry import instrument, log_event
 
-# Custom encoder to handle Decimal values from DynamoDB
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super(DecimalEncoder, self).default(obj)
-
-# Initialize DynamoDB
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ.get('DYNAMO_TABLE_NAME', 'FriendStatus'))
+# DynamoDB table, built on first use
+status_table = table(os.environ.get('CURRENT_STATUS_TABLE_NAME', 'FriendCurrentStatus'))
 
+@instrument('get-user-status')
 def lambda_handler(event, context):
-    print("Received event:", json.dumps(event))
+    log_event(event)
 
     # Expect "friendId" in query string
-    friend_id = event.get("queryStringParameters", {}).get("friendId")
+    friend_id = (event.get("queryStringParameters") or {}).get("friendId")
 
     if not friend_id:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Missing 'friendId' in query parameters"})
-        }
+        return json_response(400, {"error": "Missing 'friendId' in query parameters"})
+
+    # A session token, if sent, must be valid
+    denied = authorize(event)
+    if denied:
+        return denied
 
     try:
-        # Query using 'friendId' as the partition key
-        response = table.query(
-            KeyConditionExpression=Key('friendId').eq(friend_id),
-            ScanIndexForward=False,  # Get the latest item first
-            Limit=1
-        )
-
-        items = response.get("Items", [])
-        if not items:
-            return {
-                "statusCode": 404,
-                "body": json.dumps({"error": "No status found for this friendId"})
-            }
-
-        latest = items[0]
-        return {
-            "statusCode": 200,
-            "headers": { "Content-Type": "application/json" },
-            "body": json.dumps({
-                "heartRate": latest.get("heartRate"),
-                "stressLevel": latest.get("stressLevel"),
-                "distanceFromFriends": latest.get("distanceFromFriends"),
-                "updatedAt": latest.get("updatedAt")
-            }, cls=DecimalEncoder)
-        }
+        # One keyed read of the write-through current-status record
+        response = status_table.get_item(Key={'friendId': friend_id})
+
+        latest = response.get("Item")
+        if not latest:
+            return json_response(404, {"error": "No status found for this friendId"})
+
+        location_at = latest.get("locationAt")
+        vitals_at = latest.get("vitalsAt")
+        return json_response(200, {
+            "heartRate": latest.get("heartRate"),
+            "stressLevel": latest.get("stressLevel"),
+            "fallDetected": latest.get("fallDetected", False),
+            "latitude": latest.get("latitude"),
+            "longitude": latest.get("longitude"),
+            "distanceFromFriends": latest.get("distanceFromFriends"),
+            "sos": latest.get("sos", False),
+            "locationAt": location_at,
+            "vitalsAt": vitals_at,
+            "updatedAt": max(filter(None, (location_at, vitals_at)), default=None)
+        }, headers=JSON_HEADERS)
 
     except Exception as e:
-        print("Error during DynamoDB query:", str(e))
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": "Server error", "details": str(e)})
-        }
+        print("Error during DynamoDB read:", str(e))
+        return json_response(500, {"error": "Server error", "details": str(e)})
@@ -0,0 +1,83 @@
+import os
+from datetime import datetime, timedelta, timezone
+from pulse_common.ingest import STAMP_FORMAT
+from pulse_common.rollups import choose_resolution, parse_timestamp, query_rollups, BUCKET_FORMATS, RAW_RETENTION
+from pulse_common.runtime import json_response, table, JSON_HEADERS
+from pulse_common.sessions import authorize
+from pulse_common.telemetry import instrument, log_event
+
+# DynamoDB tables, built on first use
+data_table = table(os.environ.get('DATA_TABLE_NAME', 'FriendStatus'))
+rollups_table = table(os.environ.get('ROLLUPS_TABLE_NAME', 'VitalsRollups'))
+
+DEFAULT_SPAN = timedelta(hours=1)
+RESOLUTIONS = ('raw',) + tuple(BUCKET_FORMATS)
+
+# Helper: Raw samples for short spans, straight from the wearable history table. Sample
+# timestamps are stored in the ingest STAMP_FORMAT (naive UTC), so the bounds use it too.
+def query_raw(friend_id, start, end):
+    start, end = (t.astimezone(timezone.utc).replace(tzinfo=None) for t in (start, end))
+    kwargs = {
+        'KeyConditionExpression': 'friendId = :fid AND #ts BETWEEN :start AND :end',
+        'ProjectionExpression': '#ts, heartRate, stressLevel, fallDetected',
+        'ExpressionAttributeNames': {'#ts': 'timestamp'},
+        'ExpressionAttributeValues': {
+            ':fid': friend_id,
+            ':start': start.strftime(STAMP_FORMAT),
+            ':end': end.strftime(STAMP_FORMAT)
+        }
+    }
+    points = []
+    while True:
+        response = data_table.query(**kwargs)
+        points += response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return points
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+@instrument('get-vitals-history')
+def lambda_handler(event, context):
+    log_event(event)
+
+    params = event.get("queryStringParameters") or {}
+    friend_id = params.get("friendId")
+    if not friend_id:
+        return json_response(400, {"error": "Missing 'friendId' in query parameters"})
+
+    # A session token, if sent, must be valid
+    denied = authorize(event)
+    if denied:
+        return denied
+
+    try:
+        end = parse_timestamp(params["to"]) if params.get("to") else datetime.now(timezone.utc)
+        start = parse_timestamp(params["from"]) if params.get("from") else end - DEFAULT_SPAN
+    except ValueError:
+        return json_response(400, {"error": "'from' and 'to' must be ISO 8601 timestamps"})
+    if start > end:
+        return json_response(400, {"error": "'from' must be before 'to'"})
+
+    resolution = params.get("resolution") or choose_resolution(start, end)
+    if resolution not in RESOLUTIONS:
+        return json_response(400, {"error": f"'resolution' must be one of {', '.join(RESOLUTIONS)}"})
+    # Raw samples past their TTL are gone, fall back to minute rollups
+    if resolution == 'raw' and start < datetime.now(timezone.utc) - RAW_RETENTION:
+        resolution = 'minute'
+
+    try:
+        if resolution == 'raw':
+            points = query_raw(friend_id, start, end)
+        else:
+            points = query_rollups(rollups_table, friend_id, resolution, start, end)
+
+        return json_response(200, {
+            "friendId": friend_id,
+            "resolution": resolution,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "points": points
+        }, headers=JSON_HEADERS)
+
+    except Exception as e:
+        print("Error during DynamoDB query:", str(e))
+        return json_response(500, {"error": "Server error", "details": str(e)})
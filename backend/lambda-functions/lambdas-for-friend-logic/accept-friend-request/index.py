@@ -1,48 +1,67 @@
-import boto3
 import os
 import json
 from datetime import datetime
+from pulse_common.friends import accept_actions, bulk_friend_ids, query_edges, transact_edges, INCOMING
+from pulse_common.runtime import json_response, resource, table
+from pulse_common.sessions import authorize
+from pulse_common.telemetry import count, instrument
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ.get('FRIENDS_TABLE_NAME', 'UserFriends'))
+dynamodb = resource('dynamodb')
+FRIEND_GRAPH_TABLE_NAME = os.environ.get('FRIEND_GRAPH_TABLE_NAME', 'FriendGraph')
 
+# 👥 Helper: Accept many pending requests at once. One query for the incoming requests,
+# then the swaps in transactions of up to 25 friends.
+def accept_bulk(user_id, friend_ids, added_at):
+    pending = {item['friendId'] for item in query_edges(table(FRIEND_GRAPH_TABLE_NAME), user_id, INCOMING, projection='friendId')}
+    actions = {
+        friend_id: accept_actions(FRIEND_GRAPH_TABLE_NAME, user_id, friend_id, added_at)
+        for friend_id in friend_ids if friend_id in pending
+    }
+    accepted, conflicts = transact_edges(dynamodb.meta.client, actions)
+    not_pending = [friend_id for friend_id in friend_ids if friend_id not in pending] + conflicts
+    count('friends.bulk_accepted', len(accepted))
+    print(f"👥 {user_id} accepted {len(accepted)} of {len(friend_ids)} requests.")
+    return json_response(200, {
+        'message': f'{len(accepted)} friend requests accepted',
+        'accepted': accepted,
+        'notPending': not_pending
+    })
+
+@instrument('accept-friend-request')
 def lambda_handler(event, context):
     try:
         body = json.loads(event['body'])
         user_id = body.get('userId')
         friend_id = body.get('friendId')
 
-        if not user_id or not friend_id:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Missing userId or friendId'})
-            }
-
-        # Update the original request's status
-        table.update_item(
-            Key={'userId': friend_id, 'friendId': user_id},
-            UpdateExpression='SET #s = :newStatus',
-            ExpressionAttributeNames={'#s': 'status'},
-            ExpressionAttributeValues={':newStatus': 'accepted'}
-        )
-
-        # Create a reverse record
-        table.put_item(Item={
-            'userId': user_id,
-            'friendId': friend_id,
-            'status': 'accepted',
-            'addedAt': datetime.utcnow().isoformat()
-        })
-
-        return {
-            'statusCode': 200,
-            'body': json.dumps({'message': 'Friend request accepted'})
-        }
+        try:
+            friend_ids = bulk_friend_ids(body)
+        except ValueError as e:
+            return json_response(400, {'error': str(e)})
+
+        if not user_id or not (friend_id or friend_ids):
+            return json_response(400, {'error': 'Missing userId or friendId'})
+
+        # A session token, if sent, must be valid and belong to this user
+        denied = authorize(event, user_id)
+        if denied:
+            return denied
+
+        added_at = datetime.utcnow().isoformat()
+
+        if friend_ids is not None:
+            return accept_bulk(user_id, friend_ids, added_at)
+
+        # Swap the pending edges for accepted edges in both partitions, all or nothing
+        client = dynamodb.meta.client
+        try:
+            client.transact_write_items(TransactItems=accept_actions(FRIEND_GRAPH_TABLE_NAME, user_id, friend_id, added_at))
+        except client.exceptions.TransactionCanceledException:
+            return json_response(404, {'error': 'No pending friend request from this user'})
+
+        return json_response(200, {'message': 'Friend request accepted'})
 
 
     except Exception as e:
         print("Error:", str(e))
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Internal server error'})
-        }
+        return json_response(500, {'error': 'Internal server error'})
@@ -1,12 +1,42 @@
-import boto3
 import os
 import json
 from datetime import datetime
+from pulse_common.friends import (
+    bulk_friend_ids, edge_kinds, invite_actions, transact_edges, ACCEPTED, OUTGOING
+)
+from pulse_common.runtime import json_response, resource, table
+from pulse_common.sessions import authorize
+from pulse_common.telemetry import count, instrument
 
-# Init DynamoDB resource
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ.get('FRIENDS_TABLE_NAME', 'UserFriends'))
+# Init DynamoDB resource (built on first use)
+dynamodb = resource('dynamodb')
+FRIEND_GRAPH_TABLE_NAME = os.environ.get('FRIEND_GRAPH_TABLE_NAME', 'FriendGraph')
 
+# 👥 Helper: Invite a whole list of friends at once (e.g. a group onboarding at an event).
+# One query for the sender's existing edges, then the new ones in transactions of up to 33 invites.
+def send_bulk(user_id, friend_ids, added_at):
+    skipped = {}
+    existing = edge_kinds(table(FRIEND_GRAPH_TABLE_NAME), user_id)
+    actions = {}
+    for friend_id in friend_ids:
+        kinds = existing.get(friend_id, set())
+        if friend_id == user_id:
+            skipped[friend_id] = 'self'
+        elif ACCEPTED in kinds:
+            skipped[friend_id] = 'alreadyFriends'
+        elif OUTGOING in kinds:
+            skipped[friend_id] = 'alreadyPending'
+        else:
+            actions[friend_id] = invite_actions(FRIEND_GRAPH_TABLE_NAME, user_id, friend_id, added_at)
+
+    sent, conflicts = transact_edges(dynamodb.meta.client, actions)
+    for friend_id in conflicts:
+        skipped[friend_id] = 'alreadyPending'
+    count('friends.bulk_invited', len(sent))
+    print(f"👥 {user_id} invited {len(sent)} of {len(friend_ids)} friends.")
+    return json_response(200, {'message': f'{len(sent)} friend requests sent', 'sent': sent, 'skipped': skipped})
+
+@instrument('add-friend-request')
 def lambda_handler(event, context):
     try:
         # Parse incoming JSOn request body
@@ -14,36 +44,39 @@ def lambda_handler(event, context):
         user_id = body.get('userId')
         friend_id = body.get('friendId')
 
+        try:
+            friend_ids = bulk_friend_ids(body)
+        except ValueError as e:
+            return json_response(400, {'error': str(e)})
+
         # Validate input
-        if not user_id or not friend_id:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Missing userId or friendId'})
-            }
+        if not user_id or not (friend_id or friend_ids):
+            return json_response(400, {'error': 'Missing userId or friendId'})
 
         # Make user not friend themselves
-        if user_id == friend_id:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Cannot friend yourself'})
-            }
-
-        # Create a pending friend request into DynamoDB
-        table.put_item(Item={
-            'userId': user_id,
-            'friendId': friend_id,
-            'status': 'pending',
-            'addedAt': datetime.utcnow().isoformat()
-        })
-
-        return {
-            'statusCode': 200,
-            'body': json.dumps({'message': 'Friend request sent'})
-        }
+        if friend_ids is None and user_id == friend_id:
+            return json_response(400, {'error': 'Cannot friend yourself'})
+
+        # A session token, if sent, must be valid and belong to this user
+        denied = authorize(event, user_id)
+        if denied:
+            return denied
+
+        added_at = datetime.utcnow().isoformat()
+
+        if friend_ids is not None:
+            return send_bulk(user_id, friend_ids, added_at)
+
+        # Create the pending request in both partitions atomically:
+        # outgoing for the sender, incoming for the recipient
+        client = dynamodb.meta.client
+        try:
+            client.transact_write_items(TransactItems=invite_actions(FRIEND_GRAPH_TABLE_NAME, user_id, friend_id, added_at))
+        except client.exceptions.TransactionCanceledException:
+            return json_response(409, {'error': 'Already friends or request already pending'})
+
+        return json_response(200, {'message': 'Friend request sent'})
 
     except Exception as e:
         print("Error:", str(e))
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Internal server error'})
-        }
+        return json_response(500, {'error': 'Internal server error'})
@@ -1,60 +1,37 @@
-import boto3
 import os
-import json
+from pulse_common.friends import query_edges, ACCEPTED
+from pulse_common.runtime import json_response, table
+from pulse_common.sessions import authorize
+from pulse_common.telemetry import instrument
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ.get('FRIENDS_TABLE_NAME', 'UserFriends'))
+graph_table = table(os.environ.get('FRIEND_GRAPH_TABLE_NAME', 'FriendGraph'))
 
+@instrument('get-accepted-friends')
 def lambda_handler(event, context):
     try:
         # Extract userId from query string parameters
         user_id = event['queryStringParameters'].get('userId')
 
         if not user_id:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Missing userId'})
-            }
+            return json_response(400, {'error': 'Missing userId'})
 
-        #-----Get all accepted friendships initiated BY this user-----
-        response1 = table.scan(
-            FilterExpression='userId = :uid AND #s = :status',
-            ExpressionAttributeValues={
-                ':uid': user_id,
-                ':status': 'accepted'
-            },
-            ExpressionAttributeNames={'#s': 'status'}
-        )
+        # A session token, if sent, must be valid and belong to this user
+        denied = authorize(event, user_id)
+        if denied:
+            return denied
 
-        #-----Get all accepted friendships RECEIVED by this user-----
-        response2 = table.scan(
-            FilterExpression='friendId = :uid AND #s = :status',
-            ExpressionAttributeValues={
-                ':uid': user_id,
-                ':status': 'accepted'
-            },
-            ExpressionAttributeNames={'#s': 'status'}
-        )
-
-        # Normalize both directions
-        friends = response1.get('Items', []) + [
+        #-----Accepted edges live in the user's own partition, whoever sent the request-----
+        friends = [
             {
-                #Swap original friendId with current user and vice versa
-                'userId': item['friendId'],
-                'friendId': item['userId'],
+                'userId': user_id,
+                'friendId': item['friendId'],
                 'status': item['status'],
                 'addedAt': item.get('addedAt'),
-            } for item in response2.get('Items', [])
+            } for item in query_edges(graph_table, user_id, ACCEPTED)
         ]
 
-        return {
-            'statusCode': 200,
-            'body': json.dumps(friends)
-        }
+        return json_response(200, friends)
 
     except Exception as e:
         print("Error:", str(e))
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Internal server error'})
-        }
+        return json_response(500, {'error': 'Internal server error'})
@@ -1,13 +1,13 @@
-import boto3
 import os
-import json
+from pulse_common.friends import query_edges, INCOMING
+from pulse_common.runtime import json_response, table
+from pulse_common.sessions import authorize
+from pulse_common.telemetry import instrument
 
-# Initialize Dynamodb resource
-dynamodb = boto3.resource('dynamodb')
-
-# Reference the 'UserFriends' table using an environment variable
-table = dynamodb.Table(os.environ.get('FRIENDS_TABLE_NAME', 'UserFriends'))
+# Reference the 'FriendGraph' table using an environment variable (built on first use)
+graph_table = table(os.environ.get('FRIEND_GRAPH_TABLE_NAME', 'FriendGraph'))
 
+@instrument('get-pending-requests')
 def lambda_handler(event, context):
     try:
         # Extract userId from query string parameters
@@ -15,35 +15,28 @@ def lambda_handler(event, context):
 
         # Validate the input
         if not user_id:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Missing userId'})
-            }
-
-        # Query DynamoDB for friend requests where the current user is the recipient and the request is still in a "pending" state
-        response = table.scan(
-            FilterExpression='friendId = :uid AND #s = :status',
-            ExpressionAttributeValues={
-                ':uid': user_id,
-                ':status': 'pending'
-            },
-            ExpressionAttributeNames={
-                '#s': 'status'  # Using an alias because 'status' is a reserved word
-            }
-        )
-
-        items = response.get('Items', [])
+            return json_response(400, {'error': 'Missing userId'})
+
+        # A session token, if sent, must be valid and belong to this user
+        denied = authorize(event, user_id)
+        if denied:
+            return denied
+
+        # Query the user's partition for incoming requests that are still in a "pending" state
+        items = [
+            {
+                # Same shape as before: userId is the sender, friendId the recipient
+                'userId': item['friendId'],
+                'friendId': user_id,
+                'status': item['status'],
+                'addedAt': item.get('addedAt'),
+            } for item in query_edges(graph_table, user_id, INCOMING)
+        ]
 
         # Return the list of pending friend requests
-        return {
-            'statusCode': 200,
-            'body': json.dumps(items)
-        }
+        return json_response(200, items)
 
     except Exception as e:
         # Log error to CloudWatch
         print("Error:", str(e))
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Internal server error'})
-        }
+        return json_response(500, {'error': 'Internal server error'})
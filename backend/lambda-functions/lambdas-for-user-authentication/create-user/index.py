@@ -1,42 +1,85 @@
-import bcrypt
 import json
-import boto3
 import os
 from datetime import datetime
 import random
-
-# Initialize DynamoDB
-dynamodb = boto3.resource('dynamodb')
+from pulse_common.notifications import subscribe_phone
+from pulse_common.passwords import hash_password
+from pulse_common.runtime import client, json_response, resource, table, CORS_HEADERS
+from pulse_common.sessions import issue_token, signing_enabled
+from pulse_common.telemetry import instrument, log_event
+
+# AWS clients and bcrypt are loaded on first use, so OPTIONS and 400s stay cheap
+dynamodb = resource('dynamodb')
+sns = client('sns')
 USERS_TABLE_NAME = os.environ.get('USERS_TABLE_NAME', 'Users')
+EMAILS_TABLE_NAME = os.environ.get('EMAILS_TABLE_NAME', 'UserEmails')
+SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
+
+MAX_USER_ID_ATTEMPTS = 3
 
 def generate_user_id(first_name, last_name):
     """Generates a unique user ID"""
     return f"{first_name}{last_name}_{random.randint(1000, 9999)}"
 
 
-def build_response(status_code, body_dict):
-    """Helper to include CORS headers and JSON body"""
-    return {
-        'statusCode': status_code,
-        'headers': {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'POST, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type',
-        },
-        'body': json.dumps(body_dict)
-    }
+def normalize_email(email):
+    """Emails are matched case-insensitively"""
+    return email.strip().lower()
+
+
+def email_taken(email_key):
+    """Whether a login record already claims this email (the transaction stays the authority)"""
+    return 'Item' in table(EMAILS_TABLE_NAME).get_item(Key={'email': email_key}, ProjectionExpression='email')
 
+
+def create_user_records(user, email_key):
+    """
+    Writes the user and the email -> userId login record in one transaction.
+    Returns 'email_taken', 'user_id_taken' or None on success.
+    """
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {
+                'Put': {
+                    'TableName': EMAILS_TABLE_NAME,
+                    'Item': {
+                        'email': {'S': email_key},
+                        'userId': {'S': user['userId']},
+                        'password': {'S': user['password']}
+                    },
+                    'ConditionExpression': 'attribute_not_exists(email)'
+                }
+            },
+            {
+                'Put': {
+                    'TableName': USERS_TABLE_NAME,
+                    'Item': {k: {'S': str(v)} for k, v in user.items()},
+                    'ConditionExpression': 'attribute_not_exists(userId)'
+                }
+            }
+        ])
+        return None
+    except dynamodb.meta.client.exceptions.TransactionCanceledException as e:
+        reasons = [r.get('Code') for r in e.response.get('CancellationReasons', [])]
+        if reasons and reasons[0] == 'ConditionalCheckFailed':
+            return 'email_taken'
+        if len(reasons) > 1 and reasons[1] == 'ConditionalCheckFailed':
+            return 'user_id_taken'
+        raise
+
+
+@instrument('create-user')
 def lambda_handler(event, context):
     method = event.get("requestContext", {}).get("http", {}).get("method")
     
     if method == "OPTIONS":
-        return build_response(200, {})
+        return json_response(200, {}, headers=CORS_HEADERS)
 
-    print("Received event:", json.dumps(event))  # Helpful for debugging
+    log_event(event)
 
     try:
         if 'body' not in event or not event['body']:
-            return build_response(400, {'error': 'Empty request body'})
+            return json_response(400, {'error': 'Empty request body'}, headers=CORS_HEADERS)
 
         body = json.loads(event['body'])
 
@@ -44,7 +87,7 @@ def lambda_handler(event, context):
         missing_fields = [f for f in required_fields if not body.get(f)]
 
         if missing_fields:
-            return build_response(400, {'error': f"Missing required fields: {', '.join(missing_fields)}"})
+            return json_response(400, {'error': f"Missing required fields: {', '.join(missing_fields)}"}, headers=CORS_HEADERS)
 
         first_name = body['firstName']
         last_name = body['lastName']
@@ -52,27 +95,49 @@ def lambda_handler(event, context):
         phone = body['phone']
         password = body['password']
 
-        # Hash password
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        user_id = generate_user_id(first_name, last_name)
+        # A duplicate sign-up is turned away before it pays for a bcrypt hash
+        if email_taken(normalize_email(email)):
+            return json_response(409, {'error': 'An account with this email already exists'}, headers=CORS_HEADERS)
+
+        # Hash password at the container's calibrated bcrypt cost
+        hashed_password = hash_password(password)
         created_at = datetime.utcnow().isoformat()
 
-        # Write to DynamoDB
-        table = dynamodb.Table(USERS_TABLE_NAME)
-        table.put_item(Item={
-            'userId': user_id,
-            'firstName': first_name,
-            'lastName': last_name,
-            'email': email,
-            'phone': phone,
-            'password': hashed_password,
-            'createdAt': created_at
-        })
+        # Write to DynamoDB, claiming the email so it stays unique
+        for _ in range(MAX_USER_ID_ATTEMPTS):
+            user_id = generate_user_id(first_name, last_name)
+            result = create_user_records({
+                'userId': user_id,
+                'firstName': first_name,
+                'lastName': last_name,
+                'email': email,
+                'phone': phone,
+                'password': hashed_password,
+                'createdAt': created_at
+            }, normalize_email(email))
+            if result != 'user_id_taken':
+                break
+
+        if result == 'email_taken':
+            return json_response(409, {'error': 'An account with this email already exists'}, headers=CORS_HEADERS)
+        if result == 'user_id_taken':
+            return json_response(500, {'error': 'Could not allocate a user ID, please retry'}, headers=CORS_HEADERS)
 
         print(f"[SUCCESS] User {user_id} created")
 
-        return build_response(200, {'message': 'User created', 'userId': user_id})
+        # Subscribe the phone to alerts addressed to this user; signup still succeeds if SNS fails
+        if SNS_TOPIC_ARN:
+            try:
+                subscribe_phone(sns, SNS_TOPIC_ARN, user_id, phone)
+            except Exception as e:
+                print("[WARN] Could not subscribe phone to alerts:", str(e))
+
+        # A session token too, so the app doesn't pay for a bcrypt login right after signing up
+        result = {'message': 'User created', 'userId': user_id}
+        if signing_enabled():
+            result['token'], result['expiresAt'] = issue_token(user_id)
+        return json_response(200, result, headers=CORS_HEADERS)
 
     except Exception as e:
         print("[ERROR]", str(e))
-        return build_response(500, {'error': 'Internal server error'})
+        return json_response(500, {'error': 'Internal server error'}, headers=CORS_HEADERS)
@@ -1,11 +1,48 @@
-import boto3
 import json
 import os
-import bcrypt
+from pulse_common.passwords import check_password, hash_password, needs_rehash
+from pulse_common.runtime import json_response, resource, table
+from pulse_common.sessions import issue_token, signing_enabled
+from pulse_common.telemetry import count, instrument
 
-dynamodb = boto3.resource('dynamodb')
+# bcrypt and the DynamoDB tables are only loaded once a request gets that far
+dynamodb = resource('dynamodb')
+EMAILS_TABLE_NAME = os.environ.get('EMAILS_TABLE_NAME', 'UserEmails')
 USERS_TABLE_NAME = os.environ.get('USERS_TABLE_NAME', 'Users')
 
+# Helper: Re-hash at the current bcrypt cost. Both copies of the hash change together,
+# and only if nobody changed the password since we read it.
+def upgrade_hash(email_key, user_id, old_hash, password):
+    new_hash = hash_password(password)
+    client = dynamodb.meta.client
+    try:
+        client.transact_write_items(TransactItems=[
+            {
+                'Update': {
+                    'TableName': EMAILS_TABLE_NAME,
+                    'Key': {'email': {'S': email_key}},
+                    'UpdateExpression': 'SET #pw = :new',
+                    'ConditionExpression': '#pw = :old',
+                    'ExpressionAttributeNames': {'#pw': 'password'},
+                    'ExpressionAttributeValues': {':new': {'S': new_hash}, ':old': {'S': old_hash}}
+                }
+            },
+            {
+                'Update': {
+                    'TableName': USERS_TABLE_NAME,
+                    'Key': {'userId': {'S': user_id}},
+                    'UpdateExpression': 'SET #pw = :new',
+                    'ConditionExpression': 'attribute_exists(userId)',
+                    'ExpressionAttributeNames': {'#pw': 'password'},
+                    'ExpressionAttributeValues': {':new': {'S': new_hash}}
+                }
+            }
+        ])
+        count('passwords.rehashed')
+    except client.exceptions.TransactionCanceledException:
+        print(f"Skipped password re-hash for {user_id}: record changed concurrently")
+
+@instrument('login-user')
 def lambda_handler(event, context):
     try:
         body = json.loads(event['body'])
@@ -13,50 +50,39 @@ def lambda_handler(event, context):
         password = body.get('password')
 
         if not email or not password:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Missing email or password'})
-            }
+            return json_response(400, {'error': 'Missing email or password'})
 
-        # Fetch user by email
-        table = dynamodb.Table(USERS_TABLE_NAME)
-        response = table.scan(
-            FilterExpression='email = :e',
-            ExpressionAttributeValues={':e': email}
-        )
+        # Fetch the login record keyed by email (written by create-user)
+        email_key = email.strip().lower()
+        response = table(EMAILS_TABLE_NAME).get_item(Key={'email': email_key})
 
-        items = response.get('Items', [])
+        user = response.get('Item')
 
-        if not items:
-            return {
-                'statusCode': 404,
-                'body': json.dumps({'error': 'User not found'})
-            }
+        if not user:
+            return json_response(404, {'error': 'User not found'})
 
-        user = items[0]
         stored_hash = user.get('password')
 
         if not stored_hash:
-            return {
-                'statusCode': 500,
-                'body': json.dumps({'error': 'Password not stored'})
-            }
+            return json_response(500, {'error': 'Password not stored'})
 
         # Check password
-        if bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8')):
-            return {
-                'statusCode': 200,
-                'body': json.dumps({'userId': user['userId']})
-            }
-        else:
-            return {
-                'statusCode': 401,
-                'body': json.dumps({'error': 'Incorrect password'})
-            }
+        if not check_password(password, stored_hash):
+            return json_response(401, {'error': 'Incorrect password'})
+
+        # Hashes made at an older, cheaper cost are upgraded while we have the plaintext
+        if needs_rehash(stored_hash):
+            try:
+                upgrade_hash(email_key, user['userId'], stored_hash, password)
+            except Exception as e:
+                print("Password re-hash failed:", str(e))
+
+        # Other handlers accept the token with an HMAC check, so clients log in once per session
+        result = {'userId': user['userId']}
+        if signing_enabled():
+            result['token'], result['expiresAt'] = issue_token(user['userId'])
+        return json_response(200, result)
 
     except Exception as e:
         print("Error:", str(e))
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Internal server error'})
-        }
+        return json_response(500, {'error': 'Internal server error'})
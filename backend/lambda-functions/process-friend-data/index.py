@@ -1,37 +1,177 @@
 from decimal import Decimal
 import json
-import boto3
 import os
 from datetime import datetime
-import time
+from pulse_common.cache import LRUCache
+from pulse_common.cadence import ping_interval
+from pulse_common.clusters import GroupClusters, MIN_POINTS
+from pulse_common.concurrency import gather
+from pulse_common.escalations import EscalationScheduler, DynamoEscalationStore
+from pulse_common.friends import get_accepted_friend_ids
+from pulse_common.geofence import GeofenceCache, transitions, FLAGGED, VENUE
+from pulse_common.geo import haversine, centroid
+from pulse_common.ingest import IngestGuard, StatusWrite, capture_time, request_keys, DUPLICATE, WRITTEN
+from pulse_common.notifications import AlertNotifier, ALERT, CRITICAL, WARNING, SELF
+from pulse_common.preferences import PreferencesCache
+from pulse_common.runtime import client, json_response, resource, table
+from pulse_common.sessions import authorize
+from pulse_common.snapshots import GroupMarker
+from pulse_common.status import get_latest_locations, LOCATION_STAMP
+from pulse_common.trails import buffer_entry, seal_buffer, BUFFER_FIELD
+from pulse_common.telemetry import count, debug, instrument, log_event, span
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-sns = boto3.client('sns')
+# Initialize AWS clients (built on first use)
+dynamodb = resource('dynamodb')
+sns = client('sns')
 
 # Environment variables
 DYNAMO_TABLE_NAME = os.environ.get('DYNAMO_TABLE_NAME', 'FriendStatus')
 PREFERENCES_TABLE_NAME = os.environ.get('PREFERENCES_TABLE_NAME', 'UserPreferences')
-USERS_TABLE_NAME = os.environ.get('USERS_TABLE_NAME', 'Users')
+FRIEND_GRAPH_TABLE_NAME = os.environ.get('FRIEND_GRAPH_TABLE_NAME', 'FriendGraph')
+CURRENT_STATUS_TABLE_NAME = os.environ.get('CURRENT_STATUS_TABLE_NAME', 'FriendCurrentStatus')
+ESCALATIONS_TABLE_NAME = os.environ.get('ESCALATIONS_TABLE_NAME', 'PendingEscalations')
+INCIDENTS_TABLE_NAME = os.environ.get('INCIDENTS_TABLE_NAME', 'AlertIncidents')
+GEOFENCES_TABLE_NAME = os.environ.get('GEOFENCES_TABLE_NAME', 'Geofences')
+TRAILS_TABLE_NAME = os.environ.get('TRAILS_TABLE_NAME', 'LocationTrails')
+SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
+
+# One FriendStatus item per ping is superseded by trail chunks; keep writing it only while migrating
+WRITE_PING_HISTORY = os.environ.get('WRITE_PING_HISTORY', 'false').lower() in ('1', 'true', 'yes')
+
+# Preferences cached across warm invocations
+preferences_cache = PreferencesCache(dynamodb, PREFERENCES_TABLE_NAME)
+
+# Site map zones, indexed once per container and refreshed every few minutes
+geofences = GeofenceCache(table(GEOFENCES_TABLE_NAME))
+
+# Each user's circle, clustered; a warm container only reclusters the members that moved since
+group_clusters = LRUCache(maxsize=int(os.environ.get('CLUSTER_CACHE_SIZE', 1024)),
+                          ttl=float(os.environ.get('CLUSTER_CACHE_SECONDS', 900)))
+
+# Drops resent pings (client seq / idempotencyKey) and coalesces overlapping writes per friend
+ping_guard = IngestGuard(table(CURRENT_STATUS_TABLE_NAME), 'pingDedup', LOCATION_STAMP)
+
+# Pending "still far away" alerts, fired later by the sweep-escalations function
+escalations = EscalationScheduler(DynamoEscalationStore(table(ESCALATIONS_TABLE_NAME)))
+
+# Coalesces repeated alerts per friend and fans out to their friends in batched publishes
+notifier = AlertNotifier(
+    sns, SNS_TOPIC_ARN,
+    table(INCIDENTS_TABLE_NAME),
+    table(FRIEND_GRAPH_TABLE_NAME)
+)
+
+# Marks the friend's circle's group snapshots as changed, so their re-polls pick this ping up
+group_marker = GroupMarker(table(FRIEND_GRAPH_TABLE_NAME))
+
+# Set on the current-status record while the friend is out of range, read back with the write
+ESCALATION_FLAG = 'escalationPending'
 
 # Default safety thresholds
 DEFAULT_MAX_DISTANCE_APART = 250  # meters
 DEFAULT_COUNTDOWN_BEFORE_NOTIFY = 600  # seconds
 
-# 🔎 Helper: Get phone number by userId
-def get_user_phone(friend_id):
+# Helper: Latest positions of the user's accepted friends (graph query, then one batched read).
+# A failed lookup only means falling back to the client's distance.
+def load_friend_locations(friend_id):
     try:
-        users_table = dynamodb.Table(USERS_TABLE_NAME)
-        response = users_table.get_item(Key={'userId': friend_id})
-        user = response.get('Item')
-        if user and 'phone' in user:
-            return f"+1{user['phone']}"  # Assumes phone is stored as 10-digit string
+        friend_ids = get_accepted_friend_ids(table(FRIEND_GRAPH_TABLE_NAME), friend_id)
+        return get_latest_locations(dynamodb, CURRENT_STATUS_TABLE_NAME, friend_ids)
     except Exception as e:
-        print(f"❌ Failed to fetch phone for {friend_id}: {e}")
-    return None
+        print(f"Error loading friend locations: {str(e)}")
+        return None
+
+# Helper: A position the rest of the pipeline can use: finite numbers, on the globe
+def valid_position(latitude, longitude):
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return False
+    return -90 <= latitude <= 90 and -180 <= longitude <= 180
+
+# Helper: Preferences (through the warm cache) or defaults; never raises
+def load_preferences(friend_id):
+    try:
+        preferences = preferences_cache.get(friend_id)
+        max_distance_apart = preferences.get('maxDistanceApart', DEFAULT_MAX_DISTANCE_APART)
+        countdown_before_notify = preferences.get('countdownBeforeNotify', DEFAULT_COUNTDOWN_BEFORE_NOTIFY)
+        print(f"Loaded preferences for {friend_id}: maxDistanceApart={max_distance_apart}, countdownBeforeNotify={countdown_before_notify}")
+        return max_distance_apart, countdown_before_notify
+    except Exception as e:
+        print(f"Error loading preferences: {str(e)}")
+        return DEFAULT_MAX_DISTANCE_APART, DEFAULT_COUNTDOWN_BEFORE_NOTIFY
+
+# Helper: Geofence index, or None if zones can't be loaded (zone membership is then left untouched)
+def load_geofences():
+    try:
+        index = geofences.index()
+        return index if len(index) else None
+    except Exception as e:
+        print(f"Error loading geofences: {str(e)}")
+        return None
+
+# 🗺️ Helper: Alert on zone transitions only: leaving the venue, entering a flagged zone
+def notify_zone_transitions(friend_id, index, previous, current, gps):
+    entered, exited = transitions(previous, current)
+    for zone_id in entered + exited:
+        zone = index.zones.get(zone_id)
+        if zone is None:
+            continue  # zone removed from the site map since the last ping
+        # The reverse transition does not resolve the incident: GPS jitter along an edge would
+        # otherwise re-alert on every crossing, so re-crossings inside the window are coalesced
+        if zone.kind == VENUE:
+            alerting = zone_id in exited
+        else:
+            alerting = zone.kind == FLAGGED and zone_id in entered
+        if not alerting:
+            continue
+        cause = f'zone#{zone_id}'
+        if zone.kind == VENUE:
+            message = f'⚠️ Friend {friend_id} left {zone.name}.\nGPS: {gps}'
+            severity = WARNING
+        else:
+            message = f'🚧 Friend {friend_id} entered {zone.name}.\nGPS: {gps}'
+            severity = ALERT
+        count('geofence.transitions')
+        if notifier.notify(friend_id, cause, severity, message):
+            print(f"🗺️ Zone alert queued for {friend_id}: {cause}")
+
+# 📏 Helper: Cluster the user's circle and compute the distances to the nearest friend and to the group centroid
+def compute_group_distances(friend_id, latitude, longitude, max_distance_apart, locations):
+    if not locations:
+        return None
+
+    # DBSCAN with eps = the allowed distance: only a member outside every sub-group is separated,
+    # however many sub-groups the circle has split into. In a small circle, half of it is a sub-group
+    # even if that is fewer than MIN_POINTS, so a couple or a trio is not flagged as a whole.
+    eps = max(float(max_distance_apart), 1.0)
+    min_points = min(MIN_POINTS, max(2, (len(locations) + 2) // 2))
+    clusters = group_clusters.get(friend_id)
+    if clusters is None or clusters.eps != eps or clusters.min_points != min_points:
+        clusters = GroupClusters(eps, min_points=min_points, ref_lat=latitude)
+        group_clusters.put(friend_id, clusters)
+    with clusters.lock, span('cluster.sync'):
+        moved = clusters.sync({**locations, friend_id: (latitude, longitude)})
+        nearest_id, nearest_distance = clusters.grid.nearest(latitude, longitude, exclude=friend_id)
+        groups = clusters.clusters()
+    count('cluster.moved', moved)
+    if nearest_id is None:
+        return None
+
+    own = next((group for group in groups if friend_id in group), None)
+    center_lat, center_lon = centroid(list(locations.values()) + [(latitude, longitude)])
+    return {
+        'distanceFromFriends': round(nearest_distance, 2),
+        'nearestFriendId': nearest_id,
+        'distanceFromGroupCentroid': round(haversine(latitude, longitude, center_lat, center_lon), 2),
+        'isolated': own is None,
+        'clusterSize': len(own) if own else 1,
+        'clusterCount': len(groups)
+    }
 
+@instrument('process-friend-data')
 def lambda_handler(event, context):
-    print("Received event:", json.dumps(event))  # Debugging incoming event
+    log_event(event)
 
     # Parse the JSON request body
     body = json.loads(event.get('body', '{}'))
@@ -42,75 +182,193 @@ def lambda_handler(event, context):
     longitude = body.get('longitude')
     sos_pressed = body.get('sos', False)
     distance_apart = body.get('distanceFromFriends', 0)
-    timestamp = datetime.utcnow().isoformat()
+    # The device's capture time when it sends one, so a resent ping keeps its original time
+    timestamp = capture_time(body.get('timestamp'), datetime.utcnow())
 
-    gps = f"{latitude},{longitude}" if latitude and longitude else "unknown"
-
-    # Load user-specific preferences or fallback to defaults
+    if not friend_id:
+        return json_response(400, {'error': 'friendId is required'})
     try:
-        preferences_table = dynamodb.Table(PREFERENCES_TABLE_NAME)
-        response = preferences_table.get_item(Key={'friendId': friend_id})
-        preferences = response.get('Item', {})
-        max_distance_apart = preferences.get('maxDistanceApart', DEFAULT_MAX_DISTANCE_APART)
-        countdown_before_notify = preferences.get('countdownBeforeNotify', DEFAULT_COUNTDOWN_BEFORE_NOTIFY)
-        print(f"Loaded preferences for {friend_id}: maxDistanceApart={max_distance_apart}, countdownBeforeNotify={countdown_before_notify}")
-    except Exception as e:
-        print(f"Error loading preferences: {str(e)}")
-        max_distance_apart = DEFAULT_MAX_DISTANCE_APART
-        countdown_before_notify = DEFAULT_COUNTDOWN_BEFORE_NOTIFY
+        seq, idempotency_key = request_keys(body)
+    except (TypeError, ValueError) as e:
+        return json_response(400, {'error': str(e)})
+    # A ping may come without a position (an SOS with no GPS fix); one that has one needs both halves
+    has_location = latitude is not None and longitude is not None
+    if has_location and not valid_position(latitude, longitude):
+        return json_response(400, {'error': 'latitude and longitude must be numbers in range'})
+
+    # A session token, if sent, must be valid and belong to this user
+    denied = authorize(event, friend_id)
+    if denied:
+        return denied
+
+    # 🔁 A resend this container has already applied costs no AWS call at all
+    keyed = seq is not None or idempotency_key is not None
+    if keyed and ping_guard.is_duplicate(friend_id, seq, idempotency_key):
+        count('ingest.duplicates')
+        return json_response(200, {'message': 'Duplicate ping ignored.', 'duplicate': True})
+
+    gps = f"{latitude},{longitude}" if has_location else "unknown"
+
+    # 🚨 SOS Button was pressed: alert the friend's whole circle before anything else, so the
+    # alert never waits on the reads and writes a routine ping needs
+    if sos_pressed:
+        message = f'🚨 ALERT: Friend {friend_id} pressed SOS button!\nGPS: {gps}'
+        try:
+            if notifier.notify(friend_id, 'sos', CRITICAL, message) and notifier.flush():
+                print(f"📣 SOS alert sent to {friend_id}'s friends!")
+        except Exception as e:
+            print(f"❌ Error sending SOS alert: {str(e)}")
+
+    # Preferences and the friends' positions don't depend on each other, so they are read concurrently
+    (max_distance_apart, countdown_before_notify), locations, geofence_index, _ = gather(
+        lambda: load_preferences(friend_id),
+        lambda: load_friend_locations(friend_id) if has_location else None,
+        lambda: load_geofences() if has_location else None,
+        lambda: ping_guard.prefetch(friend_id) if keyed else None
+    )
+    debug(f"Preferences cache: {preferences_cache.stats()}")
+
+    # 📏 Compute distance from friends on the server instead of trusting the client value
+    group_distances = None
+    if locations:
+        try:
+            group_distances = compute_group_distances(friend_id, float(latitude), float(longitude), max_distance_apart, locations)
+        except Exception as e:
+            print(f"Error computing distance from friends: {str(e)}")
+    # 🗺️ Zones containing this position
+    zones = None
+    if geofence_index:
+        with span('geofence.lookup'):
+            zones = geofence_index.containing(float(latitude), float(longitude))
+
+    if group_distances:
+        distance_apart = group_distances['distanceFromFriends']
+        print(f"Computed distance for {friend_id}: {group_distances}")
+    else:
+        print("⚠️ No located friends, falling back to client-supplied distanceFromFriends.")
+    # With the group clustered, separated means nobody within reach; split sub-groups that are
+    # each together are not separated
+    separated = group_distances['isolated'] if group_distances else distance_apart > max_distance_apart
 
     # 📝 Write the current status to DynamoDB
     try:
-        status_table = dynamodb.Table(DYNAMO_TABLE_NAME)
+        status_table = table(DYNAMO_TABLE_NAME)
         item = {
             "friendId": friend_id,
-            "latitude": Decimal(str(latitude)),
-            "longitude": Decimal(str(longitude)),
             "distanceFromFriends": Decimal(str(distance_apart)),
-            "sos": False,
+            "sos": bool(sos_pressed),
             "updatedAt": timestamp
         }
-        print("Putting this item into DynamoDB:", json.dumps(item, default=str))
-        status_table.put_item(Item=item)
+        # Without a position the last known one stays on the record
+        if has_location:
+            item["latitude"] = Decimal(str(latitude))
+            item["longitude"] = Decimal(str(longitude))
+        if group_distances:
+            item["nearestFriendId"] = group_distances['nearestFriendId']
+            item["distanceFromGroupCentroid"] = Decimal(str(group_distances['distanceFromGroupCentroid']))
+        debug("Putting this item into DynamoDB:", item)
+
+        # Write-through to the current-status record (location fields only). Zone membership, the
+        # trail entry and the dedup window ride along, and the old values come back with the write,
+        # so no extra read. Pings for this friend that overlap in this process share one write.
+        current_fields = {k: v for k, v in item.items() if k not in ('friendId', 'updatedAt')}
+        if zones is not None:
+            current_fields['zones'] = zones
+        # Whether a countdown may be running, so an in-range ping only pays for the cancel when one
+        # was (an SOS ping leaves the flag alone: it skips the distance checks)
+        if not sos_pressed:
+            current_fields[ESCALATION_FLAG] = bool(separated)
+        trail_entry = buffer_entry(timestamp, latitude, longitude) if has_location else None
+        outcome, previous, appended = ping_guard.submit(friend_id, StatusWrite(
+            current_fields, timestamp, seq, idempotency_key,
+            append={BUFFER_FIELD: [trail_entry]} if has_location else None
+        ))
+        if outcome == DUPLICATE:
+            count('ingest.duplicates')
+            print(f"🔁 Duplicate ping from {friend_id} dropped.")
+            return json_response(200, {'message': 'Duplicate ping ignored.', 'duplicate': True})
+        if outcome != WRITTEN:
+            count(f'ingest.{outcome}')
+        if WRITE_PING_HISTORY:
+            status_table.put_item(Item=item)
         print("✅ Friend status saved.")
     except Exception as e:
         print("❌ Error writing to DynamoDB:", str(e))
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Failed to save data to DynamoDB', 'details': str(e)})
-        }
+        return json_response(500, {'error': 'Failed to save data to DynamoDB', 'details': str(e)})
 
-    # Get phone number of this user
-    phone_number = get_user_phone(friend_id)
-    if not phone_number:
-        print("⚠️ No phone number found, skipping SMS.")
-    else:
-        # 🚨 SOS Button was pressed
-        if sos_pressed:
-            message = f'🚨 ALERT: Friend {friend_id} pressed SOS button!\nGPS: {gps}'
-            sns.publish(PhoneNumber=phone_number, Message=message)
-            print(f"📣 SOS alert sent to {phone_number}!")
-
-        # 📍 Friend is too far away
-        elif distance_apart > max_distance_apart:
+    # 🧵 Seal the trail buffer into a compressed chunk once it is full; a stale ping's entry is
+    # sealed by the next current one, and a coalesced one's went out with the ping that did the write
+    if has_location and previous is not None:
+        try:
+            chunk = seal_buffer(table(TRAILS_TABLE_NAME), table(CURRENT_STATUS_TABLE_NAME), friend_id,
+                                previous.get(BUFFER_FIELD, []) + appended[BUFFER_FIELD])
+            if chunk:
+                count('trail.chunks')
+                print(f"🧵 Trail chunk {chunk['chunkStart']}: {chunk['pingCount']} pings -> {chunk['pointCount']} points")
+        except Exception as e:
+            print(f"❌ Error sealing trail buffer: {str(e)}")
+
+    # 📍 Friend is too far away: start the countdown, sweep-escalations sends the final alert
+    # (an SOS ping has already raised its own alert above)
+    if not sos_pressed and separated:
+        started = escalations.schedule(
+            friend_id,
+            countdown_before_notify,
+            gps=gps,
+            maxDistanceApart=max_distance_apart,
+            countdownBeforeNotify=countdown_before_notify
+        )
+        if not started:
+            print(f"⏳ Escalation already pending for {friend_id}.")
+        else:
+            print(f"⏳ Final alert scheduled in {countdown_before_notify} seconds.")
             warning_message = (
                 f'⚠️ WARNING: You ({friend_id}) are more than {max_distance_apart}m from your friends.\n'
                 f'GPS: {gps}\nRespond within {countdown_before_notify} seconds.'
             )
-            sns.publish(PhoneNumber=phone_number, Message=warning_message)
-            print(f"📩 Distance warning sent to {phone_number}.")
+            if notifier.notify(friend_id, 'distance', WARNING, warning_message, audience=SELF):
+                print(f"📩 Distance warning queued for {friend_id}.")
 
-            print(f"⏳ Waiting {countdown_before_notify} seconds before alerting others...")
-            time.sleep(min(countdown_before_notify, 10))  # simulate time for demo
+    # ✅ Back within range: cancel any pending escalation and close the incident. Only the ping
+    # that wrote the status checks, and only if the previous one left the flag set (or, on records
+    # from before the flag, may have). The incident is closed even when the final alert already
+    # fired, so wandering off again warns and escalates afresh.
+    elif not sos_pressed and previous is not None and previous.get(ESCALATION_FLAG, True):
+        if escalations.cancel(friend_id):
+            print(f"✅ {friend_id} is back with their friends, escalation cancelled.")
+        notifier.resolve(friend_id, 'distance')
 
-            alert_message = (
-                f'🚨 ALERT: {friend_id} is still far from their friends after {countdown_before_notify} seconds.\n'
-                f'GPS: {gps}\nPlease check on them.'
-            )
-            sns.publish(PhoneNumber=phone_number, Message=alert_message)
-            print(f"📣 Final alert sent to {phone_number}.")
+    # 🗺️ Entered / left zones since the last (older) ping; a stale ping changes nothing
+    if zones is not None and previous is not None:
+        try:
+            notify_zone_transitions(friend_id, geofence_index, previous.get('zones', []), zones, gps)
+        except Exception as e:
+            print(f"❌ Error raising zone alerts: {str(e)}")
 
-    return {
-        'statusCode': 200,
-        'body': json.dumps({'message': 'Friend data processed successfully.'})
-    }
+    # 📣 One batched publish for whatever this ping raised
+    try:
+        notifier.flush()
+    except Exception as e:
+        print(f"❌ Error publishing alerts: {str(e)}")
+
+    # 👀 Let the circle's group snapshots see the new status: at once for an SOS pressed or
+    # cleared, otherwise at most once a minute
+    if outcome == WRITTEN:
+        try:
+            group_marker.mark(friend_id, timestamp, urgent=bool(previous.get('sos')) != bool(sos_pressed))
+        except Exception as e:
+            print(f"❌ Error marking group snapshots: {str(e)}")
+
+    # ⏱️ When the app should ping next: slowly while the group is together, fast near the limit,
+    # near a venue or flagged zone boundary, or around an SOS (this ping's, or the previous one's
+    # if the app has just cancelled it)
+    boundary = geofence_index.boundary_distance(float(latitude), float(longitude)) if geofence_index else None
+    next_report = ping_interval(distance_apart, max_distance_apart, sos_pressed or (previous or {}).get('sos'), boundary)
+
+    return json_response(200, {
+        'message': 'Friend data processed successfully.',
+        'distanceFromFriends': float(distance_apart),
+        'nextReportSeconds': next_report,
+        **(group_distances or {}),
+        **({'zones': zones} if zones is not None else {})
+    })
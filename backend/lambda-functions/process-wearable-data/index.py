@@ -1,85 +1,395 @@
 import json
-import boto3
+import math
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pulse_common.anomaly import METRICS, VitalsBaseline
+from pulse_common.cadence import vitals_interval
+from pulse_common.concurrency import gather, map_concurrently
+from pulse_common.dynamo import batch_get_items, batch_write_items
+from pulse_common.ingest import IngestGuard, StatusWrite, capture_time, request_keys, DUPLICATE, WRITTEN, STAMP_FORMAT
+from pulse_common.notifications import AlertNotifier, WARNING, ALERT, CRITICAL
+from pulse_common.preferences import PreferencesCache
+from pulse_common.runtime import client, json_response, resource, table
+from pulse_common.rollups import aggregate, apply_rollups, expires_at, parse_timestamp, RAW_RETENTION
+from pulse_common.snapshots import GroupMarker
+from pulse_common.status import VITALS_STAMP
+from pulse_common.telemetry import count, debug, instrument, log_event, span
 
-# Initialize clients
-dynamodb = boto3.resource('dynamodb')
-sns = boto3.client('sns')
+# Initialize clients (built on first use)
+dynamodb = resource('dynamodb')
+sns = client('sns')
 
 # Environment variables
 DATA_TABLE_NAME = os.environ.get('DATA_TABLE_NAME', 'FriendStatus')  # You can make 'WearableData' if preferred
 PREFERENCES_TABLE_NAME = os.environ.get('PREFERENCES_TABLE_NAME', 'UserPreferences')
+CURRENT_STATUS_TABLE_NAME = os.environ.get('CURRENT_STATUS_TABLE_NAME', 'FriendCurrentStatus')
+ROLLUPS_TABLE_NAME = os.environ.get('ROLLUPS_TABLE_NAME', 'VitalsRollups')
+FRIEND_GRAPH_TABLE_NAME = os.environ.get('FRIEND_GRAPH_TABLE_NAME', 'FriendGraph')
+INCIDENTS_TABLE_NAME = os.environ.get('INCIDENTS_TABLE_NAME', 'AlertIncidents')
 SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
 
-# Default thresholds
+# Preferences cached across warm invocations
+preferences_cache = PreferencesCache(dynamodb, PREFERENCES_TABLE_NAME)
+
+# Coalesces repeated alerts per friend and fans out to their friends in batched publishes
+notifier = AlertNotifier(
+    sns, SNS_TOPIC_ARN,
+    table(INCIDENTS_TABLE_NAME),
+    table(FRIEND_GRAPH_TABLE_NAME)
+)
+
+# Drops resent batches (client seq / idempotencyKey) and coalesces overlapping writes per friend
+vitals_guard = IngestGuard(table(CURRENT_STATUS_TABLE_NAME), 'vitalsDedup', VITALS_STAMP)
+
+# Marks each friend's circle's group snapshots as changed, so their re-polls pick the batch up
+group_marker = GroupMarker(table(FRIEND_GRAPH_TABLE_NAME))
+
+# Default thresholds, used until a friend's personal baseline has warmed up
 DEFAULT_MAX_HEART_RATE = 150
 DEFAULT_MIN_HEART_RATE = 50
 DEFAULT_MAX_STRESS_LEVEL = 80
 
+# Hard limits once the baseline is warm (unless the user set their own thresholds)
+HARD_MAX_HEART_RATE = 190
+HARD_MIN_HEART_RATE = 40
+HARD_MAX_STRESS_LEVEL = 95
+
+MAX_SAMPLES_PER_BATCH = 1000
+
+# Helper: Request body (from API Gateway POST or IOT)
+def parse_body(event):
+    if isinstance(event.get('body'), str):
+        return json.loads(event['body'])
+    return event
+
+# Helper: Turn the body into a list of samples; an entry that is not an object becomes None
+# (rejected like any other invalid sample). Raises ValueError if the body is not a batch at all.
+def parse_samples(body):
+    if not isinstance(body, dict):
+        raise ValueError('Body must be a JSON object')
+    # A batch is {"samples": [...]}; a bare reading is a batch of one
+    samples = body.get('samples')
+    if samples is None:
+        return [body]
+    if not isinstance(samples, list):
+        raise ValueError('samples must be a list of readings')
+
+    # friendId / deviceId at the top level apply to samples that don't set their own
+    defaults = {k: body[k] for k in ('friendId', 'deviceId') if body.get(k) is not None}
+    return [{**defaults, **sample} if isinstance(sample, dict) else None for sample in samples]
+
+# Helper: A user-set threshold applies in both tiers; otherwise (default, hard default)
+def threshold_pair(prefs, field, default, hard):
+    value = prefs.get(field)
+    if value is not None:
+        return float(value), float(value)
+    return float(default), float(hard)
+
+# Helper: Load thresholds for every friend in the batch, cache misses in one batched read.
+# Returns {friendId: {"static": limits, "hard": limits}} with limits as {metric: (min, max)}.
+def load_thresholds(friend_ids):
+    try:
+        preferences = preferences_cache.get_many(friend_ids)
+    except Exception as e:
+        print(f"Error loading preferences: {str(e)}")
+        preferences = {}
+
+    thresholds = {}
+    for fid in friend_ids:
+        prefs = preferences.get(fid, {})
+        max_hr = threshold_pair(prefs, 'maxHeartRate', DEFAULT_MAX_HEART_RATE, HARD_MAX_HEART_RATE)
+        min_hr = threshold_pair(prefs, 'minHeartRate', DEFAULT_MIN_HEART_RATE, HARD_MIN_HEART_RATE)
+        max_stress = threshold_pair(prefs, 'maxStressLevel', DEFAULT_MAX_STRESS_LEVEL, HARD_MAX_STRESS_LEVEL)
+        thresholds[fid] = {
+            tier: {'heartRate': (min_hr[i], max_hr[i]), 'stressLevel': (None, max_stress[i])}
+            for i, tier in enumerate(('static', 'hard'))
+        }
+    return thresholds
+
+# Helper: Load each friend's streaming baseline from the current-status record. The dedup
+# window comes along for keyed batches, so their conditional writes need no extra read.
+def load_baselines(friend_ids, keyed=False):
+    try:
+        items = batch_get_items(
+            dynamodb, CURRENT_STATUS_TABLE_NAME,
+            [{'friendId': fid} for fid in friend_ids],
+            projection='friendId, vitalsBaseline' + (', vitalsDedup' if keyed else '')
+        )
+        records = {item['friendId']: item for item in items}
+    except Exception as e:
+        print(f"Error loading baselines: {str(e)}")
+        return {fid: VitalsBaseline() for fid in friend_ids}
+    if keyed:
+        for fid in friend_ids:
+            vitals_guard.remember(fid, records.get(fid, {}).get('vitalsDedup'))
+    return {fid: VitalsBaseline(records.get(fid, {}).get('vitalsBaseline')) for fid in friend_ids}
+
+# Helper: A sample needs a friendId, numeric readings and, if it carries one, an ISO 8601 timestamp string
+def is_valid(sample):
+    if sample is None or not isinstance(sample.get('friendId'), str) or not sample['friendId']:
+        return False
+    for field in METRICS:
+        value = sample.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value)):
+            return False
+    sample_id = sample.get('sampleId')
+    if sample_id is not None and (isinstance(sample_id, bool) or not isinstance(sample_id, (str, int))):
+        return False
+    timestamp = sample.get('timestamp')
+    if timestamp is None:
+        return True
+    if not isinstance(timestamp, str):
+        return False  # e.g. epoch seconds
+    try:
+        parse_timestamp(timestamp)
+        return True
+    except ValueError:
+        return False
+
+# Helper: Build the DynamoDB item for one sample. The watch's capture time is kept when it is
+# plausible; a future-dated or ancient one is clamped to the receive time, so it can neither
+# freeze the current-status record (stale-write check) nor land outside the history window.
+def to_item(sample, received_at):
+    item = {
+        'friendId': sample['friendId'],
+        'timestamp': capture_time(sample.get('timestamp'), received_at),
+        'fallDetected': bool(sample.get('fallDetected', False))  # Default false if not available
+    }
+    for field in ('heartRate', 'stressLevel'):
+        if sample.get(field) is not None:
+            item[field] = Decimal(str(sample[field]))
+    if sample.get('deviceId'):
+        item['deviceId'] = sample['deviceId']
+    if sample.get('sampleId') is not None:
+        item['sampleId'] = sample['sampleId']
+    # Raw samples expire via DynamoDB TTL; rollups keep the long-term history
+    item['expiresAt'] = expires_at(item['timestamp'], RAW_RETENTION)
+    return item
+
+# Helper: One item per distinct reading. A resent copy repeats the device's sampleId, or else the
+# timestamp it sent, and the last copy wins. Readings the server stamped (no timestamp, or one
+# clamped to the receive time) are all kept: where two would share a sort key, the later one
+# is moved on a microsecond at a time.
+def to_items(samples, received_at):
+    readings = {}
+    for index, sample in enumerate(samples):
+        if sample.get('sampleId') is not None:
+            key = (sample['friendId'], 'id', str(sample['sampleId']))
+        elif sample.get('timestamp') is not None:
+            key = (sample['friendId'], 'at', parse_timestamp(sample['timestamp']))
+        else:
+            key = (sample['friendId'], 'index', index)
+        readings[key] = sample
+
+    items, taken = [], set()
+    for sample in readings.values():
+        item = to_item(sample, received_at)
+        while (item['friendId'], item['timestamp']) in taken:
+            item['timestamp'] = (datetime.strptime(item['timestamp'], STAMP_FORMAT) + timedelta(microseconds=1)).strftime(STAMP_FORMAT)
+            item['expiresAt'] = expires_at(item['timestamp'], RAW_RETENTION)
+        taken.add((item['friendId'], item['timestamp']))
+        items.append(item)
+    return items
+
+# Helper: Write-through each friend's newest reading to the current-status record.
+# Returns {friendId: outcome}; a batch already applied for a friend comes back DUPLICATE.
+def update_current_vitals(items, baselines, seq=None, idempotency_key=None):
+    latest = {}
+    fell = set()
+    for item in items:
+        fid = item['friendId']
+        if fid not in latest or item['timestamp'] >= latest[fid]['timestamp']:
+            latest[fid] = item
+        if item['fallDetected']:
+            fell.add(fid)
+
+    def write(entry):
+        fid, item = entry
+        fields = {k: item[k] for k in ('heartRate', 'stressLevel') if k in item}
+        # A fall anywhere in the batch stays visible even if a later sample is normal
+        fields['fallDetected'] = fid in fell
+        fields['vitalsBaseline'] = baselines[fid].to_item()
+        outcome, previous, _ = vitals_guard.submit(fid, StatusWrite(fields, item['timestamp'], seq, idempotency_key))
+        if outcome == WRITTEN:
+            # At once when a fall is raised or cleared, otherwise at most once a minute
+            try:
+                group_marker.mark(fid, item['timestamp'], urgent=bool(previous.get('fallDetected')) != fields['fallDetected'])
+            except Exception as e:
+                print(f"❌ Error marking group snapshots for {fid}: {str(e)}")
+        return fid, outcome
+
+    # One conditional update per friend, independent of each other
+    return dict(map_concurrently(write, list(latest.items())))
+
+# Helper: Rollups are derived data, a failure is logged rather than failing the batch
+def update_rollups(items):
+    try:
+        apply_rollups(table(ROLLUPS_TABLE_NAME), aggregate(items))
+    except Exception as e:
+        print(f"❌ Error updating rollups: {str(e)}")
+
+# Check every sample in time order against hard/static limits and the friend's own baseline,
+# folding it into the baseline as we go and keeping the worst reading per friend
+def evaluate_samples(items, thresholds, baselines):
+    breaches = {}
+    for item in sorted(items, key=lambda i: i['timestamp']):
+        fid = item['friendId']
+        baseline = baselines[fid]
+        at = parse_timestamp(item['timestamp']).timestamp()
+        reasons = []
+        severity = WARNING
+        for metric in ('heartRate', 'stressLevel'):
+            value = item.get(metric)
+            if value is None:
+                continue
+            low, high = thresholds[fid]['hard' if baseline.is_warm(metric) else 'static'][metric]
+            if value > high or (low is not None and value < low):
+                reasons.append(f"{metric} {value} outside limit")
+                severity = max(severity, ALERT)
+            anomaly = baseline.observe(metric, value, at)
+            if anomaly:
+                reasons.append(anomaly)
+        if item['fallDetected']:
+            reasons.append('fall detected')
+            severity = CRITICAL
+        if not reasons:
+            continue
+
+        hr = item.get('heartRate')
+        stress = item.get('stressLevel')
+        summary = breaches.setdefault(fid, {
+            'count': 0, 'maxHeartRate': None, 'minHeartRate': None,
+            'maxStressLevel': None, 'fallDetected': False, 'reasons': [], 'severity': WARNING
+        })
+        summary['count'] += 1
+        if hr is not None:
+            summary['maxHeartRate'] = hr if summary['maxHeartRate'] is None else max(summary['maxHeartRate'], hr)
+            summary['minHeartRate'] = hr if summary['minHeartRate'] is None else min(summary['minHeartRate'], hr)
+        if stress is not None:
+            summary['maxStressLevel'] = stress if summary['maxStressLevel'] is None else max(summary['maxStressLevel'], stress)
+        summary['fallDetected'] = summary['fallDetected'] or item['fallDetected']
+        summary['severity'] = max(summary['severity'], severity)
+        summary['reasons'] += [r for r in reasons if r not in summary['reasons']]
+    return breaches
+
+# Helper: When each friend's watch should upload next, from their newest reading against the limits in force
+def report_intervals(items, thresholds, baselines, breaches):
+    latest = {}
+    for item in items:
+        fid = item['friendId']
+        if fid not in latest or item['timestamp'] >= latest[fid]['timestamp']:
+            latest[fid] = item
+    intervals = {}
+    for fid, item in latest.items():
+        baseline = baselines[fid]
+        limits = {metric: thresholds[fid]['hard' if baseline.is_warm(metric) else 'static'][metric] for metric in METRICS}
+        intervals[fid] = vitals_interval(item, limits, baseline, breached=fid in breaches)
+    return intervals
+
+# Helper: Queue one alert per friend per batch; repeats within the suppression window are coalesced
+def send_alert(friend_id, summary):
+    message = f'🚨 Wearable alert for Friend {friend_id}!\n'
+    if summary['maxHeartRate'] is not None:
+        message += f"Heart Rate: {summary['minHeartRate']}-{summary['maxHeartRate']}\n"
+    if summary['maxStressLevel'] is not None:
+        message += f"Stress Level: {summary['maxStressLevel']}\n"
+    message += f"Fall Detected: {summary['fallDetected']}\n"
+    message += f"Readings out of range: {summary['count']}\n"
+    message += 'Why: ' + '; '.join(summary['reasons'][:3])
+
+    if notifier.notify(friend_id, 'vitals', summary['severity'], message, subject='Friend Wearable Alert'):
+        print(f"Wearable alert queued for {friend_id}!")  # Debug helper
+
 # Main entry point
+@instrument('process-wearable-data')
 def lambda_handler(event, context):
-    print("Received wearable event:", json.dumps(event))
+    log_event(event, "Received wearable event:")
+
+    try:
+        body = parse_body(event)
+        samples = parse_samples(body)
+    except ValueError as e:  # json.JSONDecodeError included
+        return json_response(400, {'error': str(e)})
+    if len(samples) > MAX_SAMPLES_PER_BATCH:
+        return json_response(400, {'error': f'At most {MAX_SAMPLES_PER_BATCH} samples per request'})
+    # A batch-level seq / idempotencyKey makes resends of the whole batch safe
+    try:
+        seq, idempotency_key = request_keys(body)
+    except (TypeError, ValueError) as e:
+        return json_response(400, {'error': str(e)})
+    keyed = seq is not None or idempotency_key is not None
+
+    received_at = datetime.utcnow() #Gets current time in UTC
+    valid = [s for s in samples if is_valid(s)]
+    rejected = len(samples) - len(valid)
+    if not valid:
+        return json_response(400, {'error': 'No valid samples (friendId required, timestamp must be ISO 8601)'})
+
+    items = to_items(valid, received_at)
 
-    # Parse request body (from API Gateway POST or IOT)
-    body = event
+    friend_ids = list(dict.fromkeys(item['friendId'] for item in items))
+    # 🔁 A resend this container has already applied costs no AWS call at all
+    if keyed and all(vitals_guard.is_duplicate(fid, seq, idempotency_key) for fid in friend_ids):
+        count('ingest.duplicates', len(friend_ids))
+        return json_response(200, {'message': 'Duplicate batch ignored.', 'duplicate': True, 'samplesWritten': 0})
 
-    # Extract fields
-    friend_id = body.get('friendId')
-    heart_rate = body.get('heartRate')
-    stress_level = body.get('stressLevel')
-    fall_detected = body.get('fallDetected', False) #Default false if not available
-    timestamp = datetime.utcnow().isoformat() #Gets current time in UTC
+    # Thresholds (preferences) and baselines (current status) come from different tables, read concurrently
+    thresholds, baselines = gather(lambda: load_thresholds(friend_ids), lambda: load_baselines(friend_ids, keyed))
+    debug(f"Preferences cache: {preferences_cache.stats()}")
 
-    # Lookup UserPreferences 
-    preferences_table = dynamodb.Table(PREFERENCES_TABLE_NAME)
+    # Check for alert conditions (also advances each friend's baseline)
+    with span('evaluate'):
+        breaches = evaluate_samples(items, thresholds, baselines)
+        intervals = report_intervals(items, thresholds, baselines, breaches)
+
+    # Save wearable data to DynamoDB, update the current-status records and fold the batch
+    # into per-minute and per-hour rollups; the three touch different tables, so they overlap.
+    # A keyed batch claims its current-status writes first: raw samples and rollups are only
+    # written, and alerts only raised, for friends the batch was not already applied to.
     try:
-        response = preferences_table.get_item(Key={'friendId': friend_id})
-        preferences = response.get('Item', {})
-        max_heart_rate = preferences.get('maxHeartRate', DEFAULT_MAX_HEART_RATE)
-        min_heart_rate = preferences.get('minHeartRate', DEFAULT_MIN_HEART_RATE)
-        max_stress_level = preferences.get('maxStressLevel', DEFAULT_MAX_STRESS_LEVEL)
-        print(f"Loaded preferences for {friend_id}: maxHeartRate={max_heart_rate}, minHeartRate={min_heart_rate}, maxStressLevel={max_stress_level}")
+        if keyed:
+            outcomes = update_current_vitals(items, baselines, seq, idempotency_key)
+            duplicates = {fid for fid, outcome in outcomes.items() if outcome == DUPLICATE}
+            if duplicates:
+                count('ingest.duplicates', len(duplicates))
+                print(f"🔁 Batch already applied for {len(duplicates)} friend(s), skipping their samples.")
+                items = [item for item in items if item['friendId'] not in duplicates]
+                breaches = {fid: summary for fid, summary in breaches.items() if fid not in duplicates}
+            gather(
+                lambda: batch_write_items(dynamodb, DATA_TABLE_NAME, items),
+                lambda: update_rollups(items)
+            )
+        else:
+            gather(
+                lambda: batch_write_items(dynamodb, DATA_TABLE_NAME, items),
+                lambda: update_current_vitals(items, baselines),
+                lambda: update_rollups(items)
+            )
+    except Exception as e:
+        print("❌ Error writing to DynamoDB:", str(e))
+        return json_response(500, {'error': 'Failed to save data to DynamoDB', 'details': str(e)})
+    count('samples.written', len(items))
+    count('samples.rejected', rejected)
+    count('friends.breached', len(breaches))
+    print(f"{len(items)} wearable sample(s) saved to DynamoDB")
 
+    for fid, summary in breaches.items():
+        try:
+            send_alert(fid, summary)
+        except Exception as e:
+            print(f"❌ Error raising alert for {fid}: {str(e)}")
+    try:
+        alerts_sent = notifier.flush()
     except Exception as e:
-        print(f"Error loading preferences for {friend_id}: {str(e)}")
-        max_heart_rate = DEFAULT_MAX_HEART_RATE
-        min_heart_rate = DEFAULT_MIN_HEART_RATE
-        max_stress_level = DEFAULT_MAX_STRESS_LEVEL
-
-    # Save wearable data to DynamoDB
-    table = dynamodb.Table(DATA_TABLE_NAME)
-    table.put_item(
-        Item={
-            'friendId': friend_id,
-            'timestamp': timestamp,
-            'heartRate': heart_rate,
-            'stressLevel': stress_level,
-            'fallDetected': fall_detected
-        }
-    )
-    print("Wearable data saved to DynamoDB")
-
-    # Check for alert condition
-    if (heart_rate is not None and (heart_rate > max_heart_rate or heart_rate < min_heart_rate)) or \
-       (stress_level is not None and stress_level > max_stress_level) or \
-       fall_detected:
-
-        message = f'🚨 ALERT from wearable for Friend {friend_id}!\n'
-        if heart_rate is not None:
-            message += f'Heart Rate: {heart_rate} (Max: {max_heart_rate}, Min: {min_heart_rate})\n'
-        if stress_level is not None:
-            message += f'Stress Level: {stress_level} (Max: {max_stress_level})\n'
-        message += f'Fall Detected: {fall_detected}'
-
-        sns.publish(
-            TopicArn=SNS_TOPIC_ARN,
-            Message=message,
-            Subject='Friend Wearable Alert'
-        )
-        print("Wearable alert sent!")  # Debug helper
+        print("❌ Error sending alerts:", str(e))
+        return json_response(500, {'error': 'Failed to send alerts', 'details': str(e)})
 
-    return {
-        'statusCode': 200,
-        'body': json.dumps({'message': 'Wearable data processed.'})
-    }
\ No newline at end of file
+    return json_response(200, {
+        'message': 'Wearable data processed.',
+        'samplesWritten': len(items),
+        'samplesRejected': rejected,
+        'alertsSent': alerts_sent,
+        # A watch reports for its wearer; a gateway batching several friends reports at the fastest they need
+        'nextReportSeconds': min(intervals.values())
+    })
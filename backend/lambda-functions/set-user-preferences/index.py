@@ -1,15 +1,16 @@
 import json
-import boto3
 import os
-
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+from pulse_common.preferences import bump_preferences_version, is_reserved_key
+from pulse_common.runtime import json_response, table
+from pulse_common.sessions import authorize
+from pulse_common.telemetry import instrument, log_event
 
 # Environment variable
 PREFERENCES_TABLE_NAME = os.environ.get('PREFERENCES_TABLE_NAME', 'UserPreferences')
 
+@instrument('set-user-preferences')
 def lambda_handler(event, context):
-    print("Received set preferences event:", json.dumps(event))
+    log_event(event, "Received set preferences event:")
 
     # Parse request body
     body = json.loads(event['body'])
@@ -24,10 +25,15 @@ def lambda_handler(event, context):
 
     # Validate input
     if not friend_id:
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'friendId is required.'})
-        }
+        return json_response(400, {'error': 'friendId is required.'})
+    # The version counter shares the table, so a reserved key would overwrite it
+    if is_reserved_key(friend_id):
+        return json_response(400, {'error': 'friendId is not a valid user id.'})
+
+    # A session token, if sent, must be valid and belong to this user
+    denied = authorize(event, friend_id)
+    if denied:
+        return denied
 
     # Build item for DynamoDB
     preferences_item = {
@@ -47,11 +53,11 @@ def lambda_handler(event, context):
         preferences_item['countdownBeforeNotify'] = countdown_before_notify
 
     # Save to UserPreferences table
-    preferences_table = dynamodb.Table(PREFERENCES_TABLE_NAME)
+    preferences_table = table(PREFERENCES_TABLE_NAME)
     preferences_table.put_item(Item=preferences_item)
     print(f"Preferences saved for {friend_id}.")  # Debug helper
 
-    return {
-        'statusCode': 200,
-        'body': json.dumps({'message': f'Preferences saved for {friend_id}.'})
-    }
\ No newline at end of file
+    # Bump the version counter so warm readers drop their cached preferences
+    bump_preferences_version(preferences_table)
+
+    return json_response(200, {'message': f'Preferences saved for {friend_id}.'})
\ No newline at end of file
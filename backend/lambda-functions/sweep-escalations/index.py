@@ -0,0 +1,57 @@
+import os
+from pulse_common.escalations import EscalationScheduler, DynamoEscalationStore
+from pulse_common.notifications import AlertNotifier, ALERT
+from pulse_common.runtime import client, json_response, table
+from pulse_common.telemetry import instrument
+
+# AWS clients, built on first use
+sns = client('sns')
+
+# Environment variables
+ESCALATIONS_TABLE_NAME = os.environ.get('ESCALATIONS_TABLE_NAME', 'PendingEscalations')
+FRIEND_GRAPH_TABLE_NAME = os.environ.get('FRIEND_GRAPH_TABLE_NAME', 'FriendGraph')
+INCIDENTS_TABLE_NAME = os.environ.get('INCIDENTS_TABLE_NAME', 'AlertIncidents')
+SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
+
+escalations = EscalationScheduler(DynamoEscalationStore(table(ESCALATIONS_TABLE_NAME)))
+
+# Coalesces repeated alerts per friend and fans out to their friends in batched publishes
+notifier = AlertNotifier(
+    sns, SNS_TOPIC_ARN,
+    table(INCIDENTS_TABLE_NAME),
+    table(FRIEND_GRAPH_TABLE_NAME)
+)
+
+# 🚨 Queue the final "still far away" alert for one escalation, sent to the friend's whole circle.
+# Returns True if an alert was queued (False if it was coalesced into the open incident).
+def send_final_alert(escalation):
+    friend_id = escalation['friendId']
+    alert_message = (
+        f"🚨 ALERT: {friend_id} is still far from their friends after {escalation.get('countdownBeforeNotify')} seconds.\n"
+        f"GPS: {escalation.get('gps', 'unknown')}\nPlease check on them."
+    )
+    if notifier.notify(friend_id, 'distance', ALERT, alert_message):
+        print(f"📣 Final alert queued for {friend_id}.")
+        return True
+    return False
+
+# Main entry point, invoked every minute by an EventBridge schedule
+@instrument('sweep-escalations')
+def lambda_handler(event, context):
+    queued = {}  # friendId -> escalation whose alert is waiting for the batched publish
+
+    def fire(escalation):
+        if send_final_alert(escalation):
+            queued[escalation['friendId']] = escalation
+
+    fired = escalations.fire_due(fire)
+
+    # The escalations are already claimed; one whose alert failed to publish goes back for the next sweep
+    failed = set()
+    sent = notifier.flush(on_failure=lambda alert: failed.add(alert['friendId']))
+    for friend_id in failed:
+        escalations.restore(queued[friend_id])
+    fired = [escalation for escalation in fired if escalation['friendId'] not in failed]
+    print(f"Sweep fired {len(fired)} escalation(s), {sent} alert(s) published, {len(failed)} put back.")
+
+    return json_response(200, {'fired': [escalation['friendId'] for escalation in fired]})
@@ -0,0 +1 @@
+"""Shared helpers for the PULSE Lambda functions (published as the pulse-common layer)."""
@@ -0,0 +1,104 @@
+import math
+import os
+import time
+from decimal import Decimal
+
+METRICS = ('heartRate', 'stressLevel')
+
+# EWMA weight of each new sample; 0.05 is roughly a 20-sample memory
+ALPHA = float(os.environ.get('VITALS_EWMA_ALPHA', 0.05))
+Z_THRESHOLD = float(os.environ.get('VITALS_Z_THRESHOLD', 3.5))
+WARMUP_SAMPLES = int(os.environ.get('VITALS_WARMUP_SAMPLES', 30))
+
+# Deviations smaller than this never alert, however tight the baseline has become
+MIN_DEVIATION = {'heartRate': 20.0, 'stressLevel': 15.0}
+MIN_VARIANCE = {'heartRate': 4.0, 'stressLevel': 4.0}
+
+# Rate-of-change check against the previous sample, if it is recent enough;
+# the jump itself must also exceed MIN_DEVIATION so sensor jitter never alerts
+MAX_RATE_PER_MINUTE = {'heartRate': 40.0, 'stressLevel': 30.0}
+RATE_WINDOW_SECONDS = (5, 120)
+
+
+def _alert_deviation(metric, s):
+    """Distance from the mean beyond which a reading is anomalous."""
+    return max(Z_THRESHOLD * math.sqrt(max(s['var'], MIN_VARIANCE[metric])), MIN_DEVIATION[metric])
+
+
+class VitalsBaseline:
+    """
+    Per-friend streaming baseline for heart rate and stress level.
+
+    Keeps an exponentially weighted mean and variance plus the last
+    reading per metric: a handful of numbers, updated in O(1) per sample
+    and small enough to live on the FriendCurrentStatus record.
+    """
+
+    def __init__(self, state=None):
+        self.state = {
+            metric: {k: float(v) for k, v in values.items()}
+            for metric, values in (state or {}).items()
+        }
+
+    def is_warm(self, metric):
+        return self.state.get(metric, {}).get('n', 0) >= WARMUP_SAMPLES
+
+    def mean(self, metric):
+        return self.state.get(metric, {}).get('mean')
+
+    def deviation(self, metric, value):
+        """How far `value` is from the usual, as a fraction of the deviation that alerts (0 while warming up)."""
+        if not self.is_warm(metric):
+            return 0.0
+        return abs(float(value) - self.state[metric]['mean']) / _alert_deviation(metric, self.state[metric])
+
+    def observe(self, metric, value, at, now=None):
+        """
+        Check one reading against the baseline, then fold it in.
+        Returns a human-readable reason if the reading is anomalous, else None.
+        `at` is clamped to `now` (the receive time, epoch seconds), so no
+        reading can put the baseline's clock ahead of the readings that follow.
+        """
+        value = float(value)
+        now = time.time() if now is None else now
+        at = min(at, now)
+        s = self.state.setdefault(metric, {'n': 0, 'mean': value, 'var': 0.0})
+        reason = None
+
+        # A last reading from the future (stored before clamping) would gate every later one: forget it
+        if s.get('lastAt') is not None and s['lastAt'] > now:
+            s.pop('lastAt')
+            s.pop('last', None)
+
+        # Older than what the baseline has already seen: ignore
+        if s.get('lastAt') is not None and at < s['lastAt']:
+            return None
+
+        if s['n'] >= WARMUP_SAMPLES:
+            std = math.sqrt(max(s['var'], MIN_VARIANCE[metric]))
+            deviation = value - s['mean']
+            if abs(deviation) > _alert_deviation(metric, s):
+                reason = f"{metric} {value:g} vs usual {s['mean']:.0f}±{std:.0f}"
+
+        if reason is None and s.get('lastAt') is not None:
+            elapsed = at - s['lastAt']
+            jump = abs(value - s['last'])
+            if RATE_WINDOW_SECONDS[0] <= elapsed <= RATE_WINDOW_SECONDS[1] and jump > MIN_DEVIATION[metric]:
+                if jump / (elapsed / 60) > MAX_RATE_PER_MINUTE[metric]:
+                    reason = f"{metric} jumped {s['last']:g}->{value:g} in {elapsed:.0f}s"
+
+        # Incremental EWMA mean/variance update
+        diff = value - s['mean']
+        increment = ALPHA * diff
+        s['mean'] += increment
+        s['var'] = (1 - ALPHA) * (s['var'] + diff * increment)
+        s['n'] += 1
+        s['last'] = value
+        s['lastAt'] = at
+        return reason
+
+    def to_item(self):
+        return {
+            metric: {k: Decimal(str(round(v, 4))) for k, v in values.items()}
+            for metric, values in self.state.items()
+        }
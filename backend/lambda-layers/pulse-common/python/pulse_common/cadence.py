@@ -0,0 +1,70 @@
+import os
+
+# Server-driven reporting cadence. Ingest responses carry `nextReportSeconds`,
+# how long the device should wait before its next report. It is long while
+# everything is fine (vitals at baseline, the group close together) and
+# short as a friend nears maxDistanceApart, a zone boundary or a vitals
+# limit, or after an SOS, so ingest volume follows risk rather than headcount. Devices still
+# send an SOS press or a detected fall at once, whatever the interval.
+#
+# Risk is a number where 1 means at the limit. At or below CALM_RISK the
+# slowest interval applies, at 1 or above the fastest, geometric in between.
+PING_FASTEST_SECONDS = int(os.environ.get('CADENCE_PING_FASTEST_SECONDS', 15))
+PING_SLOWEST_SECONDS = int(os.environ.get('CADENCE_PING_SLOWEST_SECONDS', 120))
+MOVING_SPEED = float(os.environ.get('CADENCE_MOVING_SPEED', 3.0))  # m/s, a jog: how soon a zone boundary can be reached
+VITALS_FASTEST_SECONDS = int(os.environ.get('CADENCE_VITALS_FASTEST_SECONDS', 60))
+VITALS_SLOWEST_SECONDS = int(os.environ.get('CADENCE_VITALS_SLOWEST_SECONDS', 300))
+CALM_RISK = float(os.environ.get('CADENCE_CALM_RISK', 0.5))
+
+
+def next_interval(risk, fastest, slowest):
+    """Seconds until the next report for the given risk."""
+    if risk <= CALM_RISK:
+        return slowest
+    if risk >= 1:
+        return fastest
+    return int(round(slowest * (fastest / slowest) ** ((risk - CALM_RISK) / (1 - CALM_RISK))))
+
+
+def ping_interval(distance_apart, max_distance_apart, sos=False, boundary_meters=None):
+    """
+    Next GPS ping: by how much of maxDistanceApart the friend is from the
+    group, and no later than they could reach the nearest alerting zone
+    boundary (`boundary_meters`, if any is near). Fastest around an SOS.
+    """
+    if sos or not max_distance_apart or max_distance_apart <= 0:
+        return PING_FASTEST_SECONDS
+    interval = next_interval(float(distance_apart) / float(max_distance_apart), PING_FASTEST_SECONDS, PING_SLOWEST_SECONDS)
+    if boundary_meters is not None:
+        interval = min(interval, max(PING_FASTEST_SECONDS, int(boundary_meters / MOVING_SPEED)))
+    return interval
+
+
+def limit_risk(value, low, high, center):
+    """How far `value` has moved from `center` towards the limit on its side: 0 at center, 1 at the limit."""
+    value = float(value)
+    if value > center and high is not None and high > center:
+        return (value - center) / (high - center)
+    if value < center and low is not None and low < center:
+        return (center - value) / (center - low)
+    return 0.0
+
+
+def vitals_interval(reading, limits, baseline, breached=False):
+    """
+    Next watch upload for one friend, from their newest reading (a sample
+    item), the {metric: (low, high)} limits in force and their VitalsBaseline
+    (already advanced by the batch). Fastest after a breach or a fall.
+    """
+    if breached or reading.get('fallDetected'):
+        return VITALS_FASTEST_SECONDS
+    risk = 0.0
+    for metric, (low, high) in limits.items():
+        value = reading.get(metric)
+        if value is None:
+            continue
+        usual = baseline.mean(metric)
+        if usual is None:
+            usual = (low + high) / 2 if low is not None else high / 2
+        risk = max(risk, limit_risk(value, low, high, usual), baseline.deviation(metric, value))
+    return next_interval(risk, VITALS_FASTEST_SECONDS, VITALS_SLOWEST_SECONDS)
@@ -0,0 +1,242 @@
+import math
+import os
+import threading
+from pulse_common.geo import haversine
+from pulse_common.grid import GridIndex
+
+# Who in a group is actually separated. Large groups split into
+# sub-groups (the bar, the smoking area) that are each fine on their own, so
+# the group's latest positions are clustered with DBSCAN: with eps the
+# friend's maxDistanceApart, a member with at least MIN_POINTS - 1 others
+# within eps is a core point, cores within eps of each other share a
+# cluster, and a member near a core joins its cluster. Everyone else is
+# isolated, and only isolated members are separated.
+#
+# With the default MIN_POINTS of 2, two friends together are a cluster, so a
+# pair off at the smoking area is not separated: only a friend with nobody
+# within eps is. A MIN_POINTS of 3 also isolates a pair that wandered off on
+# its own, at the cost of warning both of them.
+MIN_POINTS = int(os.environ.get('CLUSTER_MIN_POINTS', 2))
+
+# Rebuild from scratch rather than update member by member when more than this share of the group moved
+REBUILD_SHARE = 0.5
+
+
+class UnionFind:
+    """Disjoint sets with path halving and union by size."""
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, key):
+        parent = self.parent
+        parent.setdefault(key, key)
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size.get(a, 1) < self.size.get(b, 1):
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] = self.size.get(a, 1) + self.size.pop(b, 1)
+        return a
+
+
+class GroupClusters:
+    """
+    Grid-accelerated DBSCAN over one group's latest positions.
+
+    Points live in a GridIndex with cells eps/sqrt(2) wide, so a member
+    whose cell holds MIN_POINTS members is core without a distance check,
+    and core members are joined cell by cell with union-find, stopping at the
+    first pair within eps: about O(n log n) for a group, rather than every
+    pairwise distance. `sync` applies the group's
+    current positions; when only a few members moved, only the clusters
+    they left or can reach are recomputed.
+    """
+
+    def __init__(self, eps, min_points=MIN_POINTS, ref_lat=0.0):
+        self.eps = float(eps)
+        self.min_points = max(1, int(min_points))
+        # Cells eps/sqrt(2) wide, so any two members sharing a cell are within eps
+        self.grid = GridIndex(max(self.eps, 1.0) / math.sqrt(2), ref_lat=ref_lat)
+        self.reach = int(math.ceil(self.eps / self.grid.cell_size))
+        self.labels = {}  # member -> cluster label, None if isolated
+        self.next_label = 0
+        self.lock = threading.Lock()  # for callers sharing one instance across threads
+
+    def __len__(self):
+        return len(self.grid)
+
+    def sync(self, locations):
+        """Bring the clustering up to date with {member: (lat, lon)}. Returns the number of members that changed."""
+        moved = {key: point for key, point in locations.items() if self.grid.location(key) != tuple(point)}
+        gone = [key for key in self.labels if key not in locations]
+        changes = len(moved) + len(gone)
+        if changes > REBUILD_SHARE * max(len(locations), 1):
+            self.fit(locations)
+        else:
+            for key in gone:
+                self.remove(key)
+            for key, (lat, lon) in moved.items():
+                self.move(key, lat, lon)
+        return changes
+
+    def fit(self, locations):
+        self.grid = GridIndex(self.grid.cell_size, ref_lat=_ref_lat(locations))
+        self.labels = {}
+        for key, (lat, lon) in locations.items():
+            self.grid.insert(key, lat, lon)
+        self._recluster(set(locations))
+
+    def move(self, key, lat, lon):
+        """One member's new (or first) position; reclusters only what that can affect."""
+        affected = self._touched(key)
+        self.grid.insert(key, lat, lon)
+        affected |= self._touched(key)
+        self._recluster(affected)
+
+    def remove(self, key):
+        affected = self._touched(key)
+        self.grid.remove(key)
+        self.labels.pop(key, None)
+        affected.discard(key)
+        self._recluster(affected)
+
+    # Helper: the member, their cluster and their eps-neighbours with the neighbours' clusters:
+    # what can change label when the member appears, moves or leaves. _recluster widens it
+    # to anything those members now link to.
+    def _touched(self, key):
+        affected = {key}
+        location = self.grid.location(key)
+        if location is None:
+            return affected
+        labels = {self.labels.get(key)}
+        for other, _ in self.grid.within(location[0], location[1], self.eps, exclude=key):
+            affected.add(other)
+            labels.add(self.labels.get(other))
+        labels.discard(None)
+        if labels:
+            affected |= {member for member, label in self.labels.items() if label in labels}
+        return affected
+
+    # Helper: cells whose points can lie within eps of a point in `cell`
+    def _around(self, cell):
+        cx, cy = cell
+        for k in range(self.reach + 1):
+            yield from self.grid._ring(cx, cy, k)
+
+    # Helper: whether at least `need` other members are within eps, stopping as soon as they are
+    def _has_neighbours(self, key, need):
+        lat, lon, cell = self.grid.points[key]
+        if len(self.grid.cells[cell]) - 1 >= need:
+            return True  # a cell's diagonal is eps, so everyone in it is a neighbour
+        found = 0
+        for other_cell in self._around(cell):
+            for other in self.grid.cells.get(other_cell, ()):
+                if other != key and haversine(lat, lon, *self.grid.points[other][:2]) <= self.eps:
+                    found += 1
+                    if found >= need:
+                        return True
+        return found >= need
+
+    # Helper: any member of `candidates` within eps of `key`
+    def _linked(self, key, candidates):
+        lat, lon, _ = self.grid.points[key]
+        return next((other for other in candidates
+                     if other != key and haversine(lat, lon, *self.grid.points[other][:2]) <= self.eps), None)
+
+    def _recluster(self, members):
+        points, cells = self.grid.points, self.grid.cells
+        members = {key for key in members if key in points}
+        core = {}
+
+        def is_core(key):
+            if key not in core:
+                core[key] = self._has_neighbours(key, self.min_points - 1)
+            return core[key]
+
+        # Every member within eps of a core in the set may join its cluster, and a core among
+        # them brings its whole cluster in
+        while True:
+            core_cells = {points[key][2] for key in members if is_core(key)}
+            linked = set()
+            for cell in {near for cell in core_cells for near in self._around(cell)}:
+                for other in cells.get(cell, ()):
+                    if other in members or other in linked:
+                        continue
+                    _, _, other_cell = points[other]
+                    nearby = [key for near in self._around(other_cell) for key in cells.get(near, ())
+                              if key in members and is_core(key)]
+                    if self._linked(other, nearby) is not None:
+                        linked.add(other)
+            if not linked:
+                break
+            labels = {self.labels.get(other) for other in linked if is_core(other)} - {None}
+            members |= linked | {member for member, label in self.labels.items() if label in labels}
+
+        # Cores in one cell are within eps of each other; two cells' cores are joined by the first
+        # pair found within eps, and a pair of cells already in one set is not searched again
+        sets = UnionFind()
+        by_cell = {}
+        for key in sorted(members):
+            if is_core(key):
+                by_cell.setdefault(points[key][2], []).append(key)
+        for cell, keys in by_cell.items():
+            for key in keys[1:]:
+                sets.union(keys[0], key)
+        for cell, keys in by_cell.items():
+            for near in self._around(cell):
+                if near == cell or near not in by_cell or sets.find(keys[0]) == sets.find(by_cell[near][0]):
+                    continue
+                if any(self._linked(key, by_cell[near]) is not None for key in keys):
+                    sets.union(keys[0], by_cell[near][0])
+
+        roots = {}
+        for key in sorted(members):
+            if is_core(key):
+                root = sets.find(key)
+            else:
+                # A border member joins its nearest core neighbour's cluster, which may lie outside the set
+                lat, lon, _ = points[key]
+                hits = self.grid.within(lat, lon, self.eps, exclude=key)
+                nearest = next((other for other, _ in hits if is_core(other)), None)
+                if nearest is not None and nearest not in members:
+                    self.labels[key] = self.labels.get(nearest)
+                    continue
+                root = sets.find(nearest) if nearest is not None else None
+            if root is None:
+                self.labels[key] = None
+                continue
+            if root not in roots:
+                roots[root] = self.next_label
+                self.next_label += 1
+            self.labels[key] = roots[root]
+
+    def label(self, key):
+        return self.labels.get(key)
+
+    def is_isolated(self, key):
+        return key in self.labels and self.labels[key] is None
+
+    def clusters(self):
+        """[[members], ...] largest first; isolated members are not included."""
+        groups = {}
+        for key, label in self.labels.items():
+            if label is not None:
+                groups.setdefault(label, []).append(key)
+        return sorted((sorted(group) for group in groups.values()), key=lambda group: (-len(group), group[0]))
+
+    def isolated(self):
+        return sorted(key for key, label in self.labels.items() if label is None)
+
+
+def _ref_lat(locations):
+    lats = [float(lat) for lat, _ in locations.values()]
+    return sum(lats) / len(lats) if lats else 0.0
@@ -0,0 +1,83 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Overlapping independent I/O inside one invocation. A handler that needs a
+# get_item, a query and a put that don't depend on each other pays for the
+# slowest of them instead of the sum:
+#
+#     preferences, locations = gather(
+#         lambda: preferences_cache.get(friend_id),
+#         lambda: load_friend_locations(friend_id)
+#     )
+#
+# The pool is created on first use and kept for the container's lifetime.
+# Calls on shared tables go through boto3's thread-safe low-level client;
+# tasks must not mutate shared state (caches, resources) without a lock.
+
+MAX_WORKERS = int(os.environ.get('IO_POOL_WORKERS', 8))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def executor():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='pulse-io')
+    return _pool
+
+
+class _Task:
+    """A call that runs exactly once, on whichever thread claims it first."""
+
+    def __init__(self, call):
+        self.call = call
+        self.claim = threading.Lock()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def run(self):
+        if not self.claim.acquire(blocking=False):
+            return
+        try:
+            self.result = self.call()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+
+def gather(*calls):
+    """
+    Run zero-argument callables concurrently and return their results in order.
+
+    Every call finishes before this returns. If any raised, the first
+    exception (in argument order) is re-raised. The calling thread works
+    through the calls too, running any a pool worker has not started yet,
+    so nested gather() calls (e.g. from inside a pool task) cannot deadlock
+    even when every worker is busy.
+    """
+    if len(calls) <= 1 or MAX_WORKERS < 1:
+        return [call() for call in calls]
+    tasks = [_Task(call) for call in calls]
+    pool = executor()
+    for task in tasks[1:]:
+        pool.submit(contextvars.copy_context().run, task.run)  # telemetry follows the call
+    for task in tasks:
+        task.run()
+    for task in tasks:
+        task.done.wait()
+    for task in tasks:
+        if task.error is not None:
+            raise task.error
+    return [task.result for task in tasks]
+
+
+def map_concurrently(function, items):
+    """[function(item) for item in items], with the calls overlapped."""
+    return gather(*(lambda item=item: function(item) for item in items))
@@ -0,0 +1,101 @@
+import time
+from decimal import Decimal
+from pulse_common.concurrency import map_concurrently
+
+BATCH_GET_LIMIT = 100  # DynamoDB max keys per batch_get_item
+BATCH_WRITE_LIMIT = 25  # DynamoDB max put/delete requests per batch_write_item
+BATCH_WRITE_MAX_ATTEMPTS = 8
+
+
+def batch_get_items(dynamodb, table_name, keys, projection=None):
+    """
+    Fetch many items by primary key with batch_get_item.
+
+    Keys are sent in chunks of 100, the chunks concurrently, and
+    UnprocessedKeys are retried until DynamoDB has returned everything.
+    Returns the items in no particular order.
+    """
+    def fetch(chunk):
+        items = []
+        request = {table_name: {'Keys': chunk}}
+        if projection:
+            request[table_name]['ProjectionExpression'] = projection
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items += response.get('Responses', {}).get(table_name, [])
+            request = response.get('UnprocessedKeys') or None
+        return items
+
+    chunks = [keys[start:start + BATCH_GET_LIMIT] for start in range(0, len(keys), BATCH_GET_LIMIT)]
+    return [item for items in map_concurrently(fetch, chunks) for item in items]
+
+
+def batch_write_items(dynamodb, table_name, items):
+    """
+    Put many items with batch_write_item.
+
+    Items are sent in chunks of 25, the chunks concurrently. UnprocessedItems
+    (throttling) are retried with exponential backoff; if some are still
+    unprocessed after BATCH_WRITE_MAX_ATTEMPTS the call raises rather than
+    dropping data.
+    """
+    def write(chunk):
+        request = {table_name: [{'PutRequest': {'Item': item}} for item in chunk]}
+        for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+            response = dynamodb.batch_write_item(RequestItems=request)
+            request = response.get('UnprocessedItems') or None
+            if not request:
+                return
+            time.sleep(min(0.05 * 2 ** attempt, 2))
+        raise RuntimeError(f"{len(request[table_name])} item(s) still unprocessed after {BATCH_WRITE_MAX_ATTEMPTS} attempts")
+
+    map_concurrently(write, [items[start:start + BATCH_WRITE_LIMIT] for start in range(0, len(items), BATCH_WRITE_LIMIT)])
+
+
+def serialize_value(value):
+    """Python value -> low-level AttributeValue, the mapping boto3's TypeSerializer uses (floats also accepted)."""
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, (int, float, Decimal)):
+        return {'N': str(value)}
+    if isinstance(value, str):
+        return {'S': value}
+    if isinstance(value, (bytes, bytearray)):
+        return {'B': bytes(value)}
+    if isinstance(value, dict):
+        return {'M': {k: serialize_value(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {'L': [serialize_value(v) for v in value]}
+    if isinstance(value, (set, frozenset)):
+        if all(isinstance(v, str) for v in value):
+            return {'SS': sorted(value)}
+        return {'NS': [str(v) for v in value]}
+    raise TypeError(f"Unsupported DynamoDB type: {type(value).__name__}")
+
+
+def deserialize_value(attribute):
+    (kind, value), = attribute.items()
+    if kind == 'NULL':
+        return None
+    if kind == 'N':
+        return Decimal(value)
+    if kind == 'M':
+        return {k: deserialize_value(v) for k, v in value.items()}
+    if kind == 'L':
+        return [deserialize_value(v) for v in value]
+    if kind == 'SS':
+        return set(value)
+    if kind == 'NS':
+        return {Decimal(v) for v in value}
+    return value  # S, B, BOOL
+
+
+def serialize_item(item):
+    """Plain dict -> low-level AttributeValue map, for client calls such as transact_write_items."""
+    return {k: serialize_value(v) for k, v in item.items()}
+
+
+def deserialize_item(item):
+    return {k: deserialize_value(v) for k, v in item.items()}
@@ -0,0 +1,191 @@
+import heapq
+import time
+from decimal import Decimal
+from pulse_common.concurrency import map_concurrently
+
+BUCKET_SECONDS = 60  # due-time index granularity, matches the sweeper schedule
+SWEEP_LOOKBACK_BUCKETS = 15  # how far back the first sweep looks, before there is a cursor
+MAX_CATCH_UP_BUCKETS = 240  # buckets one sweep queries at most while catching up after an outage
+CURSOR_KEY = '__sweep_cursor__'  # reserved item holding the last bucket every sweep has covered
+
+
+def due_bucket(due_at):
+    return int(due_at) // BUCKET_SECONDS
+
+
+class DynamoEscalationStore:
+    """
+    Pending escalations in DynamoDB, one item per friend.
+
+    Items are keyed by friendId so a later ping can cancel with a single
+    delete. The dueBucket-dueAt-index GSI is the due-time index the sweeper
+    reads: one query per minute bucket instead of a table scan. A cursor
+    item records the last bucket swept, so a sweep resumes where the last
+    one stopped and no bucket is skipped however long the sweeper was down
+    (up to MAX_CATCH_UP_BUCKETS per sweep until it has caught up).
+    """
+
+    INDEX_NAME = 'dueBucket-dueAt-index'
+
+    def __init__(self, table):
+        self.table = table
+        self.swept_through = None  # last bucket the latest due() call covered in full
+
+    def _cursor(self):
+        item = self.table.get_item(Key={'friendId': CURSOR_KEY}, ConsistentRead=True).get('Item')
+        return int(item['sweptBucket']) if item else None
+
+    def add(self, escalation):
+        item = dict(escalation)
+        item['dueAt'] = Decimal(str(item['dueAt']))
+        try:
+            self.table.put_item(Item=item, ConditionExpression='attribute_not_exists(friendId)')
+            return True
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+    def remove(self, friend_id):
+        response = self.table.delete_item(Key={'friendId': friend_id}, ReturnValues='ALL_OLD')
+        return 'Attributes' in response
+
+    def due(self, now):
+        def query_bucket(bucket):
+            items = []
+            kwargs = {
+                'IndexName': self.INDEX_NAME,
+                'KeyConditionExpression': 'dueBucket = :bucket AND dueAt <= :now',
+                'ExpressionAttributeValues': {':bucket': bucket, ':now': Decimal(str(now))}
+            }
+            while True:
+                response = self.table.query(**kwargs)
+                items += response.get('Items', [])
+                if 'LastEvaluatedKey' not in response:
+                    return items
+                kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        # Every bucket since the cursor; the current one stays uncovered, since more of it falls due later
+        current = due_bucket(now)
+        cursor = self._cursor()
+        first = min(cursor + 1 if cursor is not None else current - SWEEP_LOOKBACK_BUCKETS, current)
+        last = min(current, first + MAX_CATCH_UP_BUCKETS - 1)
+        self.swept_through = last if last < current else current - 1
+
+        # The buckets are independent queries, so they run concurrently
+        buckets = range(first, last + 1)
+        return [item for items in map_concurrently(query_bucket, buckets) for item in items]
+
+    def mark_swept(self):
+        """Move the cursor past the buckets the latest due() call covered (never backwards)."""
+        if self.swept_through is None:
+            return
+        try:
+            self.table.update_item(
+                Key={'friendId': CURSOR_KEY},
+                UpdateExpression='SET sweptBucket = :b',
+                ConditionExpression='attribute_not_exists(sweptBucket) OR sweptBucket < :b',
+                ExpressionAttributeValues={':b': self.swept_through}
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            pass  # an overlapping sweep got further
+
+    def claim(self, escalation):
+        # Conditional delete so two overlapping sweeps never fire the same escalation
+        try:
+            self.table.delete_item(
+                Key={'friendId': escalation['friendId']},
+                ConditionExpression='dueAt = :due',
+                ExpressionAttributeValues={':due': escalation['dueAt']}
+            )
+            return True
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+
+class InMemoryEscalationStore:
+    """Local stand-in for DynamoEscalationStore, backed by a dict and a min-heap on dueAt."""
+
+    def __init__(self):
+        self.items = {}
+        self.heap = []
+
+    def add(self, escalation):
+        if escalation['friendId'] in self.items:
+            return False
+        self.items[escalation['friendId']] = dict(escalation)
+        heapq.heappush(self.heap, (escalation['dueAt'], escalation['friendId']))
+        return True
+
+    def remove(self, friend_id):
+        return self.items.pop(friend_id, None) is not None
+
+    def due(self, now):
+        # Cancelled or re-added entries leave stale heap nodes behind; skip them lazily
+        found = []
+        while self.heap and self.heap[0][0] <= now:
+            due_at, friend_id = heapq.heappop(self.heap)
+            item = self.items.get(friend_id)
+            if item is not None and item['dueAt'] == due_at:
+                found.append(item)
+        return found
+
+    def mark_swept(self):
+        pass  # the heap holds every pending escalation, so there is no cursor to move
+
+    def claim(self, escalation):
+        item = self.items.get(escalation['friendId'])
+        if item is None or item['dueAt'] != escalation['dueAt']:
+            return False
+        del self.items[escalation['friendId']]
+        return True
+
+
+class EscalationScheduler:
+    """
+    Deferred "still out of range" alerts.
+
+    Ingest calls schedule() and cancel() and returns immediately; a
+    periodic sweeper calls fire_due() to hand every escalation whose
+    countdown has elapsed to a callback in one pass.
+    """
+
+    def __init__(self, store, clock=time.time):
+        self.store = store
+        self.clock = clock
+
+    def schedule(self, friend_id, countdown, **details):
+        """Start a countdown unless one is already running; returns True if this call started it."""
+        now = self.clock()
+        due_at = int(now + float(countdown))
+        escalation = {
+            'friendId': friend_id,
+            'dueAt': due_at,
+            'dueBucket': due_bucket(due_at),
+            'createdAt': int(now),
+            **details
+        }
+        return self.store.add(escalation)
+
+    def cancel(self, friend_id):
+        """Drop a pending countdown; returns True if one was pending."""
+        return self.store.remove(friend_id)
+
+    def restore(self, escalation):
+        """Put back a claimed escalation whose alert did not go out, so the next sweep fires it again."""
+        # In the current bucket, since the sweep cursor may have moved past its own
+        return self.store.add({**escalation, 'dueBucket': due_bucket(self.clock())})
+
+    def fire_due(self, fire):
+        """Claim every escalation that is due and pass it to fire(); returns the fired escalations."""
+        fired = []
+        for escalation in self.store.due(self.clock()):
+            if not self.store.claim(escalation):
+                continue
+            try:
+                fire(escalation)
+                fired.append(escalation)
+            except Exception as e:
+                # Put it back so the next sweep retries instead of losing the alert
+                print(f"❌ Failed to fire escalation for {escalation['friendId']}: {e}")
+                self.restore(escalation)
+        self.store.mark_swept()
+        return fired
@@ -0,0 +1,157 @@
+import os
+from pulse_common.dynamo import serialize_item
+
+# FriendGraph adjacency list: one item per (user, edge), partitioned by userId.
+# The sort key is "<kind>#<friendId>", so every view is a begins_with query.
+ACCEPTED = 'accepted'   # mutual friendship, stored in both partitions
+INCOMING = 'incoming'   # request received from friendId, waiting on userId
+OUTGOING = 'outgoing'   # request sent to friendId
+
+TRANSACT_LIMIT = 100  # DynamoDB max actions per transact_write_items
+MAX_BULK_FRIENDS = int(os.environ.get('MAX_BULK_FRIENDS', 200))  # friend ids per bulk invite / accept
+
+
+def edge_key(user_id, kind, friend_id):
+    return {'userId': user_id, 'edge': f'{kind}#{friend_id}'}
+
+
+def query_edges(graph_table, user_id, kind, projection=None):
+    """All edges of one kind in a user's partition, following pagination."""
+    kwargs = {
+        'KeyConditionExpression': 'userId = :uid AND begins_with(edge, :prefix)',
+        'ExpressionAttributeValues': {':uid': user_id, ':prefix': f'{kind}#'}
+    }
+    if projection:
+        kwargs['ProjectionExpression'] = projection
+    items = []
+    while True:
+        response = graph_table.query(**kwargs)
+        items += response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def get_accepted_friend_ids(graph_table, user_id):
+    """Accepted friends of a user: a single keyed query on the user's FriendGraph partition."""
+    return [item['friendId'] for item in query_edges(graph_table, user_id, ACCEPTED, projection='friendId')]
+
+
+def edge_kinds(graph_table, user_id):
+    """{friendId: {kind, ...}} for every edge in a user's partition, in one paginated query."""
+    kwargs = {
+        'KeyConditionExpression': 'userId = :uid',
+        'ExpressionAttributeValues': {':uid': user_id},
+        'ProjectionExpression': 'edge'
+    }
+    kinds = {}
+    while True:
+        response = graph_table.query(**kwargs)
+        for item in response.get('Items', []):
+            kind, _, friend_id = item['edge'].partition('#')
+            kinds.setdefault(friend_id, set()).add(kind)
+        if 'LastEvaluatedKey' not in response:
+            return kinds
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _edge_item(user_id, kind, friend_id, status, added_at):
+    return serialize_item({**edge_key(user_id, kind, friend_id), 'friendId': friend_id, 'status': status, 'addedAt': added_at})
+
+
+def invite_actions(table_name, user_id, friend_id, added_at):
+    """
+    Transaction actions for one friend request: outgoing for the sender,
+    incoming for the recipient, unless they are already friends or the request is already pending.
+    """
+    return [
+        {
+            'ConditionCheck': {
+                'TableName': table_name,
+                'Key': serialize_item(edge_key(user_id, ACCEPTED, friend_id)),
+                'ConditionExpression': 'attribute_not_exists(userId)'
+            }
+        },
+        {
+            'Put': {
+                'TableName': table_name,
+                'Item': _edge_item(user_id, OUTGOING, friend_id, 'pending', added_at),
+                'ConditionExpression': 'attribute_not_exists(userId)'
+            }
+        },
+        {'Put': {'TableName': table_name, 'Item': _edge_item(friend_id, INCOMING, user_id, 'pending', added_at)}}
+    ]
+
+
+def accept_actions(table_name, user_id, friend_id, added_at):
+    """Transaction actions that swap a pending request from friend_id for accepted edges in both partitions."""
+    return [
+        {
+            'Delete': {
+                'TableName': table_name,
+                'Key': serialize_item(edge_key(user_id, INCOMING, friend_id)),
+                'ConditionExpression': 'attribute_exists(userId)'
+            }
+        },
+        {'Delete': {'TableName': table_name, 'Key': serialize_item(edge_key(friend_id, OUTGOING, user_id))}},
+        {'Put': {'TableName': table_name, 'Item': _edge_item(user_id, ACCEPTED, friend_id, 'accepted', added_at)}},
+        {'Put': {'TableName': table_name, 'Item': _edge_item(friend_id, ACCEPTED, user_id, 'accepted', added_at)}}
+    ]
+
+
+def transact_edges(client, actions):
+    """
+    Apply {friendId: [actions]} with as few transact_write_items calls as
+    fit: each friend's actions stay together in one transaction, up to 100
+    actions per call. A friend whose condition fails (a request raced in
+    since the caller checked) is dropped from its transaction, and the rest
+    of that transaction is retried without it.
+
+    Returns (applied, conflicts): lists of friend ids.
+    """
+    applied, conflicts = [], []
+    chunks, chunk, size = [], [], 0
+    for friend_id, friend_actions in actions.items():
+        if chunk and size + len(friend_actions) > TRANSACT_LIMIT:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(friend_id)
+        size += len(friend_actions)
+    if chunk:
+        chunks.append(chunk)
+
+    for chunk in chunks:
+        while chunk:
+            try:
+                client.transact_write_items(TransactItems=[a for friend_id in chunk for a in actions[friend_id]])
+            except client.exceptions.TransactionCanceledException as e:
+                reasons = e.response.get('CancellationReasons') or []
+                failed, position = set(), 0
+                for friend_id in chunk:
+                    own = reasons[position:position + len(actions[friend_id])]
+                    if any(reason.get('Code') == 'ConditionalCheckFailed' for reason in own):
+                        failed.add(friend_id)
+                    position += len(actions[friend_id])
+                if not failed:
+                    raise  # throttled or conflicting with another transaction: let the caller fail it
+                conflicts += [friend_id for friend_id in chunk if friend_id in failed]
+                chunk = [friend_id for friend_id in chunk if friend_id not in failed]
+                continue
+            applied += chunk
+            break
+    return applied, conflicts
+
+
+def bulk_friend_ids(body):
+    """
+    The friendIds list of a bulk request, de-duplicated in order, or None if
+    the request is not a bulk one. Raises ValueError if the list is malformed or too long.
+    """
+    friend_ids = body.get('friendIds')
+    if friend_ids is None:
+        return None
+    if not isinstance(friend_ids, list) or not all(isinstance(f, str) and f for f in friend_ids):
+        raise ValueError('friendIds must be a list of user ids')
+    if len(friend_ids) > MAX_BULK_FRIENDS:
+        raise ValueError(f'At most {MAX_BULK_FRIENDS} friendIds per request')
+    return list(dict.fromkeys(friend_ids))
@@ -0,0 +1,52 @@
+import math
+
+EARTH_RADIUS_M = 6371000  # meters
+
+
+# Haversine distance formula (single pair)
+def haversine(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lon2 - lon1)
+
+    a = math.sin(d_phi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(d_lambda/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS_M * c
+
+
+def distance_matrix(coords):
+    """
+    Full pairwise haversine matrix for a list of (lat, lon) tuples.
+
+    Radians and cosines are computed once per point instead of once per pair,
+    and only the upper triangle is evaluated, then mirrored.
+    """
+    n = len(coords)
+    phis = [math.radians(lat) for lat, _ in coords]
+    lambdas = [math.radians(lon) for _, lon in coords]
+    cos_phis = [math.cos(phi) for phi in phis]
+
+    matrix = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        phi_i, lambda_i, cos_i = phis[i], lambdas[i], cos_phis[i]
+        row = matrix[i]
+        for j in range(i + 1, n):
+            a = math.sin((phis[j] - phi_i) / 2)**2 + \
+                cos_i * cos_phis[j] * math.sin((lambdas[j] - lambda_i) / 2)**2
+            d = 2 * EARTH_RADIUS_M * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+            row[j] = d
+            matrix[j][i] = d
+    return matrix
+
+
+def centroid(coords):
+    """Geographic centroid of (lat, lon) tuples, averaged on the unit sphere."""
+    x = y = z = 0.0
+    for lat, lon in coords:
+        phi, lam = math.radians(lat), math.radians(lon)
+        x += math.cos(phi) * math.cos(lam)
+        y += math.cos(phi) * math.sin(lam)
+        z += math.sin(phi)
+    n = len(coords)
+    x, y, z = x / n, y / n, z / n
+    return math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x))
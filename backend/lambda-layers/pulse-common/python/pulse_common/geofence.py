@@ -0,0 +1,189 @@
+import math
+import os
+import threading
+import time
+from pulse_common.geo import EARTH_RADIUS_M
+
+# Geofences: named polygons on the site map, stored one item per zone in the
+# Geofences table ({zoneId, name, kind, polygon: [[lat, lon], ...]}).
+#
+#   venue    the site boundary; leaving it alerts the friend's circle
+#   flagged  a zone to stay out of; entering it alerts
+#   (other)  e.g. "area" for stages and camping; tracked, never alerts
+#
+# Which zones a friend is inside is kept on their FriendCurrentStatus record
+# (`zones`), so alerts fire on transitions only, not on every ping inside.
+VENUE = 'venue'
+FLAGGED = 'flagged'
+
+CELL_METERS = float(os.environ.get('GEOFENCE_CELL_METERS', 250))
+CACHE_TTL = float(os.environ.get('GEOFENCE_CACHE_SECONDS', 300))
+MAX_CELLS_PER_ZONE = 4096  # zones spanning more cells skip the grid and are bbox-checked on every lookup
+ON_EDGE_METERS = 1e-6  # a point this close to an edge is on the boundary, whatever the rounding
+
+
+class Zone:
+    """One polygon, projected to meters, with its bounding box precomputed."""
+
+    def __init__(self, zone_id, kind, polygon, name=None, project=None):
+        self.zone_id = zone_id
+        self.kind = kind
+        self.name = name or zone_id
+        points = [project(float(lat), float(lon)) for lat, lon in polygon]
+        if len(points) > 1 and points[0] == points[-1]:
+            points.pop()  # closed rings repeat the first vertex
+        if len(points) < 3:
+            raise ValueError(f"Zone {zone_id} needs at least 3 vertices")
+        self.edges = list(zip(points, points[1:] + points[:1]))
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+
+    def contains(self, x, y):
+        """
+        Even-odd ray casting against the projected polygon (bounding box
+        first). Ray casting alone puts a point on the boundary inside on some
+        edges and outside on others, so edges and vertices are checked first
+        and always count as inside.
+        """
+        min_x, min_y, max_x, max_y = self.bbox
+        if x < min_x or x > max_x or y < min_y or y > max_y:
+            return False
+        inside = False
+        for (x1, y1), (x2, y2) in self.edges:
+            if _on_segment(x, y, x1, y1, x2, y2):
+                return True
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        return inside
+
+    def edge_distance(self, x, y):
+        """Meters from the point to the polygon's boundary, from inside or outside."""
+        best = math.inf
+        for (x1, y1), (x2, y2) in self.edges:
+            dx, dy = x2 - x1, y2 - y1
+            t = ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy) if dx or dy else 0.0
+            t = min(1.0, max(0.0, t))
+            best = min(best, math.hypot(x - x1 - t * dx, y - y1 - t * dy))
+        return best
+
+
+def _on_segment(x, y, x1, y1, x2, y2):
+    if x < min(x1, x2) - ON_EDGE_METERS or x > max(x1, x2) + ON_EDGE_METERS:
+        return False
+    if y < min(y1, y2) - ON_EDGE_METERS or y > max(y1, y2) + ON_EDGE_METERS:
+        return False
+    dx, dy = x2 - x1, y2 - y1
+    return abs(dx * (y - y1) - dy * (x - x1)) <= ON_EDGE_METERS * math.hypot(dx, dy)
+
+
+class GeofenceIndex:
+    """
+    Point-in-polygon lookups against many zones.
+
+    Vertices are projected to meters (equirectangular around the zones'
+    mean latitude, which keeps straight edges straight), and each zone is
+    registered in every grid cell its bounding box overlaps. A lookup only
+    tests the zones registered in the point's own cell, bounding box first,
+    so its cost depends on how many zones overlap that spot rather than on
+    how many zones the site has.
+    """
+
+    def __init__(self, zones=(), cell_size=CELL_METERS):
+        zones = list(zones)
+        self.cell_size = float(cell_size)
+        lats = [float(point[0]) for zone in zones for point in zone.get('polygon') or ()]
+        self.cos_ref = math.cos(math.radians(sum(lats) / len(lats))) if lats else 1.0
+        self.zones = {}
+        self.cells = {}
+        self.wide = []
+        for zone in zones:
+            try:
+                self.add(zone['zoneId'], zone.get('kind', FLAGGED), zone['polygon'], zone.get('name'))
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"⚠️ Skipping invalid geofence {zone.get('zoneId')}: {e}")
+
+    def _project(self, lat, lon):
+        return EARTH_RADIUS_M * math.radians(lon) * self.cos_ref, EARTH_RADIUS_M * math.radians(lat)
+
+    def add(self, zone_id, kind, polygon, name=None):
+        zone = Zone(zone_id, kind, polygon, name, project=self._project)
+        self.zones[zone_id] = zone
+        min_x, min_y, max_x, max_y = zone.bbox
+        x0, y0 = int(min_x // self.cell_size), int(min_y // self.cell_size)
+        x1, y1 = int(max_x // self.cell_size), int(max_y // self.cell_size)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_CELLS_PER_ZONE:
+            self.wide.append(zone)
+            return
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells.setdefault((cx, cy), []).append(zone)
+
+    def __len__(self):
+        return len(self.zones)
+
+    def containing(self, lat, lon):
+        """Sorted ids of the zones that contain the point."""
+        x, y = self._project(float(lat), float(lon))
+        cell = (int(x // self.cell_size), int(y // self.cell_size))
+        found = [zone.zone_id for zone in self.cells.get(cell, ()) if zone.contains(x, y)]
+        found += [zone.zone_id for zone in self.wide if zone.contains(x, y)]
+        return sorted(found)
+
+
+    def boundary_distance(self, lat, lon, kinds=(VENUE, FLAGGED)):
+        """
+        Meters to the nearest boundary of a zone of the given kinds, among the
+        zones registered in the point's cell and its eight neighbours, or None
+        if there are none that close. Crossing one of these boundaries alerts.
+        """
+        x, y = self._project(float(lat), float(lon))
+        cx, cy = int(x // self.cell_size), int(y // self.cell_size)
+        zones = {zone.zone_id: zone for zone in self.wide if zone.kind in kinds}
+        for nx in (cx - 1, cx, cx + 1):
+            for ny in (cy - 1, cy, cy + 1):
+                zones.update((zone.zone_id, zone) for zone in self.cells.get((nx, ny), ()) if zone.kind in kinds)
+        if not zones:
+            return None
+        return min(zone.edge_distance(x, y) for zone in zones.values())
+
+
+def transitions(previous, current):
+    """(entered, exited) zone ids between two memberships."""
+    previous, current = set(previous or ()), set(current or ())
+    return sorted(current - previous), sorted(previous - current)
+
+
+class GeofenceCache:
+    """
+    The Geofences table as a GeofenceIndex, rebuilt at most every CACHE_TTL
+    seconds. The table is small (a site map is hundreds of zones), so it is
+    read with a paginated scan and shared by every warm invocation.
+    """
+
+    def __init__(self, geofence_table, ttl=CACHE_TTL, clock=time.monotonic):
+        self.table = geofence_table
+        self.ttl = ttl
+        self.clock = clock
+        self.built = None
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+        zones = []
+        kwargs = {}
+        while True:
+            response = self.table.scan(**kwargs)
+            zones += response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return GeofenceIndex(zones)
+
+    def index(self):
+        with self.lock:
+            if self.built is None or self.clock() - self.loaded_at >= self.ttl:
+                self.built = self._load()
+                self.loaded_at = self.clock()
+                print(f"Loaded {len(self.built)} geofence zone(s)")
+            return self.built
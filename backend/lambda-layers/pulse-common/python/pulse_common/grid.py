@@ -0,0 +1,100 @@
+import math
+from pulse_common.geo import EARTH_RADIUS_M, haversine
+
+
+class GridIndex:
+    """
+    Uniform grid over lat/lon points for nearest-neighbour lookups.
+
+    Points are projected to meters (equirectangular around ref_lat) and
+    bucketed into square cells of cell_size meters. Queries walk outward
+    ring by ring from the query cell and stop as soon as no unvisited cell
+    can hold anything closer than the best match found so far, so a lookup
+    near the group only touches the neighbouring cells.
+    """
+
+    def __init__(self, cell_size, ref_lat=0.0):
+        self.cell_size = float(cell_size)
+        self.cos_ref = math.cos(math.radians(ref_lat))
+        self.cells = {}
+        self.points = {}
+
+    def _cell(self, lat, lon):
+        x = EARTH_RADIUS_M * math.radians(lon) * self.cos_ref
+        y = EARTH_RADIUS_M * math.radians(lat)
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, key, lat, lon):
+        self.remove(key)
+        cell = self._cell(lat, lon)
+        self.points[key] = (lat, lon, cell)
+        self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        if key not in self.points:
+            return
+        cell = self.points.pop(key)[2]
+        bucket = self.cells[cell]
+        bucket.discard(key)
+        if not bucket:
+            del self.cells[cell]
+
+    def __len__(self):
+        return len(self.points)
+
+    def _ring(self, cx, cy, k):
+        if k == 0:
+            yield cx, cy
+            return
+        for dx in range(-k, k + 1):
+            yield cx + dx, cy - k
+            yield cx + dx, cy + k
+        for dy in range(-k + 1, k):
+            yield cx - k, cy + dy
+            yield cx + k, cy + dy
+
+    def _max_ring(self, cx, cy):
+        return max(max(abs(x - cx), abs(y - cy)) for x, y in self.cells)
+
+    def nearest(self, lat, lon, exclude=None):
+        """Closest indexed point as (key, meters), or (None, None) if there is none."""
+        if not self.cells:
+            return None, None
+        cx, cy = self._cell(lat, lon)
+        best_key, best_d = None, None
+        for k in range(self._max_ring(cx, cy) + 1):
+            for cell in self._ring(cx, cy, k):
+                for key in self.cells.get(cell, ()):
+                    if key == exclude:
+                        continue
+                    p_lat, p_lon, _ = self.points[key]
+                    d = haversine(lat, lon, p_lat, p_lon)
+                    if best_d is None or d < best_d:
+                        best_key, best_d = key, d
+            # Anything in ring k+1 or beyond is at least k cells away
+            if best_d is not None and best_d <= k * self.cell_size:
+                break
+        return best_key, best_d
+
+
+    def within(self, lat, lon, radius, exclude=None):
+        """Indexed points within `radius` meters as [(key, meters)], nearest first."""
+        cx, cy = self._cell(lat, lon)
+        reach = int(math.ceil(float(radius) / self.cell_size))
+        found = []
+        for k in range(reach + 1):
+            for cell in self._ring(cx, cy, k):
+                for key in self.cells.get(cell, ()):
+                    if key == exclude:
+                        continue
+                    p_lat, p_lon, _ = self.points[key]
+                    d = haversine(lat, lon, p_lat, p_lon)
+                    if d <= radius:
+                        found.append((key, d))
+        found.sort(key=lambda hit: (hit[1], hit[0]))
+        return found
+
+    def location(self, key):
+        """(lat, lon) of an indexed point, or None."""
+        point = self.points.get(key)
+        return point[:2] if point else None
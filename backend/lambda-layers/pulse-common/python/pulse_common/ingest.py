@@ -0,0 +1,337 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pulse_common.cache import LRUCache
+from pulse_common.status import append_clauses, update_current_status
+
+# Idempotent ingest. Devices on flaky networks resend requests, so each
+# ingest path keeps, on the friend's FriendCurrentStatus record, a compact
+# record of the requests it has already applied (`pingDedup`, `vitalsDedup`):
+#
+#   seqs         per device (a friend's phone, watch and ring each count on
+#                their own): the highest client sequence number seen, and a
+#                64-bit map of which of the 63 numbers below it were seen too
+#                (the anti-replay window of IPsec/DTLS)
+#   keys         short digests of the last few idempotency keys, for
+#                clients that send a key instead of a sequence number
+#
+# A number more than the window below a device's highest is too old to tell
+# apart from a replay, and is dropped. The exception is a number inside the
+# first window (below WINDOW): the device's counter restarted (a reinstall,
+# cleared app data), and it starts a new window.
+#
+# The record is read-modify-written with the ingest path's own status update,
+# conditioned on the record being unchanged, so a duplicate is dropped before
+# it writes history, rollups or alerts, however many containers saw it.
+# Requests without a sequence number or key skip all of this.
+#
+# Writes for the same friend that overlap in one process (a reconnect flood
+# against the self-hosted server) are coalesced: while one write is in
+# flight the next ones queue up and go out together as one conditional write.
+
+WRITTEN = 'written'      # this request's fields are now the friend's current status
+COALESCED = 'coalesced'  # applied, but a newer request in the same write supplied the fields
+STALE = 'stale'          # recorded, but the stored status is newer, so nothing was overwritten
+DUPLICATE = 'duplicate'  # already applied, dropped
+
+WINDOW = 64        # sequence numbers tracked below the highest; further back is dropped, unless the counter restarted
+MAX_DEVICES = 8    # devices tracked per friend; past that, the one updated least recently (in this container) is dropped
+MAX_KEYS = 16      # idempotency keys remembered per friend
+DEFAULT_DEVICE = 'default'  # requests without a deviceId
+MAX_ATTEMPTS = 3   # optimistic write attempts before giving up
+
+CACHE_SIZE = int(os.environ.get('INGEST_DEDUP_CACHE_SIZE', 4096))
+CACHE_TTL = float(os.environ.get('INGEST_DEDUP_CACHE_SECONDS', 600))
+COALESCE_SECONDS = float(os.environ.get('INGEST_COALESCE_MS', 0)) / 1000  # optional extra wait to collect a burst
+
+# Every stored capture time has this one format (naive UTC, microseconds always present),
+# so stamps and sort keys compare correctly as strings
+STAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+MAX_CLOCK_SKEW = timedelta(seconds=int(os.environ.get('INGEST_MAX_CLOCK_SKEW_SECONDS', 120)))
+MAX_BACKLOG = timedelta(hours=int(os.environ.get('INGEST_MAX_BACKLOG_HOURS', 24)))
+
+
+def request_keys(payload):
+    """
+    (seq, idempotency key) sent by the client; either may be None. seq is
+    (deviceId, number), so each of a friend's devices counts on its own.
+    Raises ValueError for a bad seq.
+    """
+    seq = payload.get('seq')
+    if seq is not None:
+        if isinstance(seq, bool) or not isinstance(seq, (int, float)) or int(seq) != seq or seq < 0:
+            raise ValueError('seq must be a non-negative integer')
+        seq = (str(payload.get('deviceId') or DEFAULT_DEVICE), int(seq))
+    key = payload.get('idempotencyKey')
+    return seq, (str(key) if key not in (None, '') else None)
+
+
+def capture_time(value, now):
+    """
+    Timestamp (STAMP_FORMAT) for a reading: the device's capture time if
+    it sent a plausible ISO 8601 one, else the server's receive time. A
+    resent reading then keeps its original time, and a backlog flushed after
+    reconnecting lands in order instead of all at once.
+    """
+    if value and isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+            if parsed.tzinfo:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            if now - MAX_BACKLOG <= parsed <= now + MAX_CLOCK_SKEW:
+                return min(parsed, now).strftime(STAMP_FORMAT)
+        except (TypeError, ValueError):
+            pass
+    return now.strftime(STAMP_FORMAT)
+
+
+def _digest(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:10]
+
+
+class RecentKeys:
+    """The per-friend record of applied requests (see the module comment)."""
+
+    def __init__(self, stored=None):
+        stored = stored or {}
+        self.stored = bool(stored)
+        seqs = stored.get('seqs', {})
+        if 'high' in stored:  # written before windows were kept per device
+            seqs = {DEFAULT_DEVICE: {'high': stored['high'], 'bits': stored.get('bits', 0)}}
+        self.seqs = {device: (int(window['high']), int(window['bits'])) for device, window in seqs.items()}
+        self.keys = list(stored.get('keys', []))
+
+    def copy(self):
+        window = RecentKeys(self.to_item())
+        window.stored = self.stored
+        return window
+
+    def seen(self, seq=None, key=None):
+        if key is not None and _digest(key) in self.keys:
+            return True
+        if seq is None:
+            return False
+        device, number = seq
+        high, bits = self.seqs.get(device, (-1, 0))
+        gap = high - number
+        if gap < 0:
+            return False
+        if gap >= WINDOW:
+            return number >= WINDOW  # too old, unless the counter restarted: add() starts a new window
+        return bool(bits >> gap & 1)
+
+    def add(self, seq=None, key=None):
+        if key is not None:
+            self.keys = (self.keys + [_digest(key)])[-MAX_KEYS:]
+        if seq is None:
+            return
+        device, number = seq
+        high, bits = self.seqs.pop(device, (-1, 0))
+        if number > high:
+            shift = number - high
+            bits = (bits << shift | 1) & ((1 << WINDOW) - 1) if shift < WINDOW else 1
+            high = number
+        elif high - number >= WINDOW:
+            high, bits = number, 1
+        else:
+            bits |= 1 << (high - number)
+        self.seqs[device] = (high, bits)  # most recently used last
+        while len(self.seqs) > MAX_DEVICES:
+            del self.seqs[next(iter(self.seqs))]
+
+    def to_item(self):
+        return {
+            'seqs': {device: {'high': high, 'bits': bits} for device, (high, bits) in self.seqs.items()},
+            'keys': list(self.keys)
+        }
+
+
+class StatusWrite:
+    """One request's contribution to a friend's current-status record."""
+
+    def __init__(self, fields, stamp, seq=None, key=None, append=None):
+        self.fields = fields
+        self.stamp = stamp
+        self.seq = seq
+        self.key = key
+        self.append = append or {}
+
+    @property
+    def keyed(self):
+        return self.seq is not None or self.key is not None
+
+
+class IngestGuard:
+    """
+    Dedup and coalescing for one ingest path's writes to FriendCurrentStatus.
+
+    `submit(friend_id, write)` returns (outcome, previous values, appended)
+    where outcome is WRITTEN, COALESCED, STALE or DUPLICATE. Only WRITTEN
+    gets the previous values and everything the merged write appended, so
+    exactly one of the coalesced requests acts on what changed.
+
+    A STALE write changes no fields, but its appended entries still go in:
+    a late ping belongs in the trail even though it is not the current
+    position. Each container keeps the windows it has seen (a warm cache),
+    so `is_duplicate` drops most retries before any AWS call. The
+    conditional write stays the authority.
+    """
+
+    def __init__(self, status_table, field, stamp_field, linger=COALESCE_SECONDS):
+        self.table = status_table
+        self.field = field
+        self.stamp_field = stamp_field
+        self.linger = linger
+        self.windows = LRUCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+        self.lock = threading.Lock()
+        self.batches = {}  # friendId -> writes waiting for the next flush
+        self.flushing = {}  # friendId -> [lock serializing its flushes, users]
+
+    def is_duplicate(self, friend_id, seq=None, key=None):
+        window = self.windows.get(friend_id)
+        return window is not None and window.seen(seq, key)
+
+    def prefetch(self, friend_id):
+        """Load the friend's window into the warm cache, so it can overlap the caller's other reads."""
+        if self.windows.get(friend_id) is None:
+            self.windows.put(friend_id, self._load(friend_id)[0])
+
+    def remember(self, friend_id, stored):
+        """Seed the warm cache from a read the caller made anyway (the field's stored value, or None)."""
+        if self.windows.get(friend_id) is None:
+            self.windows.put(friend_id, RecentKeys(stored))
+
+    def submit(self, friend_id, write):
+        with self.lock:
+            batch = self.batches.get(friend_id)
+            leader = batch is None
+            if leader:
+                batch = self.batches[friend_id] = {'writes': [], 'done': threading.Event(), 'results': None, 'error': None}
+            index = len(batch['writes'])
+            batch['writes'].append(write)
+            if leader:
+                entry = self.flushing.setdefault(friend_id, [threading.Lock(), 0])
+                entry[1] += 1
+        if not leader:
+            batch['done'].wait()
+            if batch['error'] is not None:
+                raise batch['error']
+            return batch['results'][index]
+
+        # The leader waits for the friend's previous flush; requests arriving meanwhile join this batch
+        try:
+            with entry[0]:
+                if self.linger:
+                    time.sleep(self.linger)
+                with self.lock:
+                    del self.batches[friend_id]
+                try:
+                    batch['results'] = self._flush(friend_id, batch['writes'])
+                except Exception as e:
+                    batch['error'] = e
+                    raise
+                finally:
+                    batch['done'].set()
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.flushing[friend_id]
+        return batch['results'][index]
+
+    def _load(self, friend_id):
+        item = self.table.get_item(
+            Key={'friendId': friend_id},
+            ConsistentRead=True,
+            ProjectionExpression='#d, #ts',
+            ExpressionAttributeNames={'#d': self.field, '#ts': self.stamp_field}
+        ).get('Item') or {}
+        return RecentKeys(item.get(self.field)), item.get(self.stamp_field)
+
+    def _flush(self, friend_id, writes):
+        keyed = any(write.keyed for write in writes)
+        window = (self.windows.get(friend_id) or self._load(friend_id)[0]) if keyed else None
+        for _ in range(MAX_ATTEMPTS):
+            outcomes = [None] * len(writes)
+            updated = window.copy() if keyed else None
+            fresh = []
+            for i, write in enumerate(writes):
+                if write.keyed and updated.seen(write.seq, write.key):
+                    outcomes[i] = (DUPLICATE, None, None)
+                    continue
+                if write.keyed:
+                    updated.add(write.seq, write.key)
+                fresh.append(i)
+            if not fresh:
+                return outcomes
+
+            # Newest request supplies the fields; every fresh request's appended entries go in, oldest first
+            newest = max(fresh, key=lambda i: writes[i].stamp)
+            fields = dict(writes[newest].fields)
+            append = {}
+            for i in sorted(fresh, key=lambda i: writes[i].stamp):
+                for field, items in writes[i].append.items():
+                    append.setdefault(field, []).extend(items)
+            expect = None
+            if keyed:
+                fields[self.field] = updated.to_item()
+                expect = {self.field: window.to_item() if window.stored else None}
+
+            previous = update_current_status(self.table, friend_id, fields, self.stamp_field, writes[newest].stamp,
+                                             return_old=True, append=append or None, expect=expect)
+            if previous is not None:
+                if keyed:
+                    updated.stored = True
+                    self.windows.put(friend_id, updated)
+                for i in fresh:
+                    outcomes[i] = (WRITTEN, previous, append) if i == newest else (COALESCED, None, None)
+                return outcomes
+            if not keyed:
+                self._record(friend_id, None, None, append)
+                return [(STALE, None, None)] * len(writes)
+
+            # Either a newer status is stored (stale) or another writer moved the window: re-read to tell
+            stored, stored_stamp = self._load(friend_id)
+            if stored.to_item() == window.to_item() and stored_stamp is not None and stored_stamp > writes[newest].stamp:
+                if self._record(friend_id, window, updated, append):
+                    self.windows.put(friend_id, updated)
+                    for i in fresh:
+                        outcomes[i] = (STALE, None, None)
+                    return outcomes
+                stored = self._load(friend_id)[0]
+            window = stored
+        raise RuntimeError(f"Could not apply ingest for {friend_id}: concurrent writers kept winning")
+
+    def _record(self, friend_id, window, updated, append):
+        """
+        Apply requests whose status is stale: append their entries and, when
+        keyed, record them in the window (conditioned on it being unchanged),
+        so their retries are still recognised and append nothing twice.
+        """
+        names, values = {}, {}
+        assignments = append_clauses(append, names, values)
+        kwargs = {}
+        if updated is not None:
+            updated.stored = True
+            names['#d'] = self.field
+            values[':new'] = updated.to_item()
+            assignments.append('#d = :new')
+            if window.stored:
+                values[':old'] = window.to_item()
+            kwargs['ConditionExpression'] = '#d = :old' if window.stored else 'attribute_not_exists(#d)'
+        if not assignments:
+            return True
+        try:
+            self.table.update_item(
+                Key={'friendId': friend_id},
+                UpdateExpression='SET ' + ', '.join(assignments),
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+                **kwargs
+            )
+            return True
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+from pulse_common.friends import get_accepted_friend_ids
+from pulse_common.telemetry import count
+
+# Severity levels; a repeat of an open incident only goes out if it is more severe
+WARNING = 1
+ALERT = 2
+CRITICAL = 3
+SEVERITY_LABELS = {WARNING: 'WARNING', ALERT: 'ALERT', CRITICAL: 'CRITICAL'}
+
+# Who receives an alert: the friend alone, or the friend and all their accepted friends
+SELF = 'self'
+FRIENDS = 'friends'
+
+SUPPRESSION_SECONDS = int(os.environ.get('ALERT_SUPPRESSION_SECONDS', 900))
+PUBLISH_BATCH_LIMIT = 10  # SNS PublishBatch maximum
+
+
+def sms_endpoint(phone):
+    return f"+1{phone}"  # Assumes phone is stored as 10-digit string
+
+
+def subscribe_phone(sns, topic_arn, user_id, phone):
+    """
+    Subscribe a user's phone to the alerts topic, filtered to messages
+    whose `recipients` attribute contains their userId.
+    """
+    return sns.subscribe(
+        TopicArn=topic_arn,
+        Protocol='sms',
+        Endpoint=sms_endpoint(phone),
+        Attributes={'FilterPolicy': json.dumps({'recipients': [user_id]})},
+        ReturnSubscriptionArn=True
+    )['SubscriptionArn']
+
+
+class AlertNotifier:
+    """
+    Coalesces alerts into incidents and publishes them in batches.
+
+    An incident is one (friendId, cause) pair in the AlertIncidents table.
+    Within the suppression window a repeat at the same or lower severity is
+    only counted; a more severe one goes out. CRITICAL alerts (an SOS, a
+    fall) are requests for help and always go out. If an incident is still being
+    re-raised when the window ends, the next alert is sent one level higher
+    instead of repeating. Alerts are queued by notify() and sent by flush()
+    as one topic message per incident, with a `recipients` attribute that
+    SMS subscriptions filter on, so fan-out to friends costs one publish.
+    """
+
+    def __init__(self, sns, topic_arn, incidents_table, graph_table, clock=time.time, window=SUPPRESSION_SECONDS):
+        self.sns = sns
+        self.topic_arn = topic_arn
+        self.incidents = incidents_table
+        self.graph = graph_table
+        self.clock = clock
+        self.window = window
+        self.pending = []
+        self.pending_lock = threading.Lock()
+
+    def _claim(self, friend_id, cause, severity):
+        """Returns (severity to send at, repeats suppressed so far), or None if the alert is suppressed."""
+        key = {'incidentId': f'{friend_id}#{cause}'}
+        now = int(self.clock())
+        incident = self.incidents.get_item(Key=key, ConsistentRead=True).get('Item')
+
+        if incident and now - incident['lastSentAt'] < self.window and severity <= incident['severity'] \
+                and severity < CRITICAL:
+            self.incidents.update_item(
+                Key=key,
+                UpdateExpression='ADD suppressed :one',
+                ExpressionAttributeValues={':one': 1}
+            )
+            return None
+        if incident and incident.get('suppressed'):
+            # Still firing after a full window: escalate rather than repeat
+            severity = min(max(severity, int(incident['severity'])) + 1, CRITICAL)
+            count('alerts.escalated')
+
+        if incident:
+            condition = 'lastSentAt = :prev'
+            values = {':prev': incident['lastSentAt']}
+        else:
+            condition = 'attribute_not_exists(incidentId)'
+            values = {}
+        try:
+            self.incidents.update_item(
+                Key=key,
+                UpdateExpression=(
+                    'SET friendId = :fid, #c = :cause, severity = :sev, lastSentAt = :now, '
+                    'expiresAt = :exp, suppressed = :zero'
+                ),
+                ConditionExpression=condition,
+                ExpressionAttributeNames={'#c': 'cause'},
+                ExpressionAttributeValues={
+                    **values,
+                    ':fid': friend_id,
+                    ':cause': cause,
+                    ':sev': severity,
+                    ':now': now,
+                    ':exp': now + 2 * self.window,
+                    ':zero': 0
+                }
+            )
+        except self.incidents.meta.client.exceptions.ConditionalCheckFailedException:
+            if severity == CRITICAL:
+                return severity, 0  # another request for help raced this one; both go out
+            return None  # a concurrent invocation sent this incident
+        return severity, int((incident or {}).get('suppressed', 0))
+
+    def notify(self, friend_id, cause, severity, message, subject='PULSE Alert', audience=FRIENDS):
+        """Queue an alert for flush(). Returns the severity it will be sent at, or None if coalesced."""
+        claimed = self._claim(friend_id, cause, severity)
+        if claimed is None:
+            print(f"🔕 Alert for {friend_id} ({cause}) coalesced into the open incident.")
+            count('alerts.coalesced')
+            return None
+        severity, suppressed = claimed
+
+        recipients = [friend_id]
+        if audience == FRIENDS:
+            recipients += get_accepted_friend_ids(self.graph, friend_id)
+        text = f"[{SEVERITY_LABELS[severity]}] {message}"
+        if suppressed:
+            text += f"\n({suppressed} repeat alert(s) suppressed)"
+
+        with self.pending_lock:
+            self.pending.append({
+                'friendId': friend_id,
+                'cause': cause,
+                'entry': {
+                    'Message': text,
+                    'Subject': subject,
+                    'MessageAttributes': {
+                        'recipients': {'DataType': 'String.Array', 'StringValue': json.dumps(recipients)},
+                        'friendId': {'DataType': 'String', 'StringValue': friend_id},
+                        'cause': {'DataType': 'String', 'StringValue': cause},
+                        'severity': {'DataType': 'Number', 'StringValue': str(severity)}
+                    }
+                }
+            })
+        count('alerts.queued')
+        return severity
+
+    def resolve(self, friend_id, cause):
+        """Close an incident so the next occurrence alerts immediately."""
+        self.incidents.delete_item(Key={'incidentId': f'{friend_id}#{cause}'})
+
+    def flush(self, on_failure=None):
+        """
+        Publish queued alerts with PublishBatch. Returns the number published.
+
+        An alert that could not be published (a Failed entry, or every entry
+        of a batch whose call raised) reopens its incident and is passed to
+        on_failure, so a caller can retry whatever produced it.
+        """
+        with self.pending_lock:
+            pending, self.pending = self.pending, []
+        sent = 0
+        for start in range(0, len(pending), PUBLISH_BATCH_LIMIT):
+            chunk = pending[start:start + PUBLISH_BATCH_LIMIT]
+            try:
+                response = self.sns.publish_batch(
+                    TopicArn=self.topic_arn,
+                    PublishBatchRequestEntries=[{'Id': str(i), **alert['entry']} for i, alert in enumerate(chunk)]
+                )
+                failures = [(chunk[int(failure['Id'])], failure.get('Message')) for failure in response.get('Failed', [])]
+                sent += len(response.get('Successful', []))
+            except Exception as e:
+                failures = [(alert, str(e)) for alert in chunk]
+            for alert, reason in failures:
+                print(f"❌ Failed to publish alert for {alert['friendId']}: {reason}")
+                # Reopen so the next occurrence is not suppressed by an alert nobody received
+                self.resolve(alert['friendId'], alert['cause'])
+                if on_failure is not None:
+                    on_failure(alert)
+        if pending:
+            count('alerts.published', sent)
+            count('alerts.failed', len(pending) - sent)
+        return sent
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from pulse_common.runtime import lazy_import
+
+# Password hashing with a bcrypt work factor sized to the container.
+#
+# BCRYPT_ROUNDS pins the cost (never below MIN_ROUNDS). Otherwise the cost
+# is calibrated once per container: one hash at MIN_ROUNDS is timed and the
+# largest cost whose estimated time (doubling per round) fits
+# BCRYPT_TARGET_MS is used.
+# Hashes below the current cost are re-hashed on the next successful login;
+# costs are never lowered, and never go below bcrypt's own default of 12.
+
+bcrypt = lazy_import('bcrypt')
+
+MIN_ROUNDS = 12
+MAX_ROUNDS = 15
+TARGET_MS = float(os.environ.get('BCRYPT_TARGET_MS', 250))
+PINNED_ROUNDS = int(os.environ['BCRYPT_ROUNDS']) if os.environ.get('BCRYPT_ROUNDS') else None
+
+_rounds = None
+_rounds_lock = threading.Lock()
+
+
+def calibrate_rounds(target_ms=TARGET_MS, min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS):
+    """Largest cost whose hash should take at most target_ms here (never below min_rounds)."""
+    started = time.perf_counter()
+    bcrypt.hashpw(b'calibration', bcrypt.gensalt(min_rounds))
+    base_ms = (time.perf_counter() - started) * 1000
+    rounds = min_rounds
+    while rounds < max_rounds and base_ms * 2 ** (rounds + 1 - min_rounds) <= target_ms:
+        rounds += 1
+    print(f"bcrypt cost {rounds} (cost {min_rounds} took {base_ms:.0f} ms, target {target_ms:.0f} ms)")
+    return rounds
+
+
+def current_rounds():
+    global _rounds
+    if PINNED_ROUNDS is not None:
+        return max(PINNED_ROUNDS, MIN_ROUNDS)
+    if _rounds is None:
+        with _rounds_lock:
+            if _rounds is None:
+                _rounds = calibrate_rounds()
+    return _rounds
+
+
+def hash_password(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(current_rounds())).decode('utf-8')
+
+
+def check_password(password, stored_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
+
+
+def hash_rounds(stored_hash):
+    """Cost factor of a "$2b$12$..." hash."""
+    try:
+        return int(stored_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(stored_hash):
+    rounds = hash_rounds(stored_hash)
+    return rounds is None or rounds < current_rounds()
@@ -0,0 +1,100 @@
+import os
+import time
+from pulse_common.cache import LRUCache
+from pulse_common.dynamo import batch_get_items
+from pulse_common.runtime import Lazy
+from pulse_common.telemetry import count
+
+# Reserved UserPreferences item holding a counter that set-user-preferences bumps on every write.
+# Keys starting with RESERVED_PREFIX are never a user's, so no client write can reach the counter.
+RESERVED_PREFIX = '__'
+VERSION_KEY = RESERVED_PREFIX + 'version__'
+
+CACHE_SIZE = int(os.environ.get('PREFERENCES_CACHE_SIZE', 1024))
+CACHE_TTL = float(os.environ.get('PREFERENCES_CACHE_TTL', 300))  # seconds
+VERSION_CHECK_INTERVAL = float(os.environ.get('PREFERENCES_VERSION_CHECK_SECONDS', 5))
+
+
+def is_reserved_key(friend_id):
+    """Whether friend_id names a reserved UserPreferences item rather than a user."""
+    return not isinstance(friend_id, str) or friend_id.startswith(RESERVED_PREFIX)
+
+
+def bump_preferences_version(preferences_table):
+    """Tell every warm reader that preferences changed; called by set-user-preferences after a write."""
+    preferences_table.update_item(
+        Key={'friendId': VERSION_KEY},
+        UpdateExpression='ADD #v :one',
+        ExpressionAttributeNames={'#v': 'version'},
+        ExpressionAttributeValues={':one': 1}
+    )
+
+
+class PreferencesCache:
+    """
+    Read-through cache for UserPreferences items.
+
+    Entries expire after CACHE_TTL. At most once per VERSION_CHECK_INTERVAL
+    the version counter item is read; if it moved, the whole cache is
+    dropped so an update takes effect within a few seconds instead of a
+    full TTL. Friends without preferences are cached as {} too.
+    """
+
+    def __init__(self, dynamodb, table_name, clock=time.monotonic):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.table = Lazy(lambda: dynamodb.Table(table_name))  # no AWS setup until the first read
+        self.clock = clock
+        self.cache = LRUCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL, clock=clock)
+        self.version = None
+        self.checked_at = None
+        self.version_checks = 0
+
+    def _check_version(self):
+        now = self.clock()
+        if self.checked_at is not None and now - self.checked_at < VERSION_CHECK_INTERVAL:
+            return
+        self.checked_at = now
+        self.version_checks += 1
+        response = self.table.get_item(Key={'friendId': VERSION_KEY}, ProjectionExpression='version')
+        version = response.get('Item', {}).get('version', 0)
+        if version != self.version:
+            if self.version is not None:
+                print(f"Preferences version {self.version} -> {version}, clearing cache")
+            self.cache.clear()
+            self.version = version
+
+    def get(self, friend_id):
+        self._check_version()
+        preferences = self.cache.get(friend_id)
+        if preferences is None:
+            count('preferences.cache.misses')
+            preferences = self.table.get_item(Key={'friendId': friend_id}).get('Item', {})
+            self.cache.put(friend_id, preferences)
+        else:
+            count('preferences.cache.hits')
+        return preferences
+
+    def get_many(self, friend_ids):
+        """Preferences for several friends; misses are fetched together with one batch_get_item."""
+        self._check_version()
+        found = {}
+        missing = []
+        for fid in dict.fromkeys(friend_ids):
+            preferences = self.cache.get(fid)
+            if preferences is None:
+                missing.append(fid)
+            else:
+                found[fid] = preferences
+        count('preferences.cache.hits', len(found))
+        count('preferences.cache.misses', len(missing))
+        if missing:
+            items = batch_get_items(self.dynamodb, self.table_name, [{'friendId': fid} for fid in missing])
+            loaded = {item['friendId']: item for item in items}
+            for fid in missing:
+                found[fid] = loaded.get(fid, {})
+                self.cache.put(fid, found[fid])
+        return found
+
+    def stats(self):
+        return {**self.cache.stats(), 'versionChecks': self.version_checks}
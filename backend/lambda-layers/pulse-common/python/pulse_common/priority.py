@@ -0,0 +1,56 @@
+import os
+
+# Priority lanes for ingest. A request is classified from its handler and
+# body alone, before any work is done, so a scheduler can run SOS presses
+# and falls ahead of routine telemetry and shed telemetry first:
+#
+#   critical  SOS from process-friend-data, fall detection from process-wearable-data
+#   elevated  wearable batches with a reading past the static thresholds
+#   routine   everything else: GPS pings, normal vitals, app polls, accounts
+CRITICAL = 0
+ELEVATED = 1
+ROUTINE = 2
+LANES = (CRITICAL, ELEVATED, ROUTINE)  # in priority order
+LANE_NAMES = {CRITICAL: 'critical', ELEVATED: 'elevated', ROUTINE: 'routine'}
+
+# Routine traffic from these handlers is telemetry: under load it may be downsampled, a newer reading supersedes it
+TELEMETRY_HANDLERS = ('process-friend-data', 'process-wearable-data')
+
+# The static thresholds process-wearable-data applies before a friend's baseline is warm
+ELEVATED_MAX_HEART_RATE = float(os.environ.get('PRIORITY_MAX_HEART_RATE', 150))
+ELEVATED_MIN_HEART_RATE = float(os.environ.get('PRIORITY_MIN_HEART_RATE', 50))
+ELEVATED_MAX_STRESS_LEVEL = float(os.environ.get('PRIORITY_MAX_STRESS_LEVEL', 80))
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _breaches(sample):
+    heart_rate = _number(sample.get('heartRate'))
+    stress = _number(sample.get('stressLevel'))
+    return ((heart_rate is not None and not ELEVATED_MIN_HEART_RATE <= heart_rate <= ELEVATED_MAX_HEART_RATE)
+            or (stress is not None and stress > ELEVATED_MAX_STRESS_LEVEL))
+
+
+def classify(handler, body):
+    """Lane for a request to `handler` (function name) with the given parsed JSON body (or None)."""
+    if not isinstance(body, dict):
+        return ROUTINE
+    if handler == 'process-friend-data':
+        return CRITICAL if body.get('sos') else ROUTINE
+    if handler == 'process-wearable-data':
+        samples = body.get('samples')
+        samples = [s for s in samples if isinstance(s, dict)] if isinstance(samples, list) else [body]
+        if any(sample.get('fallDetected') for sample in samples):
+            return CRITICAL
+        if any(_breaches(sample) for sample in samples):
+            return ELEVATED
+    return ROUTINE
+
+
+def is_telemetry(handler, lane):
+    return lane == ROUTINE and handler in TELEMETRY_HANDLERS
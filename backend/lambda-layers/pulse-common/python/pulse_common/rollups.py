@@ -0,0 +1,160 @@
+import os
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pulse_common.concurrency import map_concurrently
+
+METRICS = ('heartRate', 'stressLevel')
+
+MINUTE = 'minute'
+HOUR = 'hour'
+BUCKET_FORMATS = {MINUTE: '%Y-%m-%dT%H:%M', HOUR: '%Y-%m-%dT%H'}
+
+# Retention tiers: raw samples expire first, then minute rollups, then hour rollups
+RAW_RETENTION = timedelta(hours=float(os.environ.get('RAW_RETENTION_HOURS', 24)))
+ROLLUP_RETENTION = {
+    MINUTE: timedelta(days=float(os.environ.get('MINUTE_ROLLUP_RETENTION_DAYS', 30))),
+    HOUR: timedelta(days=float(os.environ.get('HOUR_ROLLUP_RETENTION_DAYS', 365)))
+}
+
+# History queries: spans up to RAW_MAX_SPAN read raw samples, up to MINUTE_MAX_SPAN minute rollups, else hour rollups
+RAW_MAX_SPAN = timedelta(hours=1)
+MINUTE_MAX_SPAN = timedelta(hours=24)
+
+MAX_MERGE_ATTEMPTS = 5
+
+
+def parse_timestamp(ts):
+    """ISO timestamp (naive means UTC, trailing Z allowed) -> aware UTC datetime."""
+    parsed = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+    return parsed.astimezone(timezone.utc) if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def expires_at(ts, retention):
+    return int((parse_timestamp(ts) + retention).timestamp())
+
+
+def rollup_key(friend_id, resolution):
+    return f'{friend_id}#{resolution}'
+
+
+def choose_resolution(start, end):
+    span = end - start
+    if span <= RAW_MAX_SPAN:
+        return 'raw'
+    if span <= MINUTE_MAX_SPAN:
+        return MINUTE
+    return HOUR
+
+
+def aggregate(items):
+    """
+    Fold raw samples into per-(friend, resolution, bucket) min/max/sum/count
+    so a batch costs one rollup write per bucket, not one per sample.
+    """
+    rollups = {}
+    for item in items:
+        when = parse_timestamp(item['timestamp'])
+        for resolution, fmt in BUCKET_FORMATS.items():
+            bucket = rollups.setdefault((item['friendId'], resolution, when.strftime(fmt)), {})
+            for metric in METRICS:
+                value = item.get(metric)
+                if value is None:
+                    continue
+                stats = bucket.get(metric)
+                if stats is None:
+                    bucket[metric] = [value, value, value, 1]
+                else:
+                    stats[0] = min(stats[0], value)
+                    stats[1] = max(stats[1], value)
+                    stats[2] += value
+                    stats[3] += 1
+    return rollups
+
+
+def _merge(existing, stats):
+    merged = dict(existing)
+    for metric, (lo, hi, total, count) in stats.items():
+        if merged.get(f'{metric}Count'):
+            lo = min(lo, merged[f'{metric}Min'])
+            hi = max(hi, merged[f'{metric}Max'])
+            total += merged[f'{metric}Sum']
+            count += merged[f'{metric}Count']
+        merged.update({
+            f'{metric}Min': Decimal(str(lo)),
+            f'{metric}Max': Decimal(str(hi)),
+            f'{metric}Sum': Decimal(str(total)),
+            f'{metric}Count': count
+        })
+    return merged
+
+
+def apply_rollups(table, rollups):
+    """
+    Merge batch aggregates into the VitalsRollups table.
+
+    DynamoDB has no atomic min/max, so each bucket is a read-merge-write
+    guarded by a version attribute; a concurrent writer makes the
+    conditional put fail and the merge is retried on fresh data. Buckets
+    are independent, so they are merged concurrently.
+    """
+    conditional_failed = table.meta.client.exceptions.ConditionalCheckFailedException
+
+    def merge_bucket(entry):
+        (friend_id, resolution, bucket), stats = entry
+        key = {'seriesId': rollup_key(friend_id, resolution), 'bucket': bucket}
+        expiry = int((parse_timestamp(bucket + (':00' if resolution == HOUR else '')) + ROLLUP_RETENTION[resolution]).timestamp())
+        for _ in range(MAX_MERGE_ATTEMPTS):
+            existing = table.get_item(Key=key, ConsistentRead=True).get('Item')
+            item = _merge(existing or key, stats)
+            item['version'] = (existing or {}).get('version', 0) + 1
+            item['expiresAt'] = expiry
+            try:
+                if existing:
+                    table.put_item(
+                        Item=item,
+                        ConditionExpression='#v = :v',
+                        ExpressionAttributeNames={'#v': 'version'},
+                        ExpressionAttributeValues={':v': existing['version']}
+                    )
+                else:
+                    table.put_item(Item=item, ConditionExpression='attribute_not_exists(seriesId)')
+                return
+            except conditional_failed:
+                continue
+        print(f"❌ Gave up merging rollup {key} after {MAX_MERGE_ATTEMPTS} attempts")
+
+    map_concurrently(merge_bucket, [entry for entry in rollups.items() if entry[1]])
+
+
+def to_point(item):
+    point = {'bucket': item['bucket']}
+    for metric in METRICS:
+        count = item.get(f'{metric}Count')
+        if count:
+            point[metric] = {
+                'min': item[f'{metric}Min'],
+                'max': item[f'{metric}Max'],
+                'mean': item[f'{metric}Sum'] / count,
+                'count': count
+            }
+    return point
+
+
+def query_rollups(table, friend_id, resolution, start, end):
+    fmt = BUCKET_FORMATS[resolution]
+    kwargs = {
+        'KeyConditionExpression': 'seriesId = :sid AND #b BETWEEN :start AND :end',
+        'ExpressionAttributeNames': {'#b': 'bucket'},
+        'ExpressionAttributeValues': {
+            ':sid': rollup_key(friend_id, resolution),
+            ':start': start.strftime(fmt),
+            ':end': end.strftime(fmt)
+        }
+    }
+    points = []
+    while True:
+        response = table.query(**kwargs)
+        points += [to_point(item) for item in response.get('Items', [])]
+        if 'LastEvaluatedKey' not in response:
+            return points
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
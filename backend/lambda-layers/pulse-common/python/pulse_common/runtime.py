@@ -0,0 +1,154 @@
+import hashlib
+import importlib
+import json
+import os
+import threading
+from decimal import Decimal
+from pulse_common.telemetry import traced
+
+# Shared handler runtime. Importing this module is cheap: boto3, service
+# clients, tables and heavy libraries such as bcrypt are only loaded the
+# first time a handler actually touches them, then kept for the lifetime
+# of the container.
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+}
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+class Lazy:
+    """
+    Stand-in for an object that is expensive to build. The factory runs on
+    first attribute access and the result is reused for every later access,
+    so module-level clients cost nothing until a request needs them.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+_backend = None
+
+
+def use_backend(backend):
+    """
+    Build clients and resources from `backend` (anything with boto3's
+    client(service) / resource(service) signatures) instead of boto3, e.g.
+    the in-memory stand-ins in backend/benchmarks. Call before the first
+    request; objects built earlier keep their original backend.
+    """
+    global _backend
+    _backend = backend
+
+
+def _aws():
+    return _backend or importlib.import_module('boto3')
+
+
+def _options():
+    """
+    Extra boto3 client/resource arguments. AWS_MAX_POOL_CONNECTIONS raises
+    botocore's per-client HTTP pool (default 10) for processes that run many
+    requests at once on shared clients, e.g. backend/server.
+    """
+    pool = os.environ.get('AWS_MAX_POOL_CONNECTIONS')
+    if _backend or not pool:
+        return {}
+    config = importlib.import_module('botocore.config')
+    return {'config': config.Config(max_pool_connections=int(pool))}
+
+
+def _once(key, factory):
+    with _instances_lock:
+        if key not in _instances:
+            _instances[key] = Lazy(factory)
+        return _instances[key]
+
+
+def lazy_import(module_name):
+    """Module proxy; the import happens on first use (e.g. bcrypt only on login/signup paths)."""
+    return _once(('module', module_name), lambda: importlib.import_module(module_name))
+
+
+def client(service):
+    """One boto3 client per service per container, built on first use; its calls are telemetry spans."""
+    return _once(('client', service), lambda: traced(_aws().client(service, **_options()), service))
+
+
+def resource(service):
+    """One boto3 resource per service per container, built on first use; its calls are telemetry spans."""
+    return _once(('resource', service), lambda: traced(_aws().resource(service, **_options()), service))
+
+
+def table(name):
+    """One DynamoDB Table per name per container, built on first use."""
+    return _once(('table', name), lambda: resource('dynamodb').Table(name))
+
+
+# Custom encoder to handle Decimal values from DynamoDB
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        return super(DecimalEncoder, self).default(obj)
+
+
+def json_response(status_code, body, headers=None):
+    """API Gateway proxy response with a JSON body (Decimals become floats)."""
+    response = {'statusCode': status_code}
+    if headers:
+        response['headers'] = headers
+    response['body'] = json.dumps(body, cls=DecimalEncoder)
+    return response
+
+
+def get_header(event, name):
+    """Request header value, matched case-insensitively (REST and HTTP APIs differ), or None."""
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def not_modified(event, etag, headers=None):
+    """Bodiless 304 if the request's If-None-Match names etag, else None."""
+    candidates = [tag.strip() for tag in (get_header(event, 'If-None-Match') or '').split(',')]
+    if etag in candidates or f'W/{etag}' in candidates or '*' in candidates:
+        return {'statusCode': 304, 'headers': {**(headers or {}), 'ETag': etag, 'Cache-Control': 'no-cache'}}
+    return None
+
+
+def conditional_json_response(event, body, headers=None, etag=None):
+    """
+    200 JSON response carrying a strong ETag of its body, or a bodiless 304
+    when the request's If-None-Match already names that ETag. Clients that
+    re-poll with the last ETag then only pay for a status line. A caller
+    that tracks a version of the body passes its own etag, and can answer
+    with not_modified() before building the body at all.
+    """
+    payload = json.dumps(body, cls=DecimalEncoder, sort_keys=True, separators=(',', ':'))
+    if etag is None:
+        etag = '"' + hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32] + '"'
+    unchanged = not_modified(event, etag, headers)
+    if unchanged:
+        return unchanged
+    headers = {**(headers or {}), 'ETag': etag, 'Cache-Control': 'no-cache'}
+    return {'statusCode': 200, 'headers': headers, 'body': payload}
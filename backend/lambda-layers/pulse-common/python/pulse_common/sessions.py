@@ -0,0 +1,119 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from pulse_common.cache import LRUCache
+from pulse_common.runtime import get_header, json_response
+
+# Session tokens: "v1.<payload>.<signature>", both parts base64url without
+# padding. The payload is {"sub": userId, "iat": issued, "exp": expires};
+# the signature is HMAC-SHA256 over "v1.<payload>". login-user issues them,
+# other handlers verify with one HMAC, no DynamoDB read and no bcrypt.
+#
+# SESSION_SECRETS is a comma-separated list: the first secret signs, all of
+# them verify, so a secret can be rotated without logging everyone out.
+
+TOKEN_VERSION = 'v1'
+SESSION_TTL_SECONDS = int(os.environ.get('SESSION_TTL_SECONDS', 12 * 3600))
+VERIFY_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 4096))
+VERIFY_CACHE_TTL = 300  # seconds; expiry is still checked on every hit
+REQUIRE_SESSION = os.environ.get('REQUIRE_SESSION', 'false').lower() in ('1', 'true', 'yes')
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _secrets():
+    return [s.encode('utf-8') for s in os.environ.get('SESSION_SECRETS', '').split(',') if s]
+
+
+def signing_enabled():
+    return bool(_secrets())
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(secret, signed_part):
+    return hmac.new(secret, signed_part.encode('ascii'), hashlib.sha256).digest()
+
+
+def issue_token(user_id, ttl=SESSION_TTL_SECONDS, now=None):
+    """Signed session token for user_id. Returns (token, expiresAt epoch seconds)."""
+    secrets = _secrets()
+    if not secrets:
+        raise RuntimeError('SESSION_SECRETS is not configured')
+    issued = int(now if now is not None else time.time())
+    payload = _b64encode(json.dumps({'sub': user_id, 'iat': issued, 'exp': issued + ttl}, separators=(',', ':')).encode('utf-8'))
+    signed_part = f'{TOKEN_VERSION}.{payload}'
+    return f'{signed_part}.{_b64encode(_sign(secrets[0], signed_part))}', issued + ttl
+
+
+# token -> (userId, expiresAt); survives warm invocations, so a client
+# polling every few seconds is verified once per container
+_verified = LRUCache(maxsize=VERIFY_CACHE_SIZE, ttl=VERIFY_CACHE_TTL)
+
+
+def verify_token(token, now=None):
+    """The token's userId. Raises InvalidToken if it is malformed, forged or expired."""
+    now = now if now is not None else time.time()
+    cached = _verified.get(token)
+    if cached is None:
+        try:
+            version, payload, signature = token.split('.')
+        except (AttributeError, ValueError):
+            raise InvalidToken('Malformed token')
+        if version != TOKEN_VERSION:
+            raise InvalidToken('Unsupported token version')
+        signed_part = f'{version}.{payload}'
+        try:
+            given = _b64decode(signature)
+            claims = json.loads(_b64decode(payload))
+            cached = (claims['sub'], claims['exp'])
+        except (ValueError, KeyError, TypeError):
+            raise InvalidToken('Malformed token')
+        if not any(hmac.compare_digest(_sign(secret, signed_part), given) for secret in _secrets()):
+            raise InvalidToken('Bad signature')
+        _verified.put(token, cached)
+    user_id, expires_at = cached
+    if expires_at <= now:
+        raise InvalidToken('Token expired')
+    return user_id
+
+
+def bearer_token(event):
+    """Token from the Authorization: Bearer header (any header case), or None."""
+    value = get_header(event, 'Authorization')
+    if value and value.lower().startswith('bearer '):
+        return value[7:].strip()
+    return None
+
+
+def authorize(event, user_id=None, headers=None):
+    """
+    None if the request may proceed, else the error response to return.
+
+    A bearer token, when present, must be valid and, if user_id is given,
+    issued to that user. Requests without one are only refused when
+    REQUIRE_SESSION is on, so existing clients keep working during rollout.
+    """
+    token = bearer_token(event)
+    if token is None:
+        if REQUIRE_SESSION:
+            return json_response(401, {'error': 'Missing session token'}, headers=headers)
+        return None
+    try:
+        subject = verify_token(token)
+    except InvalidToken as e:
+        return json_response(401, {'error': f'Invalid session: {e}'}, headers=headers)
+    if user_id is not None and subject != user_id:
+        return json_response(403, {'error': 'Session does not belong to this user'}, headers=headers)
+    return None
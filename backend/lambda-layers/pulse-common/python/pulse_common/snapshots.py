@@ -0,0 +1,94 @@
+import hashlib
+import os
+import time
+from pulse_common.cache import LRUCache
+from pulse_common.concurrency import map_concurrently
+from pulse_common.friends import edge_key, get_accepted_friend_ids, ACCEPTED
+
+# Group snapshot versions. get-group-snapshot answers an unchanged re-poll
+# from its one FriendGraph query, without reading any member's status: each
+# accepted edge in the user's partition carries the friend's `statusMark`
+# (the stamp of their latest marked status write), and a MARK_EDGE item
+# carries the user's own. The ingest paths mark a friend's group after a
+# status write, at most once per MARK_SECONDS, and at once when something a
+# friend must see changed (an SOS, a fall). The ETag also rolls over every
+# MARK_SECONDS, so a write that fell between marks (and a member who went
+# quiet after it) shows up in a re-poll within MARK_SECONDS too. An unchanged
+# group costs one query per poll, and one full read per MARK_SECONDS.
+
+MARK_FIELD = 'statusMark'
+MARK_EDGE = f'{ACCEPTED}!self'  # sorts with the accepted edges, so one begins_with query returns both
+MARK_SECONDS = float(os.environ.get('SNAPSHOT_MARK_SECONDS', 60))
+CACHE_SIZE = int(os.environ.get('SNAPSHOT_MARK_CACHE_SIZE', 4096))
+
+
+def load_marks(graph_table, user_id):
+    """([user_id, accepted friend ids...], {member: mark or None}) from one paginated query."""
+    kwargs = {
+        'KeyConditionExpression': 'userId = :uid AND begins_with(edge, :prefix)',
+        'ExpressionAttributeValues': {':uid': user_id, ':prefix': ACCEPTED},
+        'ProjectionExpression': 'edge, friendId, #m',
+        'ExpressionAttributeNames': {'#m': MARK_FIELD}
+    }
+    member_ids, marks = [user_id], {user_id: None}
+    while True:
+        response = graph_table.query(**kwargs)
+        for item in response.get('Items', []):
+            if item['edge'] == MARK_EDGE:
+                marks[user_id] = item.get(MARK_FIELD)
+            elif item['edge'].startswith(f'{ACCEPTED}#') and item['friendId'] not in marks:
+                member_ids.append(item['friendId'])
+                marks[item['friendId']] = item.get(MARK_FIELD)
+        if 'LastEvaluatedKey' not in response:
+            return member_ids, marks
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def group_etag(member_ids, marks, now=None):
+    """Strong ETag for a group snapshot: changes with membership, every member's mark and every MARK_SECONDS."""
+    period = int((time.time() if now is None else now) // MARK_SECONDS)
+    version = '\n'.join([str(period)] + [f"{member}={marks.get(member) or ''}" for member in member_ids])
+    return '"' + hashlib.sha256(version.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+class GroupMarker:
+    """
+    Marks a friend's status writes on the FriendGraph items their friends'
+    snapshots read. Each container remembers when it last marked a friend
+    (a warm cache), so routine writes within MARK_SECONDS cost nothing.
+    """
+
+    def __init__(self, graph_table, interval=MARK_SECONDS):
+        self.graph = graph_table
+        self.marked = LRUCache(maxsize=CACHE_SIZE, ttl=interval)
+
+    def due(self, friend_id, urgent=False):
+        return urgent or self.marked.get(friend_id) is None
+
+    def mark(self, friend_id, stamp, urgent=False):
+        """Stamp friend_id's own mark and their edge in every friend's partition, if due. Returns True if marked."""
+        if not self.due(friend_id, urgent):
+            return False
+        keys = [{'userId': friend_id, 'edge': MARK_EDGE}] + [
+            edge_key(other, ACCEPTED, friend_id) for other in get_accepted_friend_ids(self.graph, friend_id)
+        ]
+
+        def put_mark(key):
+            # Never resurrect a removed edge, and never move a mark backwards
+            condition = 'attribute_not_exists(#m) OR #m < :m'
+            if key['edge'] != MARK_EDGE:
+                condition = f'attribute_exists(userId) AND ({condition})'
+            try:
+                self.graph.update_item(
+                    Key=key,
+                    UpdateExpression='SET #m = :m',
+                    ConditionExpression=condition,
+                    ExpressionAttributeNames={'#m': MARK_FIELD},
+                    ExpressionAttributeValues={':m': stamp}
+                )
+            except self.graph.meta.client.exceptions.ConditionalCheckFailedException:
+                pass
+
+        map_concurrently(put_mark, keys)
+        self.marked.put(friend_id, stamp)
+        return True
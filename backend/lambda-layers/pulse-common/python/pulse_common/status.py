@@ -0,0 +1,93 @@
+from pulse_common.dynamo import batch_get_items
+
+# FriendCurrentStatus holds one write-through record per friend. Each ingest
+# path owns a group of fields and stamps it with its own timestamp field,
+# so a location ping never clobbers vitals and vice versa.
+LOCATION_STAMP = 'locationAt'  # process-friend-data: latitude, longitude, distance, sos
+VITALS_STAMP = 'vitalsAt'      # process-wearable-data: heartRate, stressLevel, fallDetected
+
+
+def append_clauses(append, names, values):
+    """SET clauses appending `append` ({list field: items}) to list fields, filling in names and values."""
+    clauses = []
+    for i, (field, items) in enumerate((append or {}).items()):
+        names[f'#a{i}'] = field
+        values[f':a{i}'] = list(items)
+        values[':empty'] = []
+        clauses.append(f'#a{i} = list_append(if_not_exists(#a{i}, :empty), :a{i})')
+    return clauses
+
+
+def update_current_status(table, friend_id, fields, stamp_field, stamp, return_old=False, append=None, expect=None):
+    """
+    Write one ingest path's fields into the friend's current-status record.
+
+    Only the given fields are SET, and only if stamp is not older than the
+    stamp already stored for this field group, so late or retried writes
+    cannot roll the record back. Returns False if the write was stale.
+
+    With return_old, returns the previous values of the written fields
+    instead ({} for a new record, None if stale), for callers that act on
+    what changed without a separate read. `append` maps list fields to
+    values appended to them in the same write. `expect` maps fields to the
+    value they must still hold (None: must not exist yet), for optimistic
+    read-modify-write of fields such as the ingest dedup windows.
+    """
+    names = {'#ts': stamp_field}
+    values = {':ts': stamp}
+    assignments = ['#ts = :ts']
+    for i, (field, value) in enumerate(fields.items()):
+        names[f'#f{i}'] = field
+        values[f':v{i}'] = value
+        assignments.append(f'#f{i} = :v{i}')
+    assignments += append_clauses(append, names, values)
+    condition = 'attribute_not_exists(#ts) OR #ts <= :ts'
+    checks = []
+    for i, (field, value) in enumerate((expect or {}).items()):
+        names[f'#e{i}'] = field
+        if value is None:
+            checks.append(f'attribute_not_exists(#e{i})')
+        else:
+            values[f':e{i}'] = value
+            checks.append(f'#e{i} = :e{i}')
+    if checks:
+        condition = f"({condition}) AND " + ' AND '.join(checks)
+    try:
+        response = table.update_item(
+            Key={'friendId': friend_id},
+            UpdateExpression='SET ' + ', '.join(assignments),
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues='UPDATED_OLD' if return_old else 'NONE'
+        )
+        return response.get('Attributes', {}) if return_old else True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return None if return_old else False
+
+
+def get_latest_locations(dynamodb, table_name, friend_ids):
+    """Latest (lat, lon) per friend from FriendCurrentStatus in one batched read; friends without a fix are omitted."""
+    items = batch_get_items(
+        dynamodb, table_name,
+        [{'friendId': fid} for fid in dict.fromkeys(friend_ids)],
+        projection='friendId, latitude, longitude'
+    )
+    return {
+        item['friendId']: (float(item['latitude']), float(item['longitude']))
+        for item in items
+        if item.get('latitude') is not None and item.get('longitude') is not None
+    }
+
+
+def get_current_statuses(dynamodb, table_name, friend_ids, fields):
+    """
+    friendId -> current-status record (only `fields`) for many friends in one
+    batched read. Friends without a record are omitted.
+    """
+    items = batch_get_items(
+        dynamodb, table_name,
+        [{'friendId': fid} for fid in dict.fromkeys(friend_ids)],
+        projection=', '.join(('friendId',) + tuple(f for f in fields if f != 'friendId'))
+    )
+    return {item['friendId']: item for item in items}
@@ -0,0 +1,189 @@
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-invocation instrumentation. Handlers are wrapped with @instrument;
+# during an invocation every AWS call made through pulse_common.runtime is
+# timed as a span (e.g. "dynamodb.get_item"), and code can add counters
+# with count(). When the handler returns, one CloudWatch Embedded Metric
+# Format (EMF) line is printed, which CloudWatch turns into metrics without
+# any PutMetricData calls. PULSE_TELEMETRY=off turns all of it into no-ops.
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'PULSE')
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+_enabled = os.environ.get('PULSE_TELEMETRY', 'on').lower() not in ('off', '0', 'false')
+_level = LEVELS.get(os.environ.get('LOG_LEVEL', 'INFO').upper(), LEVELS['INFO'])
+_event_sample_rate = float(os.environ.get('LOG_EVENT_SAMPLE_RATE', 0))
+
+# The invocation being handled. A context variable, so concurrent requests in one process
+# (server mode) each get their own; gather() copies it into pool threads.
+_current = contextvars.ContextVar('pulse_invocation', default=None)
+
+
+def configure(enabled=None, level=None, event_sample_rate=None):
+    """Override the environment settings (benchmarks and local runs). Clients built earlier keep their wrapping."""
+    global _enabled, _level, _event_sample_rate
+    if enabled is not None:
+        _enabled = enabled
+    if level is not None:
+        _level = LEVELS[level.upper()]
+    if event_sample_rate is not None:
+        _event_sample_rate = event_sample_rate
+
+
+def is_enabled():
+    return _enabled
+
+
+def log(level, *args):
+    """print() gated by LOG_LEVEL."""
+    if LEVELS[level] >= _level:
+        print(*args)
+
+
+def debug(*args):
+    log('DEBUG', *args)
+
+
+def log_event(event, label='Received event:'):
+    """Dump the incoming event only at DEBUG level, or for a LOG_EVENT_SAMPLE_RATE fraction of invocations."""
+    if _level <= LEVELS['DEBUG'] or (_event_sample_rate and random.random() < _event_sample_rate):
+        print(label, json.dumps(event, default=str))
+
+
+class Invocation:
+    """Spans and counters collected during one handler invocation."""
+
+    def __init__(self, function):
+        self.function = function
+        self.started = time.perf_counter()
+        self.spans = {}  # name -> [calls, total ms]
+        self.counters = {}
+        self.properties = {}
+        self.lock = threading.Lock()
+
+    def add_span(self, name, elapsed_ms):
+        with self.lock:
+            span = self.spans.setdefault(name, [0, 0.0])
+            span[0] += 1
+            span[1] += elapsed_ms
+
+    def count(self, name, value):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_emf(self):
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        metrics = [{'Name': 'Duration', 'Unit': 'Milliseconds'}]
+        record = {'Function': self.function, 'Duration': round(duration_ms, 3)}
+        for name, (calls, total_ms) in sorted(self.spans.items()):
+            metrics += [{'Name': f'{name}.time', 'Unit': 'Milliseconds'}, {'Name': f'{name}.calls', 'Unit': 'Count'}]
+            record[f'{name}.time'] = round(total_ms, 3)
+            record[f'{name}.calls'] = calls
+        for name, value in sorted(self.counters.items()):
+            metrics.append({'Name': name, 'Unit': 'Count'})
+            record[name] = value
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{'Namespace': NAMESPACE, 'Dimensions': [['Function']], 'Metrics': metrics}]
+            },
+            **record,
+            **self.properties
+        }
+
+
+def instrument(function):
+    """Decorator for lambda_handler: collect spans/counters for the invocation and emit them as one EMF line."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if not _enabled:
+                return handler(event, context)
+            invocation = Invocation(function)
+            token = _current.set(invocation)
+            try:
+                response = handler(event, context)
+            except Exception:
+                invocation.count('Errors', 1)
+                print(json.dumps(invocation.to_emf(), default=str))
+                raise
+            finally:
+                _current.reset(token)
+            status = response.get('statusCode') if isinstance(response, dict) else None
+            if status is not None:
+                invocation.properties['statusCode'] = status
+                if status >= 500:
+                    invocation.count('Errors', 1)
+            print(json.dumps(invocation.to_emf(), default=str))
+            return response
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    """Add to a per-invocation counter (emitted as a Count metric)."""
+    invocation = _current.get()
+    if invocation is not None:
+        invocation.count(name, value)
+
+
+def set_property(name, value):
+    """Attach a searchable, non-metric field to this invocation's EMF line."""
+    invocation = _current.get()
+    if invocation is not None:
+        invocation.properties[name] = value
+
+
+@contextmanager
+def span(name):
+    """Time a block; repeated spans of the same name are summed."""
+    invocation = _current.get()
+    if invocation is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        invocation.add_span(name, (time.perf_counter() - started) * 1000)
+
+
+class _Traced:
+    """Wraps a boto3 client/resource/table so each API call is a span named "<service>.<method>"."""
+
+    def __init__(self, target, service):
+        self._target = target
+        self._service = service
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name in ('meta', 'client'):
+            return _Traced(value, self._service)  # dynamodb.meta.client.transact_write_items
+        if name == 'Table':
+            return lambda *args, **kwargs: _Traced(value(*args, **kwargs), self._service)
+        if not callable(value) or name.startswith('_') or isinstance(value, type):
+            return value
+        span_name = f'{self._service}.{name}'
+
+        def traced(*args, **kwargs):
+            invocation = _current.get()
+            if invocation is None:
+                return value(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return value(*args, **kwargs)
+            finally:
+                invocation.add_span(span_name, (time.perf_counter() - started) * 1000)
+        return traced
+
+
+def traced(target, service):
+    """Instrumented view of an AWS client/resource; the target itself when telemetry is off."""
+    return _Traced(target, service) if _enabled else target
@@ -0,0 +1,238 @@
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from pulse_common.concurrency import gather
+from pulse_common.geo import EARTH_RADIUS_M
+
+# GPS trails. Instead of one history item per ping, each ping appends a
+# compact "epoch,lat,lon" entry (coordinates in 1e-5 degree units, ~1.1 m)
+# to a `trailBuffer` list on the friend's FriendCurrentStatus record, in the
+# same update_item that writes their location. When the buffer is full it is
+# sealed: simplified with a time-aware Douglas-Peucker pass and written as
+# one delta-encoded chunk item to the LocationTrails table
+# (friendId, chunkStart). A night out becomes a few dozen chunk items.
+
+BUFFER_FIELD = 'trailBuffer'
+SCALE = 100000  # coordinates are stored as integers of 1e-5 degrees
+
+CHUNK_POINTS = int(os.environ.get('TRAIL_CHUNK_POINTS', 16))
+CHUNK_SECONDS = int(os.environ.get('TRAIL_CHUNK_SECONDS', 600))  # a chunk never spans more than this
+TOLERANCE_M = float(os.environ.get('TRAIL_TOLERANCE_METERS', 5))
+RETENTION = timedelta(days=float(os.environ.get('TRAIL_RETENTION_DAYS', 30)))
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def to_epoch(ts):
+    """ISO timestamp (naive means UTC) -> epoch seconds."""
+    parsed = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+    return int((parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp())
+
+
+def to_iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def buffer_entry(ts, latitude, longitude):
+    """Buffer entry for one ping: "epoch,lat,lon" with coordinates as 1e-5 degree integers."""
+    return f"{to_epoch(ts)},{round(float(latitude) * SCALE)},{round(float(longitude) * SCALE)}"
+
+
+def parse_entry(entry):
+    epoch, lat, lon = entry.split(',')
+    return int(epoch), int(lat), int(lon)
+
+
+def split_for_sealing(buffer):
+    """
+    (points to seal, entries to keep buffering) for a buffer that just had
+    an entry appended, or (None, buffer) if it is not due yet.
+
+    Entries are appended in arrival order, and late pings land out of
+    order, so the buffer is sorted by time first. It is sealed once it
+    holds CHUNK_POINTS entries. If it spans CHUNK_SECONDS or more (the
+    friend went quiet, or a late ping arrived), the entries within
+    CHUNK_SECONDS of the oldest are sealed on their own, so no chunk spans
+    more than CHUNK_SECONDS and range queries know how far back to look.
+    """
+    entries = sorted(buffer, key=lambda entry: parse_entry(entry)[0])
+    points = [parse_entry(entry) for entry in entries]
+    if points and points[-1][0] - points[0][0] >= CHUNK_SECONDS:
+        cut = next(i for i, point in enumerate(points) if point[0] - points[0][0] >= CHUNK_SECONDS)
+        return points[:cut], entries[cut:]
+    if len(points) >= CHUNK_POINTS:
+        return points, []
+    return None, buffer
+
+
+def simplify(points, tolerance_m=TOLERANCE_M):
+    """
+    Time-aware Douglas-Peucker over (epoch, lat, lon) points.
+
+    The error of a dropped point is its distance from where the simplified
+    trail puts the friend at that moment (linear interpolation in time
+    between the kept neighbours), so both the path and the pace are kept
+    within tolerance_m. Endpoints are always kept.
+    """
+    if len(points) < 3:
+        return list(points)
+    cos_ref = math.cos(math.radians(points[0][1] / SCALE))
+    meters = math.radians(1 / SCALE) * EARTH_RADIUS_M
+    xy = [(lon * meters * cos_ref, lat * meters) for _, lat, lon in points]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        t0, t1 = points[first][0], points[last][0]
+        (x0, y0), (x1, y1) = xy[first], xy[last]
+        worst, worst_error = None, tolerance_m
+        for i in range(first + 1, last):
+            ratio = (points[i][0] - t0) / (t1 - t0) if t1 != t0 else 0.0
+            error = math.hypot(xy[i][0] - (x0 + ratio * (x1 - x0)), xy[i][1] - (y0 + ratio * (y1 - y0)))
+            if error > worst_error:
+                worst, worst_error = i, error
+        if worst is not None:
+            keep[worst] = True
+            stack += [(first, worst), (worst, last)]
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def _encode_int(value, out):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode(points, start_epoch):
+    """
+    Delta-encode (epoch, lat, lon) points as printable ASCII (the polyline
+    algorithm's zig-zag varints): seconds since start_epoch, then per-point
+    differences, so a step of a few meters costs a few characters.
+    """
+    out = []
+    previous = (start_epoch, 0, 0)
+    for point in points:
+        for value, before in zip(point, previous):
+            _encode_int(value - before, out)
+        previous = point
+    return ''.join(out)
+
+
+def decode(text, start_epoch):
+    values = []
+    value = shift = 0
+    for char in text:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    points = []
+    current = [start_epoch, 0, 0]
+    for i in range(0, len(values) - 2, 3):
+        current = [current[0] + values[i], current[1] + values[i + 1], current[2] + values[i + 2]]
+        points.append(tuple(current))
+    return points
+
+
+def chunk_item(friend_id, points, tolerance_m=TOLERANCE_M):
+    """LocationTrails item for a sealed buffer (keyed by its first point, so re-sealing overwrites)."""
+    kept = simplify(points, tolerance_m)
+    start = points[0][0]
+    return {
+        'friendId': friend_id,
+        'chunkStart': to_iso(start),
+        'chunkEnd': to_iso(points[-1][0]),
+        'path': encode(kept, start),
+        'pingCount': len(points),
+        'pointCount': len(kept),
+        'toleranceMeters': int(tolerance_m),
+        'expiresAt': int(points[-1][0] + RETENTION.total_seconds())
+    }
+
+
+def seal_buffer(trails_table, status_table, friend_id, buffer):
+    """
+    Seal the buffer if it is due: write the chunk, then swap the buffer for
+    what is left, provided nobody appended meanwhile (otherwise the next
+    ping re-seals a superset under the same chunk key). A chunk is only
+    replaced by one covering at least as many pings, so a late resend of a
+    sealed chunk's first ping cannot overwrite it. Returns the chunk item
+    written, or None.
+    """
+    points, rest = split_for_sealing(buffer)
+    if points is None:
+        return None
+    item = chunk_item(friend_id, points)
+    try:
+        trails_table.put_item(
+            Item=item,
+            ConditionExpression='attribute_not_exists(chunkStart) OR pingCount <= :n',
+            ExpressionAttributeValues={':n': item['pingCount']}
+        )
+    except trails_table.meta.client.exceptions.ConditionalCheckFailedException:
+        item = None
+    try:
+        status_table.update_item(
+            Key={'friendId': friend_id},
+            UpdateExpression='SET #b = :rest',
+            ConditionExpression='size(#b) = :n',
+            ExpressionAttributeNames={'#b': BUFFER_FIELD},
+            ExpressionAttributeValues={':rest': rest, ':n': len(buffer)}
+        )
+    except status_table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+    return item
+
+
+def _as_points(points, start, end):
+    return [
+        {'timestamp': to_iso(epoch), 'latitude': lat / SCALE, 'longitude': lon / SCALE}
+        for epoch, lat, lon in points
+        if start <= epoch <= end
+    ]
+
+
+def query_trail(trails_table, status_table, friend_id, start, end):
+    """
+    A friend's trail between two epoch times, oldest first: one query for
+    the sealed chunks that can overlap the range, plus the still-open buffer
+    from FriendCurrentStatus.
+    """
+    kwargs = {
+        'KeyConditionExpression': 'friendId = :fid AND chunkStart BETWEEN :start AND :end',
+        'ProjectionExpression': 'chunkStart, #p',
+        'ExpressionAttributeNames': {'#p': 'path'},
+        'ExpressionAttributeValues': {
+            ':fid': friend_id,
+            ':start': to_iso(start - CHUNK_SECONDS),
+            ':end': to_iso(end)
+        }
+    }
+
+    def sealed():
+        points = []
+        while True:
+            response = trails_table.query(**kwargs)
+            for item in response.get('Items', []):
+                points += decode(item['path'], to_epoch(item['chunkStart']))
+            if 'LastEvaluatedKey' not in response:
+                return points
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def buffered():
+        record = status_table.get_item(
+            Key={'friendId': friend_id},
+            ProjectionExpression='#b',
+            ExpressionAttributeNames={'#b': BUFFER_FIELD}
+        ).get('Item') or {}
+        return [parse_entry(entry) for entry in record.get(BUFFER_FIELD, [])]
+
+    # Chunks of a buffer whose trim lost a race are still buffered too; the set drops the duplicates
+    chunk_points, buffer_points = gather(sealed, buffered)
+    return _as_points(sorted(set(chunk_points + buffer_points)), start, end)
@@ -0,0 +1,63 @@
+"""
+One-off migration: build the UserEmails login records for users created
+before create-user started writing them.
+
+Scans the Users table (following LastEvaluatedKey) and writes one
+{email, userId, password} item per user with a conditional put, so
+re-running is safe. Emails shared by several legacy accounts are
+reported and left for manual review; the first account keeps the email.
+
+Usage:
+    USERS_TABLE_NAME=Users EMAILS_TABLE_NAME=UserEmails python backfill_user_emails.py [--dry-run]
+"""
+import os
+import sys
+import boto3
+
+USERS_TABLE_NAME = os.environ.get('USERS_TABLE_NAME', 'Users')
+EMAILS_TABLE_NAME = os.environ.get('EMAILS_TABLE_NAME', 'UserEmails')
+
+
+def scan_users(users_table):
+    kwargs = {'ProjectionExpression': 'userId, email, password'}
+    while True:
+        response = users_table.scan(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def main(dry_run=False):
+    dynamodb = boto3.resource('dynamodb')
+    users_table = dynamodb.Table(USERS_TABLE_NAME)
+    emails_table = dynamodb.Table(EMAILS_TABLE_NAME)
+    conditional_failed = dynamodb.meta.client.exceptions.ConditionalCheckFailedException
+
+    written = skipped = 0
+    conflicts = []
+    for user in scan_users(users_table):
+        if not user.get('email') or not user.get('password'):
+            skipped += 1
+            continue
+        email_key = user['email'].strip().lower()
+        if dry_run:
+            written += 1
+            continue
+        try:
+            emails_table.put_item(
+                Item={'email': email_key, 'userId': user['userId'], 'password': user['password']},
+                ConditionExpression='attribute_not_exists(email) OR userId = :uid',
+                ExpressionAttributeValues={':uid': user['userId']}
+            )
+            written += 1
+        except conditional_failed:
+            conflicts.append((email_key, user['userId']))
+
+    print(f"Written: {written}, skipped (no email/password): {skipped}, conflicts: {len(conflicts)}")
+    for email_key, user_id in conflicts:
+        print(f"  ⚠️ {email_key} already belongs to another user, {user_id} not mapped")
+
+
+if __name__ == '__main__':
+    main(dry_run='--dry-run' in sys.argv)
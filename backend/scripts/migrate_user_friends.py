@@ -0,0 +1,81 @@
+"""
+One-off migration: copy UserFriends rows into the FriendGraph adjacency list.
+
+Each accepted row becomes an accepted edge in both users' partitions.
+Each pending row becomes an outgoing edge for the sender and an incoming
+edge for the recipient, unless the pair is already accepted. Puts are
+idempotent, so the script can be re-run; the old table is left untouched
+until you delete it.
+
+Usage (needs the pulse-common layer on PYTHONPATH):
+    PYTHONPATH=../lambda-layers/pulse-common/python \
+    FRIENDS_TABLE_NAME=UserFriends FRIEND_GRAPH_TABLE_NAME=FriendGraph \
+    python migrate_user_friends.py [--dry-run]
+"""
+import os
+import sys
+import boto3
+from pulse_common.dynamo import batch_write_items
+from pulse_common.friends import edge_key, ACCEPTED, INCOMING, OUTGOING
+
+FRIENDS_TABLE_NAME = os.environ.get('FRIENDS_TABLE_NAME', 'UserFriends')
+FRIEND_GRAPH_TABLE_NAME = os.environ.get('FRIEND_GRAPH_TABLE_NAME', 'FriendGraph')
+
+
+def scan_rows(table):
+    kwargs = {}
+    while True:
+        response = table.scan(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def edge(user_id, kind, friend_id, status, added_at):
+    return {**edge_key(user_id, kind, friend_id), 'friendId': friend_id, 'status': status, 'addedAt': added_at}
+
+
+def build_edges(rows):
+    accepted = set()
+    pending = []
+    added = {}
+    for row in rows:
+        a, b = row['userId'], row['friendId']
+        if a == b:
+            continue
+        added[(a, b)] = row.get('addedAt') or added.get((a, b))
+        if row.get('status') == 'accepted':
+            accepted.add(frozenset((a, b)))
+        else:
+            pending.append((a, b))
+
+    # Keyed by primary key so a batch never holds the same item twice
+    edges = {}
+    for pair in accepted:
+        a, b = sorted(pair)
+        added_at = added.get((a, b)) or added.get((b, a))
+        for user_id, friend_id in ((a, b), (b, a)):
+            item = edge(user_id, ACCEPTED, friend_id, 'accepted', added_at)
+            edges[(item['userId'], item['edge'])] = item
+    for sender, recipient in pending:
+        if frozenset((sender, recipient)) in accepted:
+            continue
+        for item in (edge(sender, OUTGOING, recipient, 'pending', added[(sender, recipient)]),
+                     edge(recipient, INCOMING, sender, 'pending', added[(sender, recipient)])):
+            edges[(item['userId'], item['edge'])] = item
+    return list(edges.values()), len(accepted), len(pending)
+
+
+def main(dry_run=False):
+    dynamodb = boto3.resource('dynamodb')
+    rows = list(scan_rows(dynamodb.Table(FRIENDS_TABLE_NAME)))
+    edges, accepted, pending = build_edges(rows)
+    print(f"{len(rows)} UserFriends rows -> {accepted} friendships, {pending} pending requests, {len(edges)} FriendGraph edges")
+    if not dry_run:
+        batch_write_items(dynamodb, FRIEND_GRAPH_TABLE_NAME, edges)
+        print("✅ Migration written.")
+
+
+if __name__ == '__main__':
+    main(dry_run='--dry-run' in sys.argv)
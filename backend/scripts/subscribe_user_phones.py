@@ -0,0 +1,61 @@
+"""
+One-off migration: subscribe existing users' phones to the PULSE alerts
+topic, for users created before create-user started subscribing them.
+
+Scans the Users table (following LastEvaluatedKey) and creates one SMS
+subscription per user through pulse_common.notifications.subscribe_phone,
+the same call create-user makes, with the filter policy
+{"recipients": [userId]}. SNS returns the existing subscription for an
+identical request, so re-running is safe.
+
+Usage (needs the pulse-common layer on PYTHONPATH):
+    PYTHONPATH=../lambda-layers/pulse-common/python \
+    USERS_TABLE_NAME=Users SNS_TOPIC_ARN=arn:aws:sns:... python subscribe_user_phones.py [--dry-run]
+"""
+import os
+import sys
+import boto3
+from pulse_common.notifications import subscribe_phone
+
+USERS_TABLE_NAME = os.environ.get('USERS_TABLE_NAME', 'Users')
+SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
+
+
+def scan_users(users_table):
+    kwargs = {'ProjectionExpression': 'userId, phone'}
+    while True:
+        response = users_table.scan(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def main(dry_run=False):
+    if not SNS_TOPIC_ARN:
+        sys.exit('SNS_TOPIC_ARN is required')
+    users_table = boto3.resource('dynamodb').Table(USERS_TABLE_NAME)
+    sns = boto3.client('sns')
+
+    subscribed = skipped = 0
+    failures = []
+    for user in scan_users(users_table):
+        if not user.get('phone'):
+            skipped += 1
+            continue
+        if dry_run:
+            subscribed += 1
+            continue
+        try:
+            subscribe_phone(sns, SNS_TOPIC_ARN, user['userId'], user['phone'])
+            subscribed += 1
+        except Exception as e:
+            failures.append((user['userId'], str(e)))
+
+    print(f"Subscribed: {subscribed}, skipped (no phone): {skipped}, failed: {len(failures)}")
+    for user_id, error in failures:
+        print(f"  ⚠️ {user_id}: {error}")
+
+
+if __name__ == '__main__':
+    main(dry_run='--dry-run' in sys.argv)
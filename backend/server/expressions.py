@@ -0,0 +1,263 @@
+"""
+Evaluator for the DynamoDB expression language, as used by the in-memory
+tables in localaws.py: condition / key-condition / filter expressions,
+update expressions and projection expressions, with #name and :value
+placeholders. Covers the subset PULSE uses plus the common operators
+around it; anything else raises ValueError so a gap is loud, not silent.
+"""
+import re
+from decimal import Decimal
+from functools import lru_cache
+
+_TOKEN = re.compile(r"\s*(<>|<=|>=|=|<|>|\(|\)|,|\+|-|:[A-Za-z0-9_]+|#[A-Za-z0-9_]+|[A-Za-z_][A-Za-z0-9_]*)")
+_MISSING = object()
+
+
+@lru_cache(maxsize=1024)
+def tokenize(expression):
+    """Tokens of an expression, as a tuple; cached, since callers reuse a handful of expression strings."""
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise ValueError(f"Cannot parse expression near: {expression[position:]!r}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tuple(tokens)
+
+
+class _Parser:
+    def __init__(self, expression, names, values):
+        self.tokens = tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+        self.equalities = {}
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token.upper() != expected):
+            raise ValueError(f"Expected {expected or 'a token'}, got {token!r}")
+        self.position += 1
+        return token
+
+    def done(self):
+        return self.position >= len(self.tokens)
+
+    def name(self, token):
+        if token.startswith('#'):
+            if token not in self.names:
+                raise ValueError(f"Undefined attribute name placeholder {token}")
+            return self.names[token]
+        return token
+
+    def value(self, token):
+        if token not in self.values:
+            raise ValueError(f"Undefined attribute value placeholder {token}")
+        return self.values[token]
+
+    # ---- operands ----
+
+    def operand(self):
+        token = self.take()
+        if token.startswith(':'):
+            constant = self.value(token)
+            return lambda item: constant
+        if token == 'size' and self.peek() == '(':
+            self.take('(')
+            path = self.name(self.take())
+            self.take(')')
+            return lambda item: Decimal(len(item[path])) if path in item else _MISSING
+        path = self.name(token)
+        return lambda item: item.get(path, _MISSING)
+
+    # ---- conditions ----
+
+    def condition(self):
+        left = self.conjunction()
+        while self.peek() and self.peek().upper() == 'OR':
+            self.take()
+            right = self.conjunction()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def conjunction(self):
+        left = self.negation()
+        while self.peek() and self.peek().upper() == 'AND':
+            self.take()
+            right = self.negation()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def negation(self):
+        if self.peek() and self.peek().upper() == 'NOT':
+            self.take()
+            inner = self.negation()
+            return lambda item: not inner(item)
+        return self.predicate()
+
+    def predicate(self):
+        token = self.peek()
+        if token == '(':
+            self.take('(')
+            inner = self.condition()
+            self.take(')')
+            return inner
+        if self.peek(1) == '(' and token != 'size':
+            return self.function()
+
+        left_token = token
+        left = self.operand()
+        operator = self.take()
+        if operator.upper() == 'BETWEEN':
+            low = self.operand()
+            self.take('AND')
+            high = self.operand()
+            return lambda item: _compare(left(item), '>=', low(item)) and _compare(left(item), '<=', high(item))
+        if operator.upper() == 'IN':
+            self.take('(')
+            options = [self.operand()]
+            while self.peek() == ',':
+                self.take(',')
+                options.append(self.operand())
+            self.take(')')
+            return lambda item: any(_compare(left(item), '=', option(item)) for option in options)
+        right_token = self.peek()
+        right = self.operand()
+        if operator == '=' and left_token[0] not in ':(' and left_token != 'size' and right_token.startswith(':'):
+            self.equalities[self.name(left_token)] = self.value(right_token)
+        return lambda item: _compare(left(item), operator, right(item))
+
+    def function(self):
+        function = self.take()
+        self.take('(')
+        path = self.name(self.take())
+        argument = None
+        if self.peek() == ',':
+            self.take(',')
+            argument = self.operand()
+        self.take(')')
+        if function == 'attribute_exists':
+            return lambda item: path in item
+        if function == 'attribute_not_exists':
+            return lambda item: path not in item
+        if function == 'begins_with':
+            return lambda item: isinstance(item.get(path), str) and item[path].startswith(argument(item))
+        if function == 'contains':
+            return lambda item: path in item and argument(item) in item[path]
+        if function == 'attribute_type':
+            raise ValueError("attribute_type() is not supported by the in-memory tables")
+        raise ValueError(f"Unknown function {function}()")
+
+
+def _compare(left, operator, right):
+    if left is _MISSING or right is _MISSING:
+        return operator == '<>' and (left is _MISSING) != (right is _MISSING)
+    try:
+        if operator == '=':
+            return left == right
+        if operator == '<>':
+            return left != right
+        if operator == '<':
+            return left < right
+        if operator == '<=':
+            return left <= right
+        if operator == '>':
+            return left > right
+        if operator == '>=':
+            return left >= right
+    except TypeError:
+        return False  # comparing different types is never true in DynamoDB
+    raise ValueError(f"Unknown comparator {operator}")
+
+
+class Condition:
+    """A compiled condition; `equals` maps attribute -> value for its `attr = :value` terms (key conditions use it to find the partition)."""
+
+    def __init__(self, expression, names=None, values=None):
+        parser = _Parser(expression, names, values)
+        self.test = parser.condition()
+        if not parser.done():
+            raise ValueError(f"Unexpected {parser.peek()!r} in {expression!r}")
+        self.equals = parser.equalities
+
+    def __call__(self, item):
+        return bool(self.test(item))
+
+
+def apply_update(item, expression, names=None, values=None):
+    """Apply an UpdateExpression (SET / REMOVE / ADD / DELETE clauses) to item in place."""
+    parser = _Parser(expression, names, values)
+    while not parser.done():
+        clause = parser.take().upper()
+        while True:
+            if clause == 'SET':
+                path = parser.name(parser.take())
+                parser.take('=')
+                item[path] = _set_value(parser)(item)
+            elif clause == 'REMOVE':
+                item.pop(parser.name(parser.take()), None)
+            elif clause == 'ADD':
+                path = parser.name(parser.take())
+                amount = parser.value(parser.take())
+                current = item.get(path)
+                if isinstance(amount, (set, frozenset)):
+                    item[path] = set(current or ()) | set(amount)
+                else:
+                    item[path] = Decimal(str(current or 0)) + Decimal(str(amount))
+            elif clause == 'DELETE':
+                path = parser.name(parser.take())
+                remaining = set(item.get(path) or ()) - set(parser.value(parser.take()))
+                if remaining:
+                    item[path] = remaining
+                else:
+                    item.pop(path, None)
+            else:
+                raise ValueError(f"Unknown update clause {clause}")
+            if parser.peek() != ',':
+                break
+            parser.take(',')
+    return item
+
+
+def _set_value(parser):
+    def term():
+        if parser.peek() == 'if_not_exists':
+            parser.take()
+            parser.take('(')
+            path = parser.name(parser.take())
+            parser.take(',')
+            fallback = parser.operand()
+            parser.take(')')
+            return lambda item: item[path] if path in item else fallback(item)
+        if parser.peek() == 'list_append':
+            parser.take()
+            parser.take('(')
+            first = term()
+            parser.take(',')
+            second = term()
+            parser.take(')')
+            return lambda item: list(first(item)) + list(second(item))
+        return parser.operand()
+
+    left = term()
+    if parser.peek() in ('+', '-'):
+        operator = parser.take()
+        right = term()
+        if operator == '+':
+            return lambda item: Decimal(str(left(item))) + Decimal(str(right(item)))
+        return lambda item: Decimal(str(left(item))) - Decimal(str(right(item)))
+    return left
+
+
+def project(item, expression, names=None):
+    if not expression:
+        return item
+    paths = [(names or {}).get(p.strip(), p.strip()) for p in expression.split(',')]
+    return {path: item[path] for path in paths if path in item}
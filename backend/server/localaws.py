@@ -0,0 +1,567 @@
+"""
+Local storage for the self-hosted server: in-process stand-ins for the
+DynamoDB resource/client and the SNS client, so the handlers run without
+AWS. save() / load() snapshot the tables to a JSON file, and on_message
+receives every SNS message instead of keeping them in memory.
+
+Install with pulse_common.runtime.use_backend(LocalAWS(...)) before the
+first request. Every API call is counted, consumed read/write capacity is
+estimated with DynamoDB's rounding rules (4 KB reads, 1 KB writes,
+eventually consistent reads at half cost, transactions at double cost),
+and an optional per-call latency is injected to model network round trips;
+the benchmarks (backend/benchmarks) measure the handlers with it.
+"""
+import base64
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+from expressions import Condition, apply_update, project
+from pulse_common.dynamo import deserialize_item, deserialize_value, serialize_item
+
+# PULSE tables: name -> (partition key, sort key, {index name: (partition key, sort key)})
+PULSE_TABLES = {
+    'Users': ('userId', None, {}),
+    'UserEmails': ('email', None, {}),
+    'UserPreferences': ('friendId', None, {}),
+    'FriendGraph': ('userId', 'edge', {}),
+    'FriendStatus': ('friendId', None, {}),
+    'WearableData': ('friendId', 'timestamp', {}),
+    'FriendCurrentStatus': ('friendId', None, {}),
+    'VitalsRollups': ('seriesId', 'bucket', {}),
+    'PendingEscalations': ('friendId', None, {'dueBucket-dueAt-index': ('dueBucket', 'dueAt')}),
+    'AlertIncidents': ('incidentId', None, {}),
+    'Geofences': ('zoneId', None, {}),
+    'LocationTrails': ('friendId', 'chunkStart', {}),
+}
+
+PUBLISH_BATCH_LIMIT = 10
+
+
+class ClientError(Exception):
+    def __init__(self, code, message, reasons=None):
+        super().__init__(f"An error occurred ({code}): {message}")
+        self.response = {'Error': {'Code': code, 'Message': message}}
+        if reasons is not None:
+            self.response['CancellationReasons'] = reasons
+
+
+class ConditionalCheckFailedException(ClientError):
+    pass
+
+
+class TransactionCanceledException(ClientError):
+    pass
+
+
+class ResourceNotFoundException(ClientError):
+    pass
+
+
+class ValidationException(ClientError):
+    pass
+
+
+class _Exceptions:
+    ClientError = ClientError
+    ConditionalCheckFailedException = ConditionalCheckFailedException
+    TransactionCanceledException = TransactionCanceledException
+    ResourceNotFoundException = ResourceNotFoundException
+    ValidationException = ValidationException
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    if isinstance(value, set):
+        return set(value)
+    return value
+
+
+def _normalize(value):
+    """What DynamoDB stores: every number comes back as Decimal."""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return {_normalize(v) for v in value}
+    return value
+
+
+def _size(value):
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        return len(str(value)) // 2 + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return 3 + sum(len(k) + _size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(1 + _size(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return sum(_size(v) for v in value)
+    return len(str(value))
+
+
+def item_size(item):
+    return sum(len(name.encode('utf-8')) + _size(value) for name, value in item.items()) if item else 0
+
+
+def _unmetered(item):
+    return 0
+
+
+def read_units(size, consistent=False):
+    return math.ceil(max(size, 1) / 4096) * (1.0 if consistent else 0.5)
+
+
+def write_units(size):
+    return math.ceil(max(size, 1) / 1024)
+
+
+class Metrics:
+    """Counters for one LocalAWS; the replay harness diffs snapshots around each invocation."""
+
+    def __init__(self):
+        self.dynamodb_requests = Counter()
+        self.read_units = 0.0
+        self.write_units = 0.0
+        self.sns_requests = Counter()
+        self.sns_messages = 0
+        self.sns_recipients = 0
+
+    def snapshot(self):
+        return {
+            'dynamodbRequests': sum(self.dynamodb_requests.values()),
+            'readUnits': self.read_units,
+            'writeUnits': self.write_units,
+            'snsRequests': sum(self.sns_requests.values()),
+            'snsMessages': self.sns_messages,
+            'snsRecipients': self.sns_recipients,
+        }
+
+
+class _TableState:
+    def __init__(self, name, partition_key, sort_key, indexes):
+        self.name = name
+        self.partition_key = partition_key
+        self.sort_key = sort_key
+        self.indexes = indexes
+        self.partitions = {}
+
+    def key_of(self, item):
+        try:
+            partition = item[self.partition_key]
+            sort = item[self.sort_key] if self.sort_key else None
+        except KeyError:
+            raise ValidationException('ValidationException', f"Missing key attribute for table {self.name}")
+        return partition, sort
+
+    def get(self, key):
+        partition, sort = self.key_of(key)
+        return self.partitions.get(partition, {}).get(sort)
+
+    def put(self, item):
+        partition, sort = self.key_of(item)
+        self.partitions.setdefault(partition, {})[sort] = item
+
+    def delete(self, key):
+        partition, sort = self.key_of(key)
+        return self.partitions.get(partition, {}).pop(sort, None)
+
+    def all_items(self):
+        for partition in self.partitions.values():
+            yield from partition.values()
+
+
+class LocalAWS:
+    """
+    Backend for pulse_common.runtime.use_backend: client('dynamodb' | 'sns')
+    and resource('dynamodb') return in-memory stand-ins sharing one state.
+    """
+
+    def __init__(self, tables=None, dynamodb_latency_ms=0.0, sns_latency_ms=0.0, jitter_ms=0.0, seed=0, on_message=None,
+                 metering=True):
+        self.lock = threading.RLock()
+        self.on_message = on_message  # called with each SNS message; if set, messages are not kept
+        # Without metering, items are not sized, so capacity units count one minimum unit per item touched
+        self.size = item_size if metering else _unmetered
+        self.metrics = Metrics()
+        self.tables = {name: _TableState(name, *spec) for name, spec in (tables or PULSE_TABLES).items()}
+        self.latency = {'dynamodb': dynamodb_latency_ms / 1000, 'sns': sns_latency_ms / 1000}
+        self.jitter = jitter_ms / 1000
+        self.random = random.Random(seed)
+        self.dynamodb_client = LocalDynamoClient(self)
+        self.dynamodb_resource = LocalDynamoResource(self)
+        self.sns = LocalSNS(self)
+
+    def client(self, service):
+        if service == 'dynamodb':
+            return self.dynamodb_client
+        if service == 'sns':
+            return self.sns
+        raise ValueError(f"No in-memory stand-in for {service}")
+
+    def resource(self, service):
+        if service == 'dynamodb':
+            return self.dynamodb_resource
+        raise ValueError(f"No in-memory stand-in for {service}")
+
+    def table_state(self, name):
+        if name not in self.tables:
+            raise ResourceNotFoundException('ResourceNotFoundException', f"Requested resource not found: Table: {name} not found")
+        return self.tables[name]
+
+    def request(self, service, operation):
+        """Count one API call and wait out the injected latency (outside the state lock)."""
+        delay = self.latency[service]
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        with self.lock:
+            if service == 'dynamodb':
+                self.metrics.dynamodb_requests[operation] += 1
+            else:
+                self.metrics.sns_requests[operation] += 1
+
+    def consume(self, read=0.0, write=0.0):
+        with self.lock:
+            self.metrics.read_units += read
+            self.metrics.write_units += write
+
+    def seed_items(self, table_name, items):
+        """Load items directly, without counting requests or capacity (test fixtures)."""
+        state = self.table_state(table_name)
+        with self.lock:
+            for item in items:
+                state.put(_normalize(_copy(item)))
+
+    def save(self, path):
+        """Write every table to path as DynamoDB-JSON, atomically (temp file + rename)."""
+        with self.lock:
+            snapshot = {name: [serialize_item(item) for item in state.all_items()] for name, state in self.tables.items()}
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'), default=_encode_bytes)
+        os.replace(temporary, path)
+        return sum(len(items) for items in snapshot.values())
+
+    def load(self, path):
+        """Replace the contents of the tables found in a save() snapshot."""
+        with open(path) as f:
+            snapshot = json.load(f, object_hook=_decode_bytes)
+        with self.lock:
+            for name, items in snapshot.items():
+                state = self.table_state(name)
+                state.partitions = {}
+                for item in items:
+                    state.put(deserialize_item(item))
+        return sum(len(items) for items in snapshot.values())
+
+
+def _encode_bytes(value):
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f"Cannot snapshot {type(value).__name__}")
+
+
+def _decode_bytes(value):
+    return base64.b64decode(value['__bytes__']) if set(value) == {'__bytes__'} else value
+
+
+def _check(condition, names, values, current):
+    if condition is None:
+        return True
+    if not isinstance(condition, str):
+        raise TypeError("The in-memory tables only accept string condition expressions")
+    return Condition(condition, names, values)(current or {})
+
+
+class _Meta:
+    def __init__(self, client):
+        self.client = client
+
+
+class LocalTable:
+    def __init__(self, aws, name):
+        self.aws = aws
+        self.name = name
+        self.meta = _Meta(aws.dynamodb_client)
+
+    @property
+    def state(self):
+        return self.aws.table_state(self.name)
+
+    def get_item(self, Key, ConsistentRead=False, ProjectionExpression=None, ExpressionAttributeNames=None, **_):
+        self.aws.request('dynamodb', 'GetItem')
+        with self.aws.lock:
+            item = self.state.get(Key)
+            self.aws.consume(read=read_units(self.aws.size(item), ConsistentRead))
+            if item is None:
+                return {}
+            return {'Item': _copy(project(item, ProjectionExpression, ExpressionAttributeNames))}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+                 ReturnValues='NONE', **_):
+        self.aws.request('dynamodb', 'PutItem')
+        item = _normalize(_copy(Item))
+        with self.aws.lock:
+            current = self.state.get(item)
+            self.aws.consume(write=write_units(max(self.aws.size(item), self.aws.size(current))))
+            if not _check(ConditionExpression, ExpressionAttributeNames, _normalize(ExpressionAttributeValues), current):
+                raise ConditionalCheckFailedException('ConditionalCheckFailedException', 'The conditional request failed')
+            self.state.put(item)
+            return {'Attributes': _copy(current)} if ReturnValues == 'ALL_OLD' and current else {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE', **_):
+        self.aws.request('dynamodb', 'UpdateItem')
+        values = _normalize(ExpressionAttributeValues)
+        with self.aws.lock:
+            current = self.state.get(Key)
+            if not _check(ConditionExpression, ExpressionAttributeNames, values, current):
+                self.aws.consume(write=write_units(self.aws.size(current)))
+                raise ConditionalCheckFailedException('ConditionalCheckFailedException', 'The conditional request failed')
+            updated = apply_update(_copy(current) if current else _normalize(_copy(Key)), UpdateExpression,
+                                   ExpressionAttributeNames, values)
+            updated = _normalize(updated)
+            self.aws.consume(write=write_units(max(self.aws.size(updated), self.aws.size(current))))
+            self.state.put(updated)
+            if ReturnValues in ('ALL_NEW', 'UPDATED_NEW'):
+                return {'Attributes': _copy(updated)}
+            if ReturnValues in ('ALL_OLD', 'UPDATED_OLD') and current:
+                return {'Attributes': _copy(current)}
+            return {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+                    ReturnValues='NONE', **_):
+        self.aws.request('dynamodb', 'DeleteItem')
+        with self.aws.lock:
+            current = self.state.get(Key)
+            self.aws.consume(write=write_units(self.aws.size(current)))
+            if not _check(ConditionExpression, ExpressionAttributeNames, _normalize(ExpressionAttributeValues), current):
+                raise ConditionalCheckFailedException('ConditionalCheckFailedException', 'The conditional request failed')
+            self.state.delete(Key)
+            return {'Attributes': _copy(current)} if ReturnValues == 'ALL_OLD' and current else {}
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None, ProjectionExpression=None,
+              ExpressionAttributeNames=None, ExpressionAttributeValues=None, ExclusiveStartKey=None, Limit=None,
+              ScanIndexForward=True, ConsistentRead=False, **_):
+        self.aws.request('dynamodb', 'Query')
+        values = _normalize(ExpressionAttributeValues)
+        key_condition = Condition(KeyConditionExpression, ExpressionAttributeNames, values)
+        with self.aws.lock:
+            state = self.state
+            if IndexName:
+                partition_key, sort_key = state.indexes[IndexName]
+                candidates = [i for i in state.all_items() if partition_key in i]
+            else:
+                partition_key, sort_key = state.partition_key, state.sort_key
+                candidates = list(state.partitions.get(key_condition.equals.get(partition_key), {}).values())
+            if partition_key not in key_condition.equals:
+                raise ValidationException('ValidationException', 'Query condition missed key schema element')
+            matched = [i for i in candidates if key_condition(i)]
+            if sort_key:
+                matched.sort(key=lambda i: i.get(sort_key), reverse=not ScanIndexForward)
+            return self._page(matched, FilterExpression, ProjectionExpression, ExpressionAttributeNames, values,
+                              ExclusiveStartKey, Limit, ConsistentRead)
+
+    def scan(self, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, ExclusiveStartKey=None, Limit=None, ConsistentRead=False, **_):
+        self.aws.request('dynamodb', 'Scan')
+        with self.aws.lock:
+            return self._page(list(self.state.all_items()), FilterExpression, ProjectionExpression,
+                              ExpressionAttributeNames, _normalize(ExpressionAttributeValues),
+                              ExclusiveStartKey, Limit, ConsistentRead)
+
+    def _page(self, items, filter_expression, projection, names, values, start_key, limit, consistent):
+        state = self.state
+        if start_key is not None:
+            start = state.key_of(start_key)
+            keys = [state.key_of(i) for i in items]
+            items = items[keys.index(start) + 1:] if start in keys else []
+        last_key = None
+        if limit is not None and len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            last_key = {k: last[k] for k in (state.partition_key, state.sort_key) if k}
+        # Capacity is charged on what was read, before the filter is applied
+        self.aws.consume(read=read_units(sum(self.aws.size(i) for i in items), consistent))
+        if filter_expression:
+            test = Condition(filter_expression, names, values)
+            items = [i for i in items if test(i)]
+        response = {
+            'Items': [_copy(project(i, projection, names)) for i in items],
+            'Count': len(items)
+        }
+        if last_key:
+            response['LastEvaluatedKey'] = last_key
+        return response
+
+
+class LocalDynamoResource:
+    def __init__(self, aws):
+        self.aws = aws
+        self.meta = _Meta(aws.dynamodb_client)
+
+    def Table(self, name):
+        return LocalTable(self.aws, name)
+
+    def batch_get_item(self, RequestItems, **_):
+        self.aws.request('dynamodb', 'BatchGetItem')
+        responses = {}
+        with self.aws.lock:
+            for table_name, request in RequestItems.items():
+                if len(request['Keys']) > 100:
+                    raise ValidationException('ValidationException', 'Too many items requested for the BatchGetItem call')
+                state = self.aws.table_state(table_name)
+                found = []
+                for key in request['Keys']:
+                    item = state.get(key)
+                    self.aws.consume(read=read_units(self.aws.size(item), request.get('ConsistentRead', False)))
+                    if item is not None:
+                        found.append(_copy(project(item, request.get('ProjectionExpression'),
+                                                   request.get('ExpressionAttributeNames'))))
+                responses[table_name] = found
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def batch_write_item(self, RequestItems, **_):
+        self.aws.request('dynamodb', 'BatchWriteItem')
+        with self.aws.lock:
+            if sum(len(requests) for requests in RequestItems.values()) > 25:
+                raise ValidationException('ValidationException', 'Too many items requested for the BatchWriteItem call')
+            for table_name, requests in RequestItems.items():
+                state = self.aws.table_state(table_name)
+                for request in requests:
+                    if 'PutRequest' in request:
+                        item = _normalize(_copy(request['PutRequest']['Item']))
+                        self.aws.consume(write=write_units(self.aws.size(item)))
+                        state.put(item)
+                    else:
+                        key = request['DeleteRequest']['Key']
+                        self.aws.consume(write=write_units(self.aws.size(state.get(key))))
+                        state.delete(key)
+        return {'UnprocessedItems': {}}
+
+
+class LocalDynamoClient:
+    """Low-level client: only the calls PULSE makes through dynamodb.meta.client."""
+
+    exceptions = _Exceptions
+
+    def __init__(self, aws):
+        self.aws = aws
+
+    def transact_write_items(self, TransactItems, **_):
+        self.aws.request('dynamodb', 'TransactWriteItems')
+        if len(TransactItems) > 100:
+            raise ValidationException('ValidationException', 'Member must have length less than or equal to 100')
+        with self.aws.lock:
+            staged = []
+            reasons = []
+            failed = False
+            for entry in TransactItems:
+                (action, spec), = entry.items()
+                state = self.aws.table_state(spec['TableName'])
+                key_source = spec.get('Item') or spec['Key']
+                key = deserialize_item(key_source)
+                current = state.get(key)
+                values = {k: deserialize_value(v) for k, v in spec.get('ExpressionAttributeValues', {}).items()}
+                ok = _check(spec.get('ConditionExpression'), spec.get('ExpressionAttributeNames'), values, current)
+                reasons.append({'Code': 'None'} if ok else {'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'})
+                failed = failed or not ok
+                staged.append((action, state, spec, key, current, values))
+            if failed:
+                raise TransactionCanceledException(
+                    'TransactionCanceledException',
+                    'Transaction cancelled, please refer cancellation reasons for specific reasons',
+                    reasons
+                )
+            for action, state, spec, key, current, values in staged:
+                if action == 'Put':
+                    item = _normalize(deserialize_item(spec['Item']))
+                    self.aws.consume(write=2 * write_units(self.aws.size(item)))
+                    state.put(item)
+                elif action == 'Delete':
+                    self.aws.consume(write=2 * write_units(self.aws.size(current)))
+                    state.delete(key)
+                elif action == 'Update':
+                    updated = apply_update(_copy(current) if current else dict(key), spec['UpdateExpression'],
+                                           spec.get('ExpressionAttributeNames'), values)
+                    self.aws.consume(write=2 * write_units(self.aws.size(updated)))
+                    state.put(_normalize(updated))
+                else:  # ConditionCheck
+                    self.aws.consume(read=2 * read_units(self.aws.size(current), True))
+        return {}
+
+
+class LocalSNS:
+    """SNS client stand-in: records every message; a topic message with a `recipients` attribute counts one delivery per recipient."""
+
+    exceptions = _Exceptions
+
+    def __init__(self, aws):
+        self.aws = aws
+        self.messages = []
+        self.subscriptions = []
+
+    def _record(self, message):
+        recipients = 1
+        attribute = (message.get('MessageAttributes') or {}).get('recipients')
+        if attribute and attribute.get('DataType') == 'String.Array':
+            recipients = len(json.loads(attribute['StringValue']))
+        with self.aws.lock:
+            if self.aws.on_message is None:
+                self.messages.append(message)
+            self.aws.metrics.sns_messages += 1
+            self.aws.metrics.sns_recipients += recipients
+        if self.aws.on_message is not None:
+            self.aws.on_message(message)
+        return str(uuid.uuid4())
+
+    def publish(self, Message, TopicArn=None, PhoneNumber=None, TargetArn=None, Subject=None, MessageAttributes=None, **_):
+        self.aws.request('sns', 'Publish')
+        if not (TopicArn or PhoneNumber or TargetArn):
+            raise ClientError('InvalidParameter', 'TopicArn, TargetArn or PhoneNumber is required')
+        message_id = self._record({
+            'TopicArn': TopicArn, 'PhoneNumber': PhoneNumber, 'TargetArn': TargetArn,
+            'Subject': Subject, 'Message': Message, 'MessageAttributes': MessageAttributes or {}
+        })
+        return {'MessageId': message_id}
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries, **_):
+        self.aws.request('sns', 'PublishBatch')
+        if len(PublishBatchRequestEntries) > PUBLISH_BATCH_LIMIT:
+            raise ClientError('TooManyEntriesInBatchRequest', 'The batch request contains more entries than permissible')
+        successful = []
+        for entry in PublishBatchRequestEntries:
+            message_id = self._record({
+                'TopicArn': TopicArn, 'Subject': entry.get('Subject'), 'Message': entry['Message'],
+                'MessageAttributes': entry.get('MessageAttributes') or {}
+            })
+            successful.append({'Id': entry['Id'], 'MessageId': message_id})
+        return {'Successful': successful, 'Failed': []}
+
+    def subscribe(self, TopicArn, Protocol, Endpoint, Attributes=None, **_):
+        self.aws.request('sns', 'Subscribe')
+        arn = f"{TopicArn}:{uuid.uuid4()}"
+        with self.aws.lock:
+            self.subscriptions.append({'SubscriptionArn': arn, 'Protocol': Protocol, 'Endpoint': Endpoint,
+                                       'Attributes': Attributes or {}})
+        return {'SubscriptionArn': arn}
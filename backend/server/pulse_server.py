@@ -0,0 +1,397 @@
+"""
+Self-hosted PULSE: every Lambda handler behind one asyncio HTTP server.
+
+For events with poor connectivity, one local box can run the whole backend.
+Each handler's index.py is loaded once and mounted at its API Gateway route
+(/default/processFriendData, /loginUser, ...). Requests are translated to
+API Gateway (HTTP API, payload 2.0) events and run on a bounded thread pool,
+so the boto3 clients, caches and connection pools the handlers keep at
+module level are shared by every request instead of living per container.
+
+Requests are admitted by priority lane (pulse_common.priority): SOS presses
+and falls run on workers of their own and hold routine work back while they
+run, and routine telemetry is shed first when the server falls behind.
+
+Storage:
+    --storage memory   in-process tables (localaws.py), optionally
+                       persisted to --snapshot; SNS alerts are logged to stderr
+    --storage aws      the real DynamoDB/SNS, configured by the usual
+                       environment variables and credentials
+
+Usage:
+    python backend/server/pulse_server.py [--port 8080] [--workers 32] \\
+        [--storage memory --snapshot pulse.json] [--sweep-seconds 60]
+"""
+import argparse
+import asyncio
+import base64
+import concurrent.futures
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from registry import HANDLERS, LAYER, LOCAL_ENVIRONMENT, load_handler  # noqa: E402
+sys.path.insert(0, LAYER)
+
+from pulse_common import priority  # noqa: E402  (reads only its own PRIORITY_* variables)
+
+MAX_HEADER_BYTES = 16 * 1024
+SCHEDULED = ('sweep-escalations',)  # run on a timer, not mounted
+DOWNSAMPLE_MEMORY = 100000  # friends remembered for ping downsampling before the map is reset
+
+
+def route_name(handler):
+    """'process-friend-data' -> 'processFriendData', the API Gateway resource name."""
+    first, *rest = handler.split('-')
+    return first + ''.join(part.capitalize() for part in rest)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--stage', default='default', help='API Gateway stage prefix also accepted in paths')
+    parser.add_argument('--workers', type=int, default=32, help='threads running handlers')
+    parser.add_argument('--max-pending', type=int, default=1024,
+                        help='routine requests queued or running before new ones get 503 Retry-After')
+    parser.add_argument('--critical-workers', type=int, default=4, help='threads reserved for SOS and falls')
+    parser.add_argument('--routine-workers', type=int, help='routine requests running at once (default: --workers)')
+    parser.add_argument('--shed-queue', type=int, default=64,
+                        help='queued routine requests above which routine telemetry is downsampled or deferred')
+    parser.add_argument('--downsample-seconds', type=float, default=30,
+                        help='under load, accept one routine ping per friend in this interval')
+    parser.add_argument('--lanes', choices=('on', 'off'), default='on',
+                        help='off: one first-come first-served queue for every request')
+    parser.add_argument('--max-body-kb', type=int, default=256)
+    parser.add_argument('--storage', choices=('memory', 'aws'), default='memory')
+    parser.add_argument('--snapshot', metavar='PATH', help='memory storage: load at start, save periodically and on exit')
+    parser.add_argument('--snapshot-seconds', type=float, default=60)
+    parser.add_argument('--sweep-seconds', type=float, default=60, help='escalation sweep interval (0 disables)')
+    parser.add_argument('--quiet-handlers', action='store_true', help="discard the handlers' stdout logs")
+    return parser.parse_args()
+
+
+class Lanes:
+    """
+    Strict-priority admission to the handler threads, one FIFO queue per lane
+    (pulse_common.priority.LANES).
+
+    Critical requests run on workers of their own. While one is queued or
+    running no other request starts, so it competes for the interpreter only
+    with the requests already running. Elevated requests start ahead of
+    queued routine ones. Elevated and routine share `workers`, and at most
+    `routine_workers` of them are routine.
+    """
+
+    def __init__(self, critical_workers, workers, routine_workers):
+        self.limits = {priority.CRITICAL: critical_workers, priority.ELEVATED: workers,
+                       priority.ROUTINE: min(routine_workers, workers)}
+        self.queues = {lane: deque() for lane in priority.LANES}
+        self.running = {lane: 0 for lane in priority.LANES}
+
+    def queued(self, lane):
+        return len(self.queues[lane])
+
+    def _can_start(self, lane):
+        if lane == priority.CRITICAL:
+            return self.running[lane] < self.limits[lane]
+        if self.running[priority.CRITICAL] or self.queues[priority.CRITICAL]:
+            return False
+        if lane == priority.ROUTINE and (self.queues[priority.ELEVATED] or self.running[lane] >= self.limits[lane]):
+            return False
+        return self.running[priority.ELEVATED] + self.running[priority.ROUTINE] < self.limits[priority.ELEVATED]
+
+    async def acquire(self, lane):
+        if not self.queues[lane] and self._can_start(lane):
+            self.running[lane] += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.queues[lane].append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(lane)  # admitted just as the client went away
+            else:
+                self.queues[lane].remove(waiter)
+                self._admit()
+            raise
+
+    def release(self, lane):
+        self.running[lane] -= 1
+        self._admit()
+
+    def _admit(self):
+        for lane in priority.LANES:
+            queue = self.queues[lane]
+            while queue and self._can_start(lane):
+                self.running[lane] += 1
+                queue.popleft().set_result(None)
+
+
+class PulseServer:
+    def __init__(self, handlers, args, aws=None):
+        self.args = args
+        self.aws = aws
+        self.routes = {}
+        for name, handler in handlers.items():
+            if name in SCHEDULED:
+                continue
+            self.routes[f"/{route_name(name)}"] = (name, handler)
+            self.routes[f"/{args.stage}/{route_name(name)}"] = (name, handler)
+        self.sweep = handlers.get('sweep-escalations')
+        # One thread per lane slot, and one for the escalation sweep
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=args.workers + args.critical_workers + 1,
+                                                              thread_name_prefix='handler')
+        self.lanes = Lanes(args.critical_workers, args.workers, args.routine_workers or args.workers)
+        self.last_ping = {}  # friendId -> monotonic time of their last routine ping accepted under load
+        self.max_body = args.max_body_kb * 1024
+        self.stats = {lane: {'served': 0, 'shed': 0} for lane in priority.LANES}
+        self.started = time.monotonic()
+
+    # Helper: HTTP/1.1 request -> API Gateway event
+    def to_event(self, method, target, headers, body, peer):
+        url = urlsplit(target)
+        event = {
+            'version': '2.0',
+            'rawPath': url.path,
+            'rawQueryString': url.query,
+            'headers': headers,
+            'queryStringParameters': dict(parse_qsl(url.query, keep_blank_values=True)),
+            'httpMethod': method,
+            'requestContext': {
+                'http': {'method': method, 'path': url.path, 'sourceIp': peer, 'userAgent': headers.get('user-agent', '')},
+                'timeEpoch': int(time.time() * 1000)
+            },
+            'isBase64Encoded': False
+        }
+        if body:
+            try:
+                event['body'] = body.decode('utf-8')
+            except UnicodeDecodeError:
+                event['body'] = base64.b64encode(body).decode('ascii')
+                event['isBase64Encoded'] = True
+        return event
+
+    # Helper: priority lane and body of a request, parsed only for the telemetry handlers
+    def classify(self, name, body):
+        if self.args.lanes == 'off' or name not in priority.TELEMETRY_HANDLERS:
+            return priority.ROUTINE, None
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return priority.ROUTINE, None
+        return priority.classify(name, payload), payload
+
+    # Helper: shed or downsample routine telemetry when the routine queue is backed up
+    def shed(self, name, lane, payload):
+        if self.args.lanes == 'off' or not priority.is_telemetry(name, lane) or self.lanes.queued(lane) < self.args.shed_queue:
+            return None
+        if name == 'process-wearable-data':
+            # The watch retries the batch later; ingest dedup makes the retry safe
+            return 503, {'Retry-After': '5'}, b''
+        friend_id = payload.get('friendId') if isinstance(payload, dict) else None
+        now = time.monotonic()
+        last = self.last_ping.get(friend_id)
+        if last is not None and now - last < self.args.downsample_seconds:
+            # A newer ping supersedes this one within seconds, so it is acknowledged and dropped
+            return 202, {'Content-Type': 'application/json'}, json.dumps({
+                'message': 'Ping downsampled under load.', 'downsampled': True,
+                'nextReportSeconds': int(self.args.downsample_seconds)
+            }).encode('utf-8')
+        if len(self.last_ping) >= DOWNSAMPLE_MEMORY:
+            self.last_ping.clear()
+        self.last_ping[friend_id] = now
+        return None
+
+    async def invoke(self, name, handler, event, body):
+        """Run a blocking handler on the pool in its lane; returns (status, headers, body bytes)."""
+        lane, payload = self.classify(name, body)
+        response = self.shed(name, lane, payload)
+        if response is None and lane == priority.ROUTINE and \
+                self.lanes.queued(lane) + self.lanes.running[lane] >= self.args.max_pending:
+            response = 503, {'Retry-After': '1'}, b''
+        if response is not None:
+            self.stats[lane]['shed'] += 1
+            return response
+
+        await self.lanes.acquire(lane)
+        try:
+            response = await asyncio.get_running_loop().run_in_executor(self.executor, handler, event, None)
+        except Exception as e:
+            print(f"❌ Handler failed for {event['rawPath']}: {e!r}", file=sys.stderr)
+            return 502, {'Content-Type': 'application/json'}, b'{"error": "Handler failed"}'
+        finally:
+            self.lanes.release(lane)
+        self.stats[lane]['served'] += 1
+        body = response.get('body') or ''
+        if response.get('isBase64Encoded'):
+            body = base64.b64decode(body)
+        elif not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        return int(response.get('statusCode', 200)), dict(response.get('headers') or {}), body
+
+    async def respond(self, method, target, headers, body, peer):
+        path = urlsplit(target).path.rstrip('/') or '/'
+        if path == '/health':
+            return 200, {'Content-Type': 'application/json'}, json.dumps({
+                'status': 'ok',
+                'uptimeSeconds': round(time.monotonic() - self.started),
+                'lanes': {
+                    priority.LANE_NAMES[lane]: {**stats, 'running': self.lanes.running[lane], 'queued': self.lanes.queued(lane)}
+                    for lane, stats in self.stats.items()
+                }
+            }).encode('utf-8')
+        if path not in self.routes:
+            return 404, {'Content-Type': 'application/json'}, b'{"error": "Not found"}'
+        name, handler = self.routes[path]
+        return await self.invoke(name, handler, self.to_event(method, target, headers, body, peer), body)
+
+    async def handle_connection(self, reader, writer):
+        peer = (writer.get_extra_info('peername') or ('', 0))[0]
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except asyncio.IncompleteReadError:
+                    return  # client closed between requests
+                except asyncio.LimitOverrunError:
+                    await self.write(writer, 431, {}, b'', close=True)
+                    return
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = request_line.split(' ', 2)
+                except ValueError:
+                    await self.write(writer, 400, {}, b'', close=True)
+                    return
+                headers = {}
+                for line in filter(None, header_lines):
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                if 'chunked' in headers.get('transfer-encoding', '').lower():
+                    await self.write(writer, 411, {}, b'', close=True)
+                    return
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    await self.write(writer, 400, {}, b'', close=True)
+                    return
+                if length > self.max_body:
+                    await self.write(writer, 413, {}, b'', close=True)
+                    return
+                body = await reader.readexactly(length) if length else b''
+
+                connection = headers.get('connection', '').lower()
+                close = connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive')
+                status, response_headers, response_body = await self.respond(method.upper(), target, headers, body, peer)
+                await self.write(writer, status, response_headers, response_body, close=close, head=method.upper() == 'HEAD')
+                if close:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def write(self, writer, status, headers, body, close=False, head=False):
+        reason = HTTPStatus(status).phrase if status in HTTPStatus._value2member_map_ else ''
+        lines = [f"HTTP/1.1 {status} {reason}"]
+        for name, value in headers.items():
+            if name.lower() not in ('content-length', 'connection'):
+                lines.append(f"{name}: {value}")
+        lines.append(f"Content-Length: {len(body)}")
+        lines.append('Connection: close' if close else 'Connection: keep-alive')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (b'' if head else body))
+        await writer.drain()
+
+    # Helper: scheduled escalation sweep (EventBridge in the Lambda deployment)
+    async def run_sweeps(self):
+        while True:
+            await asyncio.sleep(self.args.sweep_seconds)
+            try:
+                await asyncio.get_running_loop().run_in_executor(self.executor, self.sweep, {}, None)
+            except Exception as e:
+                print(f"❌ Escalation sweep failed: {e!r}", file=sys.stderr)
+
+    # Helper: periodic snapshot of the in-memory tables
+    async def run_snapshots(self):
+        while True:
+            await asyncio.sleep(self.args.snapshot_seconds)
+            await asyncio.get_running_loop().run_in_executor(None, self.save_snapshot)
+
+    def save_snapshot(self):
+        if self.aws is None or not self.args.snapshot:
+            return
+        try:
+            count = self.aws.save(self.args.snapshot)
+            print(f"💾 Saved {count} item(s) to {self.args.snapshot}", file=sys.stderr)
+        except OSError as e:
+            print(f"❌ Snapshot failed: {e}", file=sys.stderr)
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle_connection, self.args.host, self.args.port, limit=MAX_HEADER_BYTES)
+        tasks = []
+        if self.sweep and self.args.sweep_seconds > 0:
+            tasks.append(asyncio.create_task(self.run_sweeps()))
+        if self.aws is not None and self.args.snapshot:
+            tasks.append(asyncio.create_task(self.run_snapshots()))
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+
+        routes = sorted({f"/{route_name(name)}" for name, _ in self.routes.values()})
+        print(f"✅ PULSE listening on http://{self.args.host}:{self.args.port} "
+              f"({self.args.storage} storage, {self.args.workers} workers): {', '.join(routes)}", file=sys.stderr)
+        async with server:
+            await stop.wait()
+        for task in tasks:
+            task.cancel()
+        self.executor.shutdown(wait=True)
+        self.save_snapshot()
+
+
+def main():
+    args = parse_args()
+
+    # Environment first: the layer and the handlers read it at import time
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-2')
+    os.environ.setdefault('AWS_MAX_POOL_CONNECTIONS', str(args.workers + args.critical_workers))
+
+    aws = None
+    if args.storage == 'memory':
+        for key, value in LOCAL_ENVIRONMENT.items():
+            os.environ.setdefault(key, value)
+        # In-memory calls have no network wait, so overlapping them on the I/O pool only adds handoffs
+        os.environ.setdefault('IO_POOL_WORKERS', '0')
+        import localaws
+        from pulse_common import runtime
+
+        def log_alert(message):
+            print(f"📣 {message.get('Subject') or 'Alert'} -> {message.get('TopicArn') or message.get('PhoneNumber')}: "
+                  f"{message.get('Message')}", file=sys.stderr)
+
+        aws = localaws.LocalAWS(on_message=log_alert, metering=False)
+        if args.snapshot and os.path.exists(args.snapshot):
+            print(f"📂 Loaded {aws.load(args.snapshot)} item(s) from {args.snapshot}", file=sys.stderr)
+        runtime.use_backend(aws)
+
+    if args.quiet_handlers:
+        sys.stdout = open(os.devnull, 'w')
+
+    handlers = {name: load_handler(name) for name in HANDLERS}
+    asyncio.run(PulseServer(handlers, args, aws).serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Where the Lambda handlers live, and how to load them in-process: the
+self-hosted server mounts every one, and the benchmarks replay traffic
+through them.
+"""
+import importlib.util
+import os
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNCTIONS = os.path.join(BACKEND, 'lambda-functions')
+LAYER = os.path.join(BACKEND, 'lambda-layers', 'pulse-common', 'python')
+
+# handler -> directory under lambda-functions
+HANDLERS = {
+    'get-distance-between-friends': 'get-distance-between-friends',
+    'get-user-status': 'get-user-status',
+    'get-group-snapshot': 'get-group-snapshot',
+    'get-vitals-history': 'get-vitals-history',
+    'get-location-trail': 'get-location-trail',
+    'process-friend-data': 'process-friend-data',
+    'process-wearable-data': 'process-wearable-data',
+    'set-user-preferences': 'set-user-preferences',
+    'sweep-escalations': 'sweep-escalations',
+    'create-user': 'lambdas-for-user-authentication/create-user',
+    'login-user': 'lambdas-for-user-authentication/login-user',
+    'add-friend-request': 'lambdas-for-friend-logic/add-friend-request',
+    'accept-friend-request': 'lambdas-for-friend-logic/accept-friend-request',
+    'get-accepted-friends': 'lambdas-for-friend-logic/get-accepted-friends',
+    'get-pending-requests': 'lambdas-for-friend-logic/get-pending-requests',
+}
+
+# Table and topic names for local storage (localaws.py). Raw wearable samples go to their own
+# (friendId, timestamp) table; FriendStatus holds GPS pings.
+LOCAL_ENVIRONMENT = {
+    'DATA_TABLE_NAME': 'WearableData',
+    'SNS_TOPIC_ARN': 'arn:aws:sns:us-east-2:000000000000:pulse-alerts',
+}
+
+
+def load_handler(name):
+    """Import a handler's index.py under a module name of its own and return its lambda_handler."""
+    path = os.path.join(FUNCTIONS, HANDLERS[name], 'index.py')
+    spec = importlib.util.spec_from_file_location(f"handler_{name.replace('-', '_')}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.lambda_handler
@@ -0,0 +1,197 @@
+"""Password hashing (with a fake bcrypt), session tokens, and create-user's email check on local tables."""
+import hashlib
+import json
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(BACKEND, 'lambda-layers', 'pulse-common', 'python'))
+sys.path.insert(0, os.path.join(BACKEND, 'server'))
+
+import localaws  # noqa: E402
+import registry  # noqa: E402
+from pulse_common import passwords, runtime, sessions  # noqa: E402
+from pulse_common.sessions import InvalidToken, authorize, issue_token, verify_token  # noqa: E402
+
+NOW = 1_750_000_000
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeBcrypt:
+    """bcrypt's hashpw / gensalt / checkpw, where a hash at cost 12 takes `base_ms` on the fake clock."""
+
+    def __init__(self, clock, base_ms):
+        self.clock = clock
+        self.base_ms = base_ms
+        self.costs = []
+
+    def gensalt(self, rounds=12):
+        return f'$2b${rounds:02d}$'.encode('ascii')
+
+    def hashpw(self, password, salt):
+        rounds = int(salt.split(b'$')[2])
+        self.costs.append(rounds)
+        self.clock.advance(self.base_ms * 2 ** (rounds - 12) / 1000)
+        return salt + hashlib.sha256(salt + password).hexdigest().encode('ascii')
+
+    def checkpw(self, password, hashed):
+        return self.hashpw(password, hashed[:7]) == hashed
+
+
+class PasswordsTest(unittest.TestCase):
+    def use_bcrypt(self, base_ms):
+        clock = FakeClock()
+        fake = FakeBcrypt(clock, base_ms)
+        patches = [
+            mock.patch.object(passwords, 'bcrypt', fake),
+            mock.patch.object(passwords, 'time', SimpleNamespace(perf_counter=clock)),
+            mock.patch.object(passwords, '_rounds', None),
+            mock.patch.object(passwords, 'PINNED_ROUNDS', None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        return fake
+
+    def test_calibration_picks_the_largest_cost_within_the_target(self):
+        for base_ms, rounds in ((250, 12), (120, 13), (50, 14), (20, 15), (1, 15)):
+            fake = self.use_bcrypt(base_ms)
+            self.assertEqual(passwords.calibrate_rounds(target_ms=250), rounds, base_ms)
+            self.assertEqual(fake.costs, [passwords.MIN_ROUNDS])  # one timed hash, at the floor
+
+    def test_calibration_never_goes_below_twelve(self):
+        self.use_bcrypt(5000)
+        self.assertEqual(passwords.MIN_ROUNDS, 12)
+        self.assertEqual(passwords.calibrate_rounds(target_ms=250), 12)
+        self.assertEqual(passwords.current_rounds(), 12)
+
+    def test_pinned_cost_never_goes_below_twelve(self):
+        self.use_bcrypt(1)
+        for pinned, rounds in ((10, 12), (14, 14)):
+            with mock.patch.object(passwords, 'PINNED_ROUNDS', pinned):
+                self.assertEqual(passwords.current_rounds(), rounds)
+
+    def test_calibrates_once_and_hashes_at_that_cost(self):
+        fake = self.use_bcrypt(50)
+        stored = passwords.hash_password('hunter2')
+        passwords.hash_password('hunter3')
+        self.assertEqual(fake.costs, [12, 14, 14])
+        self.assertEqual(passwords.hash_rounds(stored), 14)
+        self.assertTrue(passwords.check_password('hunter2', stored))
+        self.assertFalse(passwords.check_password('hunter3', stored))
+
+    def test_weaker_hashes_need_a_rehash(self):
+        self.use_bcrypt(50)
+        self.assertTrue(passwords.needs_rehash('$2b$12$' + 'x' * 53))
+        self.assertFalse(passwords.needs_rehash('$2b$14$' + 'x' * 53))
+        self.assertFalse(passwords.needs_rehash('$2b$15$' + 'x' * 53))
+        self.assertTrue(passwords.needs_rehash('not a bcrypt hash'))
+
+
+@mock.patch.dict(os.environ, {'SESSION_SECRETS': 'current,previous'})
+class SessionTokenTest(unittest.TestCase):
+    def test_round_trip(self):
+        token, expires_at = issue_token('alice', ttl=3600, now=NOW)
+        self.assertEqual(expires_at, NOW + 3600)
+        self.assertEqual(verify_token(token, now=NOW + 10), 'alice')
+
+    def test_expired_token_is_refused(self):
+        token, expires_at = issue_token('alice', ttl=3600, now=NOW)
+        self.assertEqual(verify_token(token, now=expires_at - 1), 'alice')
+        # Expiry is checked on every use, cached or not
+        with self.assertRaisesRegex(InvalidToken, 'expired'):
+            verify_token(token, now=expires_at)
+
+    def test_tampered_payload_is_refused(self):
+        token, _ = issue_token('alice', ttl=3600, now=NOW)
+        version, _, signature = token.split('.')
+        forged = sessions._b64encode(json.dumps({'sub': 'mallory', 'iat': NOW, 'exp': NOW + 3600}).encode('utf-8'))
+        with self.assertRaisesRegex(InvalidToken, 'Bad signature'):
+            verify_token(f'{version}.{forged}.{signature}', now=NOW)
+
+    def test_tampered_signature_is_refused(self):
+        token, _ = issue_token('alice', ttl=3600, now=NOW)
+        head, signature = token.rsplit('.', 1)
+        flipped = ('A' if signature[0] != 'A' else 'B') + signature[1:]
+        for bad in (f'{head}.{flipped}', f'{head}.', head, 'v2' + token[2:], 'garbage'):
+            with self.assertRaises(InvalidToken, msg=bad):
+                verify_token(bad, now=NOW)
+
+    def test_rotated_secret_still_verifies_until_removed(self):
+        with mock.patch.dict(os.environ, {'SESSION_SECRETS': 'previous'}):
+            token, _ = issue_token('alice', ttl=3600, now=NOW)
+        self.assertEqual(verify_token(token, now=NOW), 'alice')
+        sessions._verified.clear()
+        with mock.patch.dict(os.environ, {'SESSION_SECRETS': 'current'}):
+            with self.assertRaisesRegex(InvalidToken, 'Bad signature'):
+                verify_token(token, now=NOW)
+
+    def test_authorize(self):
+        token, _ = issue_token('alice')
+        event = {'headers': {'authorization': f'Bearer {token}'}}
+        self.assertIsNone(authorize(event, 'alice'))
+        self.assertEqual(authorize(event, 'bob')['statusCode'], 403)
+        self.assertEqual(authorize({'headers': {'Authorization': 'Bearer nope'}})['statusCode'], 401)
+        self.assertIsNone(authorize({}))
+        with mock.patch.object(sessions, 'REQUIRE_SESSION', True):
+            self.assertEqual(authorize({})['statusCode'], 401)
+
+
+class CreateUserTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        for key, value in registry.LOCAL_ENVIRONMENT.items():
+            os.environ.setdefault(key, value)
+        cls.aws = localaws.LocalAWS()
+        runtime._instances.clear()  # tables built for another backend by an earlier test
+        runtime.use_backend(cls.aws)
+        cls.handler = staticmethod(registry.load_handler('create-user'))
+
+    @classmethod
+    def tearDownClass(cls):
+        runtime.use_backend(None)
+        runtime._instances.clear()
+
+    def setUp(self):
+        self.bcrypt = FakeBcrypt(FakeClock(), base_ms=250)
+        for patch in (mock.patch.object(passwords, 'bcrypt', self.bcrypt), mock.patch.object(passwords, '_rounds', 12)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def sign_up(self, email):
+        body = {'firstName': 'Ada', 'lastName': 'Lovelace', 'email': email, 'phone': '+15550100', 'password': 'hunter2'}
+        response = self.handler({'body': json.dumps(body)}, None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def test_taken_email_is_refused_before_hashing(self):
+        status, body = self.sign_up('ada@example.com')
+        self.assertEqual(status, 200, body)
+        self.assertEqual(self.bcrypt.costs, [12])
+        login = self.aws.resource('dynamodb').Table('UserEmails').get_item(Key={'email': 'ada@example.com'})['Item']
+        self.assertEqual((login['userId'], passwords.hash_rounds(login['password'])), (body['userId'], 12))
+
+        status, body = self.sign_up('  ADA@example.com ')
+        self.assertEqual(status, 409, body)
+        self.assertEqual(self.bcrypt.costs, [12])  # no second hash
+
+    def test_missing_fields_are_refused_before_hashing(self):
+        response = self.handler({'body': json.dumps({'email': 'grace@example.com'})}, None)
+        self.assertEqual(response['statusCode'], 400)
+        self.assertEqual(self.bcrypt.costs, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
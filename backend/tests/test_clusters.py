@@ -0,0 +1,94 @@
+"""GroupClusters: who in a group counts as separated, and incremental updates against a full fit."""
+import os
+import random
+import sys
+import unittest
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(BACKEND, 'lambda-layers', 'pulse-common', 'python'))
+
+from pulse_common.clusters import GroupClusters, MIN_POINTS  # noqa: E402
+
+LAT, LON = 51.5000, -0.1000
+METRE = 1 / 111_320  # degrees of latitude
+
+
+def at(north, east=0.0):
+    """(lat, lon) `north` / `east` metres from the festival origin (east scaled roughly for the latitude)."""
+    return LAT + north * METRE, LON + east * METRE / 0.6225
+
+
+def partition(clusters):
+    return sorted(clusters.clusters()), clusters.isolated()
+
+
+class GroupClustersTest(unittest.TestCase):
+    def fitted(self, locations, eps=50, min_points=MIN_POINTS):
+        clusters = GroupClusters(eps, min_points=min_points, ref_lat=LAT)
+        clusters.fit(locations)
+        return clusters
+
+    def festival(self):
+        bar = {f'bar{i}': at(i * 5, i * 3) for i in range(5)}
+        smoking = {'smoker0': at(400), 'smoker1': at(410, 10)}
+        return {**bar, **smoking, 'loner': at(-600, 300)}
+
+    def test_a_pair_together_is_not_separated(self):
+        clusters = self.fitted(self.festival())
+        self.assertFalse(clusters.is_isolated('smoker0'))
+        self.assertFalse(clusters.is_isolated('smoker1'))
+        self.assertEqual(clusters.isolated(), ['loner'])
+
+    def test_sub_groups_are_each_a_cluster(self):
+        clusters, isolated = partition(self.fitted(self.festival()))
+        self.assertEqual(clusters, [[f'bar{i}' for i in range(5)], ['smoker0', 'smoker1']])
+        self.assertEqual(isolated, ['loner'])
+
+    def test_pair_apart_is_isolated_with_min_points_three(self):
+        clusters = self.fitted(self.festival(), min_points=3)
+        self.assertEqual(clusters.isolated(), ['loner', 'smoker0', 'smoker1'])
+
+    def test_members_chain_into_one_cluster(self):
+        line = {f'f{i}': at(i * 40) for i in range(6)}
+        self.assertEqual(partition(self.fitted(line)), ([sorted(line)], []))
+
+    def test_moving_a_member_away_and_back(self):
+        locations = self.festival()
+        clusters = self.fitted(locations)
+        clusters.sync({**locations, 'smoker1': at(900)})
+        self.assertEqual(clusters.isolated(), ['loner', 'smoker0', 'smoker1'])
+        clusters.sync({**locations, 'loner': at(405, 5)})
+        self.assertEqual(clusters.isolated(), [])
+        self.assertIn(['loner', 'smoker0', 'smoker1'], clusters.clusters())
+
+    def test_removed_member_leaves_their_partner_alone(self):
+        locations = self.festival()
+        clusters = self.fitted(locations)
+        del locations['smoker1']
+        clusters.sync(locations)
+        self.assertEqual(clusters.isolated(), ['loner', 'smoker0'])
+
+    def test_incremental_updates_match_a_fresh_fit(self):
+        rng = random.Random(7)
+        for min_points in (2, 3):
+            locations = {f'f{i}': at(rng.uniform(0, 600), rng.uniform(0, 600)) for i in range(60)}
+            clusters = self.fitted(locations, min_points=min_points)
+            for step in range(200):
+                key = f'f{rng.randrange(70)}'
+                if key in locations and rng.random() < 0.1:
+                    del locations[key]
+                else:
+                    locations[key] = at(rng.uniform(0, 600), rng.uniform(0, 600))
+                clusters.sync(locations)
+                fresh = self.fitted(locations, min_points=min_points)
+                self.assertEqual(clusters.isolated(), fresh.isolated(), (min_points, step))
+                if min_points == 2:
+                    # Every clustered member is a core, so the clusters themselves are unique
+                    self.assertEqual(partition(clusters), partition(fresh), step)
+                else:
+                    # A border member within reach of two clusters may join either
+                    self.assertEqual(len(clusters.clusters()), len(fresh.clusters()), step)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+"""EscalationScheduler against InMemoryEscalationStore and a local PendingEscalations table, on a fake clock."""
+import os
+import sys
+import unittest
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(BACKEND, 'lambda-layers', 'pulse-common', 'python'))
+sys.path.insert(0, os.path.join(BACKEND, 'server'))
+
+import localaws  # noqa: E402
+from pulse_common.escalations import (  # noqa: E402
+    DynamoEscalationStore, EscalationScheduler, InMemoryEscalationStore, due_bucket, MAX_CATCH_UP_BUCKETS
+)
+
+
+class FakeClock:
+    def __init__(self, now=1_750_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class EscalationSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = InMemoryEscalationStore()
+        self.scheduler = EscalationScheduler(self.store, clock=self.clock)
+        self.fired = []
+
+    def fire_due(self):
+        return self.scheduler.fire_due(self.fired.append)
+
+    def test_schedule_records_due_time_and_details(self):
+        self.assertTrue(self.scheduler.schedule('alice', 600, gps='1,2', maxDistanceApart=250))
+        escalation = self.store.items['alice']
+        self.assertEqual(escalation['dueAt'], int(self.clock.now) + 600)
+        self.assertEqual(escalation['dueBucket'], due_bucket(escalation['dueAt']))
+        self.assertEqual(escalation['createdAt'], int(self.clock.now))
+        self.assertEqual((escalation['gps'], escalation['maxDistanceApart']), ('1,2', 250))
+
+    def test_schedule_keeps_the_running_countdown(self):
+        self.assertTrue(self.scheduler.schedule('alice', 600))
+        self.clock.advance(300)
+        self.assertFalse(self.scheduler.schedule('alice', 600))
+        self.clock.advance(300)
+        self.assertEqual([e['friendId'] for e in self.fire_due()], ['alice'])
+
+    def test_nothing_fires_before_the_countdown_ends(self):
+        self.scheduler.schedule('alice', 600)
+        self.clock.advance(599)
+        self.assertEqual(self.fire_due(), [])
+        self.assertEqual(self.fired, [])
+
+    def test_fire_due_fires_each_escalation_once(self):
+        self.scheduler.schedule('alice', 60)
+        self.scheduler.schedule('bob', 120)
+        self.scheduler.schedule('carol', 600)
+        self.clock.advance(120)
+        self.assertEqual(sorted(e['friendId'] for e in self.fire_due()), ['alice', 'bob'])
+        self.assertEqual(self.fire_due(), [])
+        self.assertEqual(list(self.store.items), ['carol'])
+
+    def test_cancel_drops_the_countdown(self):
+        self.scheduler.schedule('alice', 60)
+        self.assertTrue(self.scheduler.cancel('alice'))
+        self.assertFalse(self.scheduler.cancel('alice'))
+        self.clock.advance(60)
+        self.assertEqual(self.fire_due(), [])
+
+    def test_reschedule_after_cancel_uses_the_new_due_time(self):
+        self.scheduler.schedule('alice', 60)
+        self.scheduler.cancel('alice')
+        self.clock.advance(30)
+        self.scheduler.schedule('alice', 60)
+        self.clock.advance(30)
+        self.assertEqual(self.fire_due(), [])  # the first countdown's heap entry is stale
+        self.clock.advance(30)
+        self.assertEqual([e['friendId'] for e in self.fire_due()], ['alice'])
+
+    def test_failed_fire_is_put_back_for_the_next_sweep(self):
+        self.scheduler.schedule('alice', 60)
+        self.clock.advance(60)
+
+        def failing(escalation):
+            raise RuntimeError('publish failed')
+
+        self.assertEqual(self.scheduler.fire_due(failing), [])
+        self.assertIn('alice', self.store.items)
+        self.assertEqual([e['friendId'] for e in self.fire_due()], ['alice'])
+
+    def test_claim_refuses_a_cancelled_or_rescheduled_escalation(self):
+        self.scheduler.schedule('alice', 60)
+        stale = dict(self.store.items['alice'])
+        self.scheduler.cancel('alice')
+        self.assertFalse(self.store.claim(stale))
+        self.scheduler.schedule('alice', 120)
+        self.assertFalse(self.store.claim(stale))
+
+
+class DynamoEscalationStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = DynamoEscalationStore(localaws.LocalAWS().resource('dynamodb').Table('PendingEscalations'))
+        self.scheduler = EscalationScheduler(self.store, clock=self.clock)
+
+    def fire_due(self):
+        return sorted(e['friendId'] for e in self.scheduler.fire_due(lambda escalation: None))
+
+    def test_fires_once_the_countdown_ends(self):
+        self.fire_due()
+        self.scheduler.schedule('alice', 90)
+        self.clock.advance(60)
+        self.assertEqual(self.fire_due(), [])
+        self.clock.advance(60)
+        self.assertEqual(self.fire_due(), ['alice'])
+        self.assertEqual(self.fire_due(), [])
+
+    def test_sweeper_down_for_longer_than_the_lookback_still_fires(self):
+        self.fire_due()
+        self.scheduler.schedule('alice', 60)
+        self.clock.advance(45 * 60)  # no sweep for 45 minutes
+        self.assertEqual(self.fire_due(), ['alice'])
+        # The overdue row is gone, so a new countdown can start
+        self.assertTrue(self.scheduler.schedule('alice', 60))
+
+    def test_long_outage_is_caught_up_over_several_sweeps(self):
+        self.fire_due()
+        self.scheduler.schedule('alice', 60)
+        self.clock.advance(MAX_CATCH_UP_BUCKETS * 60 + 600)
+        self.scheduler.schedule('bob', -120)  # due in a bucket the first catch-up sweep does not reach
+        self.assertEqual(self.fire_due(), ['alice'])
+        self.assertEqual(self.fire_due(), ['bob'])
+
+    def test_restored_escalation_fires_on_the_next_sweep(self):
+        self.fire_due()
+        self.scheduler.schedule('alice', 60)
+        self.clock.advance(120)
+        [escalation] = self.scheduler.fire_due(lambda escalation: None)
+        self.clock.advance(60)
+        self.scheduler.restore(escalation)  # its alert failed after the claim
+        self.assertEqual(self.fire_due(), ['alice'])
+
+
+if __name__ == '__main__':
+    unittest.main()
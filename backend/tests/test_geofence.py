@@ -0,0 +1,113 @@
+"""GeofenceIndex point-in-polygon lookups: edges and vertices, concave zones, and zones crossing grid cells."""
+import os
+import random
+import sys
+import unittest
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(BACKEND, 'lambda-layers', 'pulse-common', 'python'))
+
+from pulse_common import geofence  # noqa: E402
+from pulse_common.geofence import GeofenceIndex, FLAGGED, VENUE, transitions  # noqa: E402
+
+LAT, LON = 51.5000, -0.1000
+STEP = 0.001  # degrees: roughly 111 m north-south, 69 m east-west here
+
+
+def at(north, east):
+    """(lat, lon) `north` / `east` steps from the origin."""
+    return LAT + north * STEP, LON + east * STEP
+
+
+def zone(zone_id, outline, kind=FLAGGED):
+    return {'zoneId': zone_id, 'kind': kind, 'polygon': [list(at(north, east)) for north, east in outline]}
+
+
+# A "C" opening east: the notch (north 1-3, east 1-4) is outside
+C_SHAPE = [(0, 0), (0, 4), (1, 4), (1, 1), (3, 1), (3, 4), (4, 4), (4, 0)]
+DIAMOND = [(0, 2), (2, 4), (4, 2), (2, 0)]
+
+
+def winding_inside(outline, north, east):
+    """Independent reference: winding number in step coordinates (the projection is linear, so it agrees)."""
+    winding = 0
+    for (n1, e1), (n2, e2) in zip(outline, outline[1:] + outline[:1]):
+        cross = (e2 - e1) * (north - n1) - (n2 - n1) * (east - e1)
+        if n1 <= north < n2 and cross > 0:
+            winding += 1
+        elif n2 <= north < n1 and cross < 0:
+            winding -= 1
+    return winding != 0
+
+
+class GeofenceIndexTest(unittest.TestCase):
+    def inside(self, index, north, east):
+        return index.containing(*at(north, east))
+
+    def test_points_on_edges_count_as_inside(self):
+        index = GeofenceIndex([zone('square', [(0, 0), (0, 2), (2, 2), (2, 0)]), zone('diamond', DIAMOND)])
+        for north, east in [(0, 1), (2, 1), (1, 0), (1, 2)]:
+            self.assertIn('square', self.inside(index, north, east), (north, east))
+        for north, east in [(1, 1), (1, 3), (3, 1), (3, 3), (0.5, 1.5)]:
+            self.assertIn('diamond', self.inside(index, north, east), (north, east))
+
+    def test_vertices_count_as_inside(self):
+        index = GeofenceIndex([zone('c', C_SHAPE), zone('diamond', DIAMOND)])
+        for north, east in C_SHAPE:
+            self.assertIn('c', self.inside(index, north, east), (north, east))
+        for north, east in DIAMOND:
+            self.assertIn('diamond', self.inside(index, north, east), (north, east))
+
+    def test_just_outside_an_edge_is_outside(self):
+        index = GeofenceIndex([zone('square', [(0, 0), (0, 2), (2, 2), (2, 0)])])
+        for north, east in [(-0.001, 1), (2.001, 1), (1, -0.001), (1, 2.001), (2.001, 2.001)]:
+            self.assertEqual(self.inside(index, north, east), [], (north, east))
+
+    def test_concave_zone(self):
+        index = GeofenceIndex([zone('c', C_SHAPE)])
+        for north, east in [(0.5, 2), (3.5, 2), (2, 0.5), (0.5, 3.9)]:
+            self.assertEqual(self.inside(index, north, east), ['c'], (north, east))
+        # The notch lies inside the bounding box, and rays from it cross the arms' vertices
+        for north, east in [(2, 2), (1.5, 3.5), (2, 4.5), (1, 4.5), (3, 4.5)]:
+            self.assertEqual(self.inside(index, north, east), [], (north, east))
+
+    def test_zones_crossing_cells_match_the_polygon(self):
+        rng = random.Random(11)
+        outlines = {'c': C_SHAPE, 'diamond': [(n + 1, e + 3) for n, e in DIAMOND]}
+        # Cells of 50 m: every zone spans many cells, and most cells it touches are only partly inside
+        index = GeofenceIndex([zone(zone_id, outline) for zone_id, outline in outlines.items()], cell_size=50)
+        self.assertGreater(len(index.cells), 20)
+        for _ in range(2000):
+            north, east = rng.uniform(-1, 6), rng.uniform(-1, 8)
+            expected = sorted(zone_id for zone_id, outline in outlines.items() if winding_inside(outline, north, east))
+            self.assertEqual(self.inside(index, north, east), expected, (north, east))
+
+    def test_wide_zones_skip_the_grid(self):
+        outline = [(0, 0), (0, 4), (4, 4), (4, 0)]
+        original = geofence.MAX_CELLS_PER_ZONE
+        geofence.MAX_CELLS_PER_ZONE = 4
+        try:
+            index = GeofenceIndex([zone('venue', outline, kind=VENUE)], cell_size=50)
+        finally:
+            geofence.MAX_CELLS_PER_ZONE = original
+        self.assertEqual(index.cells, {})
+        self.assertEqual(self.inside(index, 2, 2), ['venue'])
+        self.assertEqual(self.inside(index, 4, 2), ['venue'])
+        self.assertEqual(self.inside(index, 5, 2), [])
+
+    def test_invalid_zones_are_skipped(self):
+        index = GeofenceIndex([{'zoneId': 'line', 'polygon': [list(at(0, 0)), list(at(1, 1))]}, zone('c', C_SHAPE)])
+        self.assertEqual(len(index), 1)
+
+    def test_boundary_distance(self):
+        index = GeofenceIndex([zone('square', [(0, 0), (0, 2), (2, 2), (2, 0)])])
+        self.assertAlmostEqual(index.boundary_distance(*at(1, 1.9)), 0.1 * STEP * 111_195 * 0.6225, delta=0.5)
+        self.assertAlmostEqual(index.boundary_distance(*at(0, 1)), 0, delta=1e-6)
+
+    def test_transitions(self):
+        self.assertEqual(transitions(['a', 'b'], ['b', 'c']), (['c'], ['a']))
+        self.assertEqual(transitions(None, ['a']), (['a'], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+"""IngestGuard dedup and coalescing against the local FriendCurrentStatus table."""
+import os
+import sys
+import threading
+import unittest
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(BACKEND, 'lambda-layers', 'pulse-common', 'python'))
+sys.path.insert(0, os.path.join(BACKEND, 'server'))
+
+import localaws  # noqa: E402
+from pulse_common.ingest import IngestGuard, StatusWrite, COALESCED, DUPLICATE, STALE, WINDOW, WRITTEN  # noqa: E402
+from pulse_common.status import LOCATION_STAMP  # noqa: E402
+
+
+def stamp(second):
+    return f'2025-06-15T12:00:{second:02d}.000000'
+
+
+class GatedTable:
+    """Holds the first update_item until `release` is set, so later submits queue up behind it."""
+
+    def __init__(self, table):
+        self.table = table
+        self.release = threading.Event()
+        self.updates = 0
+
+    def update_item(self, **kwargs):
+        self.updates += 1
+        if self.updates == 1:
+            self.release.wait(5)
+        return self.table.update_item(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+
+class IngestGuardTest(unittest.TestCase):
+    def setUp(self):
+        self.aws = localaws.LocalAWS()
+        self.table = self.aws.resource('dynamodb').Table('FriendCurrentStatus')
+        self.guard = self.new_guard()
+
+    def new_guard(self):
+        """A guard with a cold cache, as in another container."""
+        return IngestGuard(self.table, 'pingDedup', LOCATION_STAMP)
+
+    def submit(self, second, seq=None, key=None, guard=None, friend_id='alice'):
+        write = StatusWrite({'latitude': second}, stamp(second), ('phone', seq) if seq is not None else None, key)
+        return (guard or self.guard).submit(friend_id, write)[0]
+
+    def latitude(self):
+        return self.table.get_item(Key={'friendId': 'alice'})['Item']['latitude']
+
+    def test_replayed_seq_is_rejected(self):
+        self.assertEqual(self.submit(1, seq=7), WRITTEN)
+        self.assertEqual(self.submit(2, seq=7), DUPLICATE)
+        self.assertEqual(self.submit(3, seq=7, guard=self.new_guard()), DUPLICATE)
+        self.assertTrue(self.guard.is_duplicate('alice', ('phone', 7)))
+        self.assertEqual(self.latitude(), 1)
+
+    def test_seq_within_the_window_is_applied_once(self):
+        self.assertEqual(self.submit(2, seq=100), WRITTEN)
+        self.assertEqual(self.submit(1, seq=99), STALE)
+        self.assertEqual(self.submit(3, seq=99), DUPLICATE)
+        self.assertEqual(self.submit(4, seq=101), WRITTEN)
+        self.assertEqual(self.latitude(), 4)
+
+    def test_out_of_window_seq_is_rejected(self):
+        self.assertEqual(self.submit(1, seq=200), WRITTEN)
+        self.assertEqual(self.submit(2, seq=200 - WINDOW), DUPLICATE)
+        self.assertEqual(self.submit(3, seq=200 - WINDOW, guard=self.new_guard()), DUPLICATE)
+        self.assertEqual(self.submit(4, seq=200 - WINDOW + 1), WRITTEN)
+        self.assertEqual(self.latitude(), 4)
+
+    def test_restarted_counter_starts_a_new_window(self):
+        self.assertEqual(self.submit(1, seq=200), WRITTEN)
+        self.assertEqual(self.submit(2, seq=0), WRITTEN)
+        self.assertEqual(self.submit(3, seq=0), DUPLICATE)
+        self.assertEqual(self.submit(4, seq=1), WRITTEN)
+
+    def test_devices_count_on_their_own(self):
+        self.assertEqual(self.submit(1, seq=5), WRITTEN)
+        watch = StatusWrite({'latitude': 2}, stamp(2), ('watch', 5))
+        self.assertEqual(self.guard.submit('alice', watch)[0], WRITTEN)
+
+    def test_duplicate_idempotency_key_returns_the_stored_outcome(self):
+        outcome, previous, _ = self.guard.submit('alice', StatusWrite({'latitude': 1}, stamp(1), key='ping-1'))
+        self.assertEqual((outcome, previous), (WRITTEN, {}))
+        for guard in (self.guard, self.new_guard()):
+            self.assertEqual(guard.submit('alice', StatusWrite({'latitude': 2}, stamp(2), key='ping-1')),
+                             (DUPLICATE, None, None))
+        self.assertEqual(self.latitude(), 1)
+        self.assertEqual(self.submit(3, key='ping-2'), WRITTEN)
+
+    def test_concurrent_submits_are_group_committed(self):
+        gated = GatedTable(self.table)
+        self.guard.table = gated
+        results = {}
+
+        def send(second, seq):
+            results[second] = self.guard.submit('alice', StatusWrite(
+                {'latitude': second}, stamp(second), ('phone', seq), append={'trail': [second]}))
+
+        first = threading.Thread(target=send, args=(1, 1))
+        first.start()
+        while gated.updates < 1:
+            threading.Event().wait(0.001)
+        # The first write is in flight: these queue up behind it and go out together
+        later = [threading.Thread(target=send, args=args) for args in ((3, 3), (2, 2), (4, 3))]
+        for queued, thread in enumerate(later, 1):
+            thread.start()
+            while len(self.guard.batches.get('alice', {}).get('writes', [])) < queued:
+                threading.Event().wait(0.001)
+        gated.release.set()
+        for thread in [first] + later:
+            thread.join(5)
+
+        self.assertEqual(gated.updates, 2)
+        self.assertEqual(results[1][0], WRITTEN)
+        self.assertEqual(results[2][0], COALESCED)
+        self.assertEqual(results[4][0], DUPLICATE)  # same seq as the ping at second 3, in the same batch
+        outcome, previous, appended = results[3]
+        self.assertEqual(outcome, WRITTEN)
+        self.assertEqual(previous['latitude'], 1)
+        self.assertEqual(appended, {'trail': [2, 3]})
+        item = self.table.get_item(Key={'friendId': 'alice'})['Item']
+        self.assertEqual((item['latitude'], item['trail']), (3, [1, 2, 3]))
+        self.assertEqual(self.guard.flushing, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
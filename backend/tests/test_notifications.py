@@ -0,0 +1,111 @@
+"""AlertNotifier against the local AlertIncidents / FriendGraph tables and SNS, on a fake clock."""
+import json
+import os
+import sys
+import unittest
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(BACKEND, 'lambda-layers', 'pulse-common', 'python'))
+sys.path.insert(0, os.path.join(BACKEND, 'server'))
+
+import localaws  # noqa: E402
+from pulse_common.friends import edge_key, ACCEPTED  # noqa: E402
+from pulse_common.notifications import AlertNotifier, ALERT, CRITICAL, SELF, WARNING  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self, now=1_750_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class AlertNotifierTest(unittest.TestCase):
+    def setUp(self):
+        self.aws = localaws.LocalAWS()
+        self.aws.seed_items('FriendGraph', [
+            {**edge_key('alice', ACCEPTED, 'bob'), 'friendId': 'bob'},
+        ])
+        dynamodb = self.aws.resource('dynamodb')
+        self.clock = FakeClock()
+        self.notifier = AlertNotifier(self.aws.client('sns'), 'arn:aws:sns:us-east-2:0:alerts',
+                                      dynamodb.Table('AlertIncidents'), dynamodb.Table('FriendGraph'),
+                                      clock=self.clock, window=900)
+
+    def send(self, cause, severity, message='alert', audience=SELF):
+        severity = self.notifier.notify('alice', cause, severity, message, audience=audience)
+        self.notifier.flush()
+        return severity
+
+    def messages(self):
+        return [message['Message'] for message in self.aws.sns.messages]
+
+    def test_repeat_within_the_window_is_coalesced(self):
+        self.assertEqual(self.send('distance', WARNING), WARNING)
+        self.clock.advance(60)
+        self.assertIsNone(self.send('distance', WARNING))
+        self.assertEqual(len(self.messages()), 1)
+
+    def test_more_severe_alert_goes_out(self):
+        self.send('distance', WARNING)
+        self.clock.advance(60)
+        self.assertEqual(self.send('distance', ALERT), ALERT)
+        self.assertEqual(len(self.messages()), 2)
+
+    def test_still_firing_after_the_window_escalates(self):
+        self.send('vitals', WARNING)
+        self.clock.advance(60)
+        self.send('vitals', WARNING)
+        self.clock.advance(900)
+        self.assertEqual(self.send('vitals', WARNING), ALERT)
+        self.assertIn('1 repeat alert(s) suppressed', self.messages()[-1])
+
+    def test_second_sos_within_the_window_is_published(self):
+        self.assertEqual(self.send('sos', CRITICAL, 'SOS 1'), CRITICAL)
+        self.clock.advance(30)
+        self.assertEqual(self.send('sos', CRITICAL, 'SOS 2'), CRITICAL)
+        self.assertEqual(self.messages(), ['[CRITICAL] SOS 1', '[CRITICAL] SOS 2'])
+
+    def test_second_fall_after_a_vitals_alert_is_published(self):
+        self.send('vitals', ALERT)
+        self.send('vitals', CRITICAL, 'fall 1')
+        self.clock.advance(30)
+        self.assertEqual(self.send('vitals', CRITICAL, 'fall 2'), CRITICAL)
+        self.assertEqual(len(self.messages()), 3)
+
+    def test_lesser_alert_after_a_critical_one_is_coalesced(self):
+        self.send('vitals', CRITICAL)
+        self.clock.advance(30)
+        self.assertIsNone(self.send('vitals', WARNING))
+
+    def test_circle_wide_alert_addresses_the_friends(self):
+        self.send('sos', CRITICAL, audience='friends')
+        recipients = self.aws.sns.messages[0]['MessageAttributes']['recipients']['StringValue']
+        self.assertEqual(sorted(json.loads(recipients)), ['alice', 'bob'])
+
+    def test_resolve_reopens_the_incident(self):
+        self.send('distance', WARNING)
+        self.notifier.resolve('alice', 'distance')
+        self.assertEqual(self.send('distance', WARNING), WARNING)
+        self.assertEqual(len(self.messages()), 2)
+
+    def test_failed_publish_reopens_the_incident_and_reports_the_alert(self):
+        def failing(**kwargs):
+            raise RuntimeError('throttled')
+
+        failed = []
+        self.aws.sns.publish_batch = failing
+        self.notifier.notify('alice', 'distance', ALERT, 'final alert')
+        self.assertEqual(self.notifier.flush(on_failure=failed.append), 0)
+        self.assertEqual([alert['friendId'] for alert in failed], ['alice'])
+        del self.aws.sns.publish_batch
+        self.assertEqual(self.send('distance', ALERT), ALERT)
+        self.assertEqual(self.messages(), ['[ALERT] alert'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""GroupMarker, load_marks and group_etag against the local FriendGraph table."""
+import os
+import sys
+import unittest
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(BACKEND, 'lambda-layers', 'pulse-common', 'python'))
+sys.path.insert(0, os.path.join(BACKEND, 'server'))
+
+import localaws  # noqa: E402
+from pulse_common.friends import edge_key, ACCEPTED  # noqa: E402
+from pulse_common.snapshots import GroupMarker, group_etag, load_marks, MARK_SECONDS  # noqa: E402
+
+NOW = 1_750_000_020.0
+
+
+class GroupMarkerTest(unittest.TestCase):
+    def setUp(self):
+        self.aws = localaws.LocalAWS()
+        self.aws.seed_items('FriendGraph', [
+            {**edge_key('alice', ACCEPTED, 'bob'), 'friendId': 'bob'},
+            {**edge_key('bob', ACCEPTED, 'alice'), 'friendId': 'alice'},
+            {**edge_key('alice', ACCEPTED, 'carol'), 'friendId': 'carol'},
+            {**edge_key('carol', ACCEPTED, 'alice'), 'friendId': 'alice'},
+        ])
+        self.graph = self.aws.resource('dynamodb').Table('FriendGraph')
+        self.marker = GroupMarker(self.graph)
+
+    def etag(self, user_id, now=NOW):
+        return group_etag(*load_marks(self.graph, user_id), now=now)
+
+    def test_load_marks_lists_the_group_with_its_marks(self):
+        self.marker.mark('bob', '2025-06-15T12:00:00Z')
+        member_ids, marks = load_marks(self.graph, 'alice')
+        self.assertEqual(member_ids[0], 'alice')
+        self.assertEqual(sorted(member_ids[1:]), ['bob', 'carol'])
+        self.assertEqual(marks, {'alice': None, 'bob': '2025-06-15T12:00:00Z', 'carol': None})
+
+    def test_a_mark_changes_every_friends_etag(self):
+        before = {user: self.etag(user) for user in ('alice', 'bob', 'carol')}
+        self.marker.mark('alice', '2025-06-15T12:00:00Z')
+        for user in ('alice', 'bob', 'carol'):
+            self.assertNotEqual(self.etag(user), before[user], user)
+
+    def test_etag_is_stable_until_a_mark_or_the_period_rolls_over(self):
+        etag = self.etag('alice')
+        self.assertEqual(self.etag('alice', now=NOW + 1), etag)
+        self.assertNotEqual(self.etag('alice', now=NOW + MARK_SECONDS), etag)
+
+    def test_routine_marks_are_throttled_but_urgent_ones_are_not(self):
+        self.assertTrue(self.marker.mark('bob', '2025-06-15T12:00:00Z'))
+        etag = self.etag('alice')
+        self.assertFalse(self.marker.mark('bob', '2025-06-15T12:00:10Z'))
+        self.assertEqual(self.etag('alice'), etag)
+        self.assertTrue(self.marker.mark('bob', '2025-06-15T12:00:20Z', urgent=True))
+        self.assertNotEqual(self.etag('alice'), etag)
+
+    def test_marks_never_move_backwards(self):
+        self.marker.mark('bob', '2025-06-15T12:00:20Z')
+        GroupMarker(self.graph).mark('bob', '2025-06-15T12:00:00Z')
+        self.assertEqual(load_marks(self.graph, 'alice')[1]['bob'], '2025-06-15T12:00:20Z')
+
+    def test_marks_do_not_recreate_a_removed_edge(self):
+        self.graph.delete_item(Key=edge_key('alice', ACCEPTED, 'bob'))
+        self.marker.mark('bob', '2025-06-15T12:00:00Z')
+        self.assertEqual(load_marks(self.graph, 'alice')[0], ['alice', 'carol'])
+        self.assertIsNone(self.graph.get_item(Key=edge_key('alice', ACCEPTED, 'bob')).get('Item'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""Trail encoding and simplification, and the trail buffer through process-friend-data on local tables."""
+import json
+import os
+import random
+import sys
+import unittest
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(BACKEND, 'lambda-layers', 'pulse-common', 'python'))
+sys.path.insert(0, os.path.join(BACKEND, 'server'))
+
+import localaws  # noqa: E402
+import registry  # noqa: E402
+from pulse_common import runtime  # noqa: E402
+from pulse_common.geo import haversine  # noqa: E402
+from pulse_common.trails import BUFFER_FIELD, SCALE, decode, encode, parse_entry, simplify  # noqa: E402
+
+START = 1_750_000_000
+
+
+def walk(count, seed=3):
+    """A random walk of (epoch, lat, lon) points, one every 10-40 s, a few metres apart."""
+    rng = random.Random(seed)
+    epoch, lat, lon = START, 5_150_000, -10_000
+    points = []
+    for _ in range(count):
+        points.append((epoch, lat, lon))
+        epoch += rng.randint(10, 40)
+        lat += rng.randint(-8, 8)
+        lon += rng.randint(-8, 8)
+    return points
+
+
+def interpolate(kept, epoch):
+    """Where the simplified trail puts the friend at `epoch`, in degrees."""
+    for (t0, lat0, lon0), (t1, lat1, lon1) in zip(kept, kept[1:]):
+        if t0 <= epoch <= t1:
+            ratio = (epoch - t0) / (t1 - t0) if t1 != t0 else 0.0
+            return (lat0 + ratio * (lat1 - lat0)) / SCALE, (lon0 + ratio * (lon1 - lon0)) / SCALE
+    raise ValueError(epoch)
+
+
+class TrailEncodingTest(unittest.TestCase):
+    def test_encode_decode_round_trip(self):
+        points = walk(200) + [(START + 9000, -8_999_999, 17_999_999), (START + 9000, 0, 0)]
+        self.assertEqual(decode(encode(points, START), START), points)
+
+    def test_round_trip_of_nothing(self):
+        self.assertEqual(decode(encode([], START), START), [])
+
+    def test_small_steps_cost_few_characters(self):
+        points = walk(100)
+        self.assertLess(len(encode(points, START)), 6 * len(points))
+
+    def test_simplify_stays_within_tolerance(self):
+        points = walk(300)
+        for tolerance in (1, 5, 20):
+            kept = simplify(points, tolerance)
+            self.assertEqual((kept[0], kept[-1]), (points[0], points[-1]))
+            self.assertTrue(set(kept) <= set(points))
+            for epoch, lat, lon in points:
+                error = haversine(lat / SCALE, lon / SCALE, *interpolate(kept, epoch))
+                self.assertLessEqual(error, tolerance * 1.01, (tolerance, epoch))
+
+    def test_simplify_drops_points_on_a_straight_steady_walk(self):
+        points = [(START + 10 * i, 5_150_000 + 3 * i, -10_000 + 2 * i) for i in range(50)]
+        self.assertEqual(simplify(points, 1), [points[0], points[-1]])
+
+    def test_simplify_keeps_a_pause(self):
+        # Same path as a steady walk, but the friend stood still halfway: the pace is kept
+        points = [(START, 5_150_000, 0), (START + 300, 5_150_050, 0), (START + 310, 5_150_100, 0)]
+        self.assertEqual(simplify(points, 5), points)
+
+
+class FriendPingTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        for key, value in registry.LOCAL_ENVIRONMENT.items():
+            os.environ.setdefault(key, value)
+        cls.aws = localaws.LocalAWS()
+        runtime._instances.clear()  # tables built for another backend by an earlier test
+        runtime.use_backend(cls.aws)
+        cls.handler = staticmethod(registry.load_handler('process-friend-data'))
+
+    @classmethod
+    def tearDownClass(cls):
+        runtime.use_backend(None)
+        runtime._instances.clear()
+
+    def ping(self, body):
+        response = self.handler({'body': json.dumps(body)}, None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def status(self, friend_id):
+        return self.aws.resource('dynamodb').Table('FriendCurrentStatus').get_item(Key={'friendId': friend_id})['Item']
+
+    def test_ping_without_a_location(self):
+        status, body = self.ping({'friendId': 'dana'})
+        self.assertEqual(status, 200, body)
+        self.assertNotIn(BUFFER_FIELD, self.status('dana'))
+
+    def test_ping_without_a_location_keeps_the_last_position_and_trail(self):
+        self.assertEqual(self.ping({'friendId': 'erin', 'latitude': 51.5, 'longitude': -0.1})[0], 200)
+        status, body = self.ping({'friendId': 'erin', 'timestamp': '2099-01-01T00:00:00Z'})
+        self.assertEqual(status, 200, body)
+        record = self.status('erin')
+        self.assertEqual((float(record['latitude']), float(record['longitude'])), (51.5, -0.1))
+        self.assertEqual([parse_entry(entry)[1:] for entry in record[BUFFER_FIELD]], [(5_150_000, -10_000)])
+
+    def test_sos_without_a_location(self):
+        status, body = self.ping({'friendId': 'finn', 'sos': True})
+        self.assertEqual(status, 200, body)
+        self.assertTrue(self.status('finn')['sos'])
+
+
+if __name__ == '__main__':
+    unittest.main()